@@ -90,3 +90,74 @@ def check_filters(current_data, previous_data=None, ai_risk=False):
             })
 
     return warnings
+
+
+# ========================================
+# 全銘柄の一括判定（ビットマスク）
+# ========================================
+# check_filters の警告タイトルごとのビット
+FILTER_FLAGS = {
+    "債務超過リスク": 1,
+    "赤字継続": 2,
+    "直近期赤字": 4,
+    "営業CF連続マイナス": 8,
+    "営業CFマイナス": 16,
+    "有利子負債過多": 32,
+    "短期支払能力に懸念": 64,
+}
+
+
+def check_filters_frame(current, previous=None):
+    """
+    check_filters の一括版。1行1社の今期・前期の財務データ（同じインデックス）から、該当する警告のビットマスクを返す
+    returns: 警告ごとのビット（FILTER_FLAGS）を足し合わせた整数の Series（0なら警告なし）
+    """
+    import numpy as np
+    import pandas as pd
+
+    def col(frame, name):
+        if frame is None or name not in frame:
+            return pd.Series(0.0, index=current.index)
+        return frame[name].reindex(current.index).astype(float).fillna(0)
+
+    equity, assets = col(current, "自己資本"), col(current, "総資産")
+    net_income, prev_net_income = col(current, "純利益"), col(previous, "純利益")
+    op_cf, prev_op_cf = col(current, "営業CF"), col(previous, "営業CF")
+    debt = col(current, "有利子負債")
+    ca, cl = col(current, "流動資産"), col(current, "流動負債")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rules = {
+            "債務超過リスク": (assets > 0) & (equity / assets * 100 < 10),
+            "赤字継続": (net_income < 0) & (prev_net_income < 0),
+            "直近期赤字": (net_income < 0) & ~(prev_net_income < 0),
+            "営業CF連続マイナス": (op_cf < 0) & (prev_op_cf < 0),
+            "営業CFマイナス": (op_cf < 0) & ~(prev_op_cf < 0),
+            "有利子負債過多": (assets > 0) & (debt > 0) & (debt / assets * 100 > 60),
+            "短期支払能力に懸念": (cl > 0) & (ca / cl * 100 < 100),
+        }
+    mask = pd.Series(0, index=current.index, dtype=int)
+    for title, hit in rules.items():
+        mask |= np.where(hit, FILTER_FLAGS[title], 0)
+    return mask
+
+
+def filter_titles(mask):
+    """ビットマスクを警告タイトルのリストに戻す"""
+    return [title for title, bit in FILTER_FLAGS.items() if mask & bit]
+
+
+def refresh_risk_flags():
+    """保存済みの全銘柄の今期・前期の財務データから警告を一括判定して保存する。判定した銘柄数を返す"""
+    import pandas as pd
+    from data_sources.financial_store import get_all_indicators, get_financials, save_risk_flags
+    rows = [r for r in get_all_indicators() if r["doc_id"]]
+    if not rows:
+        return 0
+    financials = get_financials([r["doc_id"] for r in rows] + [r["prev_doc_id"] for r in rows if r["prev_doc_id"]])
+    codes = [r["stock_code"] for r in rows]
+    current = pd.DataFrame([financials.get(r["doc_id"], {}) for r in rows], index=codes)
+    previous = pd.DataFrame([financials.get(r["prev_doc_id"], {}) for r in rows], index=codes)
+    flags = check_filters_frame(current, previous)
+    save_risk_flags(dict(zip(codes, flags.tolist())))
+    return len(codes)
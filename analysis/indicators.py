@@ -82,3 +82,113 @@ def calc_growth(current_data, previous_data):
             growth[label] = round(rate, 2)
 
     return growth
+
+
+# ========================================
+# 複数社・複数期の一括計算（pandas）
+# ========================================
+# calc_indicators が返す指標の順番
+INDICATOR_NAMES = ["ROE", "ROA", "営業利益率", "配当利回り", "自己資本比率", "流動比率",
+                   "有利子負債比率", "ICR", "EPS", "PER", "BPS", "PBR"]
+GROWTH_PAIRS = [
+    ("売上高", "売上高成長率"),
+    ("営業利益", "営業利益成長率"),
+    ("純利益", "純利益成長率"),
+    ("総資産", "総資産成長率"),
+]
+
+
+def _column(frame, name):
+    import numpy as np
+    import pandas as pd
+    if name in frame:
+        return frame[name].astype(float)
+    return pd.Series(np.nan, index=frame.index)
+
+
+def _present(s):
+    """辞書版の `if d.get(x)` と同じ判定（欠損と0は値なし）"""
+    return s.notna() & (s != 0)
+
+
+def _ratio(numerator, denominator, mask, scale=1):
+    import numpy as np
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (numerator / denominator * scale).where(mask).round(2)
+
+
+def calc_indicators_frame(financials, prices=None):
+    """
+    calc_indicators の一括版
+    financials: 1行1社・1期の財務データ（列は xbrl_parser のラベル）の DataFrame
+    prices: 各行の株価（配列・Series・スカラー。欠損と0は株価なし）
+    returns: 指標の DataFrame（calc_indicators で計算されない値は NaN）
+    """
+    import numpy as np
+    import pandas as pd
+    f = financials
+    price = pd.Series(np.nan if prices is None else prices, index=f.index, dtype=float)
+    has_price = _present(price)
+
+    net_income = _column(f, "純利益")
+    equity = _column(f, "自己資本")
+    assets = _column(f, "総資産")
+    op_income = _column(f, "営業利益")
+    sales = _column(f, "売上高")
+    dividend = _column(f, "1株配当")
+    cur_assets = _column(f, "流動資産")
+    cur_liab = _column(f, "流動負債")
+    debt = _column(f, "有利子負債")
+    interest = _column(f, "支払利息")
+    shares = _column(f, "発行済株式数")
+
+    out = pd.DataFrame(index=f.index)
+    out["ROE"] = _ratio(net_income, equity, _present(net_income) & _present(equity), 100)
+    out["ROA"] = _ratio(net_income, assets, _present(net_income) & _present(assets), 100)
+    out["営業利益率"] = _ratio(op_income, sales, _present(op_income) & _present(sales), 100)
+    out["配当利回り"] = _ratio(dividend, price, _present(dividend) & has_price & (price > 0), 100)
+    out["自己資本比率"] = _ratio(equity, assets, _present(equity) & _present(assets), 100)
+    out["流動比率"] = _ratio(cur_assets, cur_liab, _present(cur_assets) & _present(cur_liab) & (cur_liab > 0), 100)
+    out["有利子負債比率"] = _ratio(debt, assets, _present(debt) & _present(assets), 100)
+    out["ICR"] = _ratio(op_income, interest, _present(op_income) & _present(interest) & (interest > 0))
+
+    # PER・PBR は丸める前のEPS・BPSで計算する（辞書版と同じ）
+    has_shares = _present(shares) & (shares > 0)
+    eps_mask = has_price & _present(net_income) & has_shares
+    eps = (net_income / shares).where(eps_mask)
+    out["EPS"] = eps.round(2)
+    out["PER"] = _ratio(price, eps, eps_mask & (eps > 0))
+    bps_mask = has_price & _present(equity) & has_shares
+    bps = (equity / shares).where(bps_mask)
+    out["BPS"] = bps.round(2)
+    out["PBR"] = _ratio(price, bps, bps_mask & (bps > 0))
+    return out
+
+
+def calc_growth_frame(current, previous):
+    """
+    calc_growth の一括版。current と previous は同じインデックスで行を対応させた財務データの DataFrame
+    """
+    import pandas as pd
+    out = pd.DataFrame(index=current.index)
+    for key, label in GROWTH_PAIRS:
+        curr = _column(current, key)
+        prev = _column(previous, key).reindex(current.index)
+        out[label] = _ratio(curr - prev, prev.abs(), _present(curr) & _present(prev), 100)
+    return out
+
+
+def calc_growth_history(financials):
+    """
+    (銘柄コード, 決算期末) のインデックスを持つ財務データから、各期の前期比成長率を一括計算する
+    各銘柄の最も古い期は NaN（financial_store.facts_frame の出力をそのまま渡せる）
+    """
+    financials = financials.sort_index()
+    previous = financials.groupby(level=0).shift(1)
+    return calc_growth_frame(financials, previous)
+
+
+def frame_to_records(frame):
+    """指標の DataFrame を行ごとの辞書（NaNは除く）のリストに戻す（calc_total_score などに渡す用）"""
+    columns = list(frame.columns)
+    return [{k: v for k, v in zip(columns, row) if v == v} for row in frame.itertuples(index=False, name=None)]
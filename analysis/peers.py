@@ -0,0 +1,78 @@
+"""
+全銘柄内・同業内での相対評価
+バッチで全銘柄の指標から、指標ごとのパーセンタイル（全銘柄内）とセクター内zスコアをまとめて計算する
+どちらも THRESHOLDS の higher_is_better に合わせ、大きいほど良い向きに揃える
+"""
+import os
+import json
+
+from analysis.scoring import THRESHOLDS
+
+SECTORS_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "sectors.json")
+
+# 相対評価する指標
+PEER_INDICATORS = list(THRESHOLDS)
+# zスコアを出すのに必要なセクター内の銘柄数
+MIN_SECTOR_SIZE = 3
+
+
+def load_sectors():
+    """{セクター名: [証券コード, ...]}"""
+    with open(SECTORS_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sector_map(sectors=None):
+    """{証券コード: セクター名}"""
+    sectors = sectors if sectors is not None else load_sectors()
+    return {code: sector for sector, codes in sectors.items() for code in codes}
+
+
+def compute_peer_stats(values, sectors=None):
+    """
+    values: 証券コードをインデックス、指標を列に持つ DataFrame（欠損はNaN）
+    sectors: {証券コード: セクター名}（含まれない銘柄はセクター内zスコアなし）
+    returns: 縦持ちの DataFrame（stock_code, indicator, value, percentile, sector, sector_z）
+      percentile: 全銘柄内の位置（0〜100、100が最良）
+      sector_z: セクター平均からの標準偏差単位の差（正が良い）
+    """
+    import numpy as np
+    import pandas as pd
+    columns = [c for c in PEER_INDICATORS if c in values.columns]
+    values = values[columns].astype(float)
+    sign = pd.Series([1.0 if THRESHOLDS[c]["higher_is_better"] else -1.0 for c in columns], index=columns)
+    oriented = values * sign
+
+    percentile = oriented.rank(pct=True) * 100
+
+    sector = pd.Series(sectors or {}, dtype=object).reindex(values.index)
+    # セクター不明の銘柄を除いてセクターごとの平均・標準偏差を求める
+    known = sector.notna()
+    grouped = oriented[known].groupby(sector[known])
+    mean = grouped.transform("mean").reindex(values.index)
+    std = grouped.transform("std").reindex(values.index)
+    count = grouped.transform("count").reindex(values.index)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sector_z = ((oriented - mean) / std).where((count >= MIN_SECTOR_SIZE) & (std > 0))
+
+    result = pd.DataFrame({
+        "stock_code": np.repeat(values.index.to_numpy(), len(columns)),
+        "indicator": np.tile(columns, len(values)),
+        "value": values.to_numpy().ravel(),
+        "percentile": percentile.to_numpy().ravel(),
+        "sector": np.repeat(sector.to_numpy(), len(columns)),
+        "sector_z": sector_z.to_numpy().ravel(),
+    })
+    return result[result["value"].notna()].reset_index(drop=True)
+
+
+def refresh_peer_stats():
+    """保存済みの全銘柄の指標から相対評価を計算し直して保存する。保存した銘柄数を返す"""
+    import pandas as pd
+    from data_sources.financial_store import get_all_indicators, save_peer_stats
+    rows = get_all_indicators()
+    if not rows:
+        return 0
+    values = pd.DataFrame([r["indicators"] for r in rows], index=[r["stock_code"] for r in rows])
+    save_peer_stats(compute_peer_stats(values, sector_map()))
+    return len(rows)
@@ -0,0 +1,210 @@
+"""
+ランキングスナップショット
+バッチの最後に、スコアキューブと保存済みの指標から並び順（スタイル×期間の総合スコア・カテゴリごと）を計算済みの
+列指向ファイル（.npy）として版ごとに書き出す。ランキングページはメモリマップで開いて表示件数分を切り出すだけで済む
+版は data/ranking/<版>/ に書き、CURRENT の書き換えで切り替える（書き出し中の版が読まれることはない）
+"""
+import os
+import json
+import shutil
+import datetime
+import numpy as np
+
+from analysis.score_cube import (CATEGORY_NAMES, COMBOS, combo_index, load_score_cube, build_score_cube,
+                                 merge_score_cube, save_score_cube, weights_fingerprint)
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "ranking")
+# 残しておく版の数（読み込み中のプロセスがあっても直前の版は消さない）
+KEEP_VERSIONS = 2
+
+# 一覧に出す指標（列名, 指標名）
+METRICS = [("roe", "ROE"), ("per", "PER"), ("dividend", "配当利回り")]
+# 並び替え基準の選択肢とカテゴリ名
+SORT_CATEGORIES = {"収益性": "profitability", "安全性": "safety", "成長性": "growth", "割安度": "value"}
+ARRAYS = ("codes", "names", "totals", "category_scores", "metrics", "risk_flags", "orders")
+
+_loaded = {}  # snapshot_dir -> (version, snapshot)
+
+
+def _descending_order(values, codes):
+    """値の高い順（同点は証券コード順）の行番号"""
+    return np.lexsort((codes, -values)).astype(np.int32)
+
+
+def build_ranking_snapshot(cube, indicators=None, risk_flags=None):
+    """
+    cube: load_score_cube() の結果
+    indicators: {証券コード: 指標辞書}（一覧のROE・PER・配当利回り用）
+    risk_flags: {証券コード: 警告のビットマスク}（スクリーニングでの除外用）
+    returns: {"codes", "names", "totals", "category_scores", "metrics", "risk_flags", "orders"}
+      orders: (組み合わせ数 + カテゴリ数, 銘柄数)。先に COMBOS 順の総合スコア、続いて CATEGORY_NAMES 順のカテゴリスコアの並び順
+    """
+    indicators = indicators or {}
+    risk_flags = risk_flags or {}
+    codes = np.asarray(cube["codes"], dtype=str)
+    totals = np.asarray(cube["totals"], dtype=np.int16)
+    category_scores = np.rint(np.asarray(cube["category_scores"], dtype=float)).astype(np.int16)
+    metrics = np.array([[indicators.get(code, {}).get(name) or 0 for _, name in METRICS] for code in codes],
+                       dtype=np.float64).reshape(len(codes), len(METRICS))
+    orders = [_descending_order(totals[:, k], codes) for k in range(totals.shape[1])]
+    orders += [_descending_order(category_scores[:, j], codes) for j in range(category_scores.shape[1])]
+    return {
+        "codes": codes,
+        "names": np.asarray(cube["names"], dtype=str),
+        "totals": totals,
+        "category_scores": category_scores,
+        "metrics": metrics,
+        "risk_flags": np.array([risk_flags.get(code) or 0 for code in codes], dtype=np.int32),
+        "orders": np.array(orders, dtype=np.int32).reshape(len(orders), len(codes)),
+    }
+
+
+def _current_path(snapshot_dir):
+    return os.path.join(snapshot_dir, "CURRENT")
+
+
+def current_version(snapshot_dir=None):
+    """公開中の版。なければNone"""
+    try:
+        with open(_current_path(snapshot_dir or SNAPSHOT_DIR), "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_ranking_snapshot(snapshot, version=None, snapshot_dir=None):
+    """スナップショットを新しい版として書き出して公開し、版を返す。古い版は KEEP_VERSIONS を超えた分を消す"""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    version = str(version or datetime.datetime.now().strftime("%Y%m%d%H%M%S"))
+    version_dir = os.path.join(snapshot_dir, version)
+    tmp_dir = f"{version_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), snapshot[name])
+    manifest = {
+        "version": version,
+        "created_at": datetime.datetime.now().isoformat(),
+        "count": len(snapshot["codes"]),
+        "combos": [f"{s}|{p}" for s, p in COMBOS],
+        "weights": weights_fingerprint(),
+        "categories": CATEGORY_NAMES,
+        "metrics": [name for name, _ in METRICS],
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    if os.path.exists(version_dir):
+        shutil.rmtree(version_dir)
+    os.replace(tmp_dir, version_dir)
+    # 版の切り替え（一時ファイルに書いてから置き換える）
+    tmp_current = f"{_current_path(snapshot_dir)}.{os.getpid()}.tmp"
+    with open(tmp_current, "w") as f:
+        f.write(version)
+    os.replace(tmp_current, _current_path(snapshot_dir))
+
+    # 古い順は manifest の作成日時で決める（git の checkout でファイルの更新日時は揃ってしまうため）
+    versions = sorted((d for d in os.listdir(snapshot_dir)
+                       if os.path.isdir(os.path.join(snapshot_dir, d)) and not d.endswith(".tmp")),
+                      key=lambda d: _created_at(os.path.join(snapshot_dir, d)))
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != version:
+            shutil.rmtree(os.path.join(snapshot_dir, old), ignore_errors=True)
+    return version
+
+
+def _created_at(version_dir):
+    try:
+        with open(os.path.join(version_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f).get("created_at", "")
+    except (OSError, ValueError):
+        return ""
+
+
+def publish_ranking_snapshot(cube=None, version=None, snapshot_dir=None):
+    """
+    スコアキューブと保存済みの指標からスナップショットを作って公開し、版を返す。キューブも指標もなければNone
+    キューブにない銘柄（キューブができる前から指標がある銘柄）は保存済みの指標からキューブに足して保存してから作る
+    """
+    from data_sources.financial_store import get_all_indicators
+    cube = cube if cube is not None else load_score_cube()
+    rows = get_all_indicators()
+    # キューブには各バッチで処理した銘柄しかマージされないので、一部の銘柄だけのランキングにならないようにする
+    known = set(cube["codes"].tolist()) if cube is not None else set()
+    missing = [r for r in rows if r["stock_code"] not in known]
+    if missing:
+        cube = merge_score_cube(cube, build_score_cube([r["stock_code"] for r in missing],
+                                                       [r["company_name"] or "" for r in missing],
+                                                       [r["indicators"] for r in missing]))
+        save_score_cube(cube)
+    if cube is None:
+        return None
+    indicators = {r["stock_code"]: r["indicators"] for r in rows}
+    risk_flags = {r["stock_code"]: r["risk_flags"] for r in rows}
+    return save_ranking_snapshot(build_ranking_snapshot(cube, indicators, risk_flags), version, snapshot_dir)
+
+
+def load_ranking_snapshot(snapshot_dir=None):
+    """公開中のスナップショットをメモリマップで開く（版が変わるまではプロセス内で使い回す）。なければNone"""
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    version = current_version(snapshot_dir)
+    if version is None:
+        return None
+    cached = _loaded.get(snapshot_dir)
+    if cached and cached[0] == version:
+        return cached[1]
+    version_dir = os.path.join(snapshot_dir, version)
+    try:
+        with open(os.path.join(version_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        snapshot = {name: np.load(os.path.join(version_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+    except (OSError, ValueError):
+        return None
+    # 重みの設定（列の並び・重みの値）が変わった版は総合スコアと並び順が古いので使わない（次のバッチで作り直される）
+    if (manifest["combos"] != [f"{s}|{p}" for s, p in COMBOS] or manifest["categories"] != CATEGORY_NAMES
+            or manifest.get("weights") != weights_fingerprint()):
+        return None
+    snapshot["manifest"] = manifest
+    _loaded[snapshot_dir] = (version, snapshot)
+    return snapshot
+
+
+def ranking_order(snapshot, style, period, sort_by="総合スコア"):
+    """並び替え基準の順に並んだ行番号（計算済みの並び順をそのまま返す）"""
+    if sort_by in SORT_CATEGORIES:
+        return snapshot["orders"][len(COMBOS) + CATEGORY_NAMES.index(sort_by)]
+    return snapshot["orders"][combo_index(style, period)]
+
+
+# 一覧の列（ranking_rows の行のキー）
+ROW_KEYS = ["code", "name", "total"] + [SORT_CATEGORIES[cat] for cat in CATEGORY_NAMES] + [name for name, _ in METRICS]
+
+
+def ranking_columns(snapshot, rows, style, period, keys=None):
+    """
+    行番号の銘柄の列を {列名: 値のリスト} で返す（keys で指定した列だけ読む。省略時は ROW_KEYS すべて）
+    total はサイドバーのスタイル・期間の総合スコア
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    categories = {SORT_CATEGORIES[cat]: j for j, cat in enumerate(CATEGORY_NAMES)}
+    metrics = {name: k for k, (name, _) in enumerate(METRICS)}
+    columns = {}
+    for key in keys or ROW_KEYS:
+        if key == "code":
+            columns[key] = snapshot["codes"][rows].tolist()
+        elif key == "name":
+            columns[key] = snapshot["names"][rows].tolist()
+        elif key == "total":
+            columns[key] = snapshot["totals"][rows, combo_index(style, period)].tolist()
+        elif key in categories:
+            columns[key] = snapshot["category_scores"][rows, categories[key]].tolist()
+        else:
+            columns[key] = snapshot["metrics"][rows, metrics[key]].tolist()
+    return columns
+
+
+def ranking_rows(snapshot, rows, style, period):
+    """
+    行番号の銘柄を一覧の形（code, name, total, profitability, safety, growth, value, roe, per, dividend）で返す
+    total はサイドバーのスタイル・期間の総合スコア
+    """
+    columns = ranking_columns(snapshot, rows, style, period)
+    return [dict(zip(ROW_KEYS, values)) for values in zip(*columns.values())]
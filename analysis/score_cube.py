@@ -0,0 +1,143 @@
+"""
+スコアキューブ（全投資スタイル×期間の総合スコア）
+バッチでカテゴリスコアを一度だけ計算し、STYLE_PERIOD_WEIGHTS の全組み合わせの総合スコアを行列でまとめて求めて保存する
+ランキング・スクリーニングはサイドバーで選んだスタイル・期間の列を読むだけで済む
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+from analysis.scoring import (CATEGORIES, STYLE_PERIOD_WEIGHTS, _match_weights,
+                              indicators_to_matrix, score_indicator_matrix, score_category_matrix)
+
+CUBE_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "score_cube.npz")
+
+CATEGORY_NAMES = list(CATEGORIES)
+# キューブの列順（スタイル×期間）
+COMBOS = [(style, period) for style, periods in STYLE_PERIOD_WEIGHTS.items() for period in periods]
+
+_loaded = {}  # path -> (mtime, cube)
+
+
+def weights_fingerprint():
+    """STYLE_PERIOD_WEIGHTS のフィンガープリント（重みの値が変われば変わる）"""
+    dumped = json.dumps(STYLE_PERIOD_WEIGHTS, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(dumped.encode("utf-8")).hexdigest()[:16]
+
+
+def weight_matrix():
+    """(カテゴリ数, 組み合わせ数) の重み行列"""
+    return np.array([[STYLE_PERIOD_WEIGHTS[style][period][cat] for style, period in COMBOS]
+                     for cat in CATEGORY_NAMES], dtype=float)
+
+
+def cube_totals(category_scores, has_data):
+    """
+    カテゴリスコア (銘柄数, カテゴリ数) から全組み合わせの総合スコア (銘柄数, 組み合わせ数) を求める
+    データがないカテゴリは按分する（calc_total_score と同じ結果）
+    """
+    weights = weight_matrix()
+    has_data = np.asarray(has_data, dtype=bool)
+    # 按分後の重みの合計は行列積で一度に求める
+    total_weight = has_data.astype(float) @ weights
+    safe_weight = np.where(total_weight > 0, total_weight, 1)
+    # 丸め結果を calc_total_score と一致させるため、カテゴリ順に足し込む
+    total = np.zeros(total_weight.shape)
+    for j in range(len(CATEGORY_NAMES)):
+        contrib = np.outer(category_scores[:, j], weights[j]) / safe_weight
+        total += np.where(has_data[:, j:j + 1], contrib, 0)
+    total = np.where(total_weight > 0, total, 0)
+    return np.clip(np.round(total), 0, 100).astype(int)
+
+
+def build_score_cube(codes, names, indicator_list):
+    """銘柄コード・企業名・指標辞書のリストからキューブを作る"""
+    values = indicators_to_matrix(indicator_list)
+    category_scores, has_data = score_category_matrix(score_indicator_matrix(values))
+    category_scores = np.column_stack([category_scores[c] for c in CATEGORY_NAMES])
+    has_data = np.column_stack([has_data[c] for c in CATEGORY_NAMES])
+    return {
+        "codes": np.array(codes, dtype=str),
+        "names": np.array(names, dtype=str),
+        "category_scores": category_scores,
+        "has_data": has_data,
+        "totals": cube_totals(category_scores, has_data),
+    }
+
+
+def merge_score_cube(base, update):
+    """base の銘柄を update で上書き・追加したキューブを返す（日次バッチは一部の銘柄だけ更新するため）"""
+    if base is None or len(base["codes"]) == 0:
+        return update
+    keep = ~np.isin(base["codes"], update["codes"])
+    category_scores = np.concatenate([base["category_scores"][keep], update["category_scores"]])
+    has_data = np.concatenate([base["has_data"][keep], update["has_data"]])
+    return {
+        "codes": np.concatenate([base["codes"][keep], update["codes"]]),
+        "names": np.concatenate([base["names"][keep], update["names"]]),
+        "category_scores": category_scores,
+        "has_data": has_data,
+        "totals": cube_totals(category_scores, has_data),
+    }
+
+
+def save_score_cube(cube, path=None):
+    """キューブを保存（一時ファイルに書いてから置き換える）"""
+    path = path or CUBE_PATH
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, **cube)
+    os.replace(tmp_path, path)
+
+
+def load_score_cube(path=None):
+    """保存済みのキューブを返す（更新されるまではメモリ上のものを使う）。なければNone"""
+    path = path or CUBE_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _loaded.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with np.load(path) as data:
+            cube = {k: data[k] for k in ("codes", "names", "category_scores", "has_data")}
+    except (OSError, KeyError, ValueError):
+        return None
+    # 総合スコアは保存時の重みではなく今の STYLE_PERIOD_WEIGHTS で計算し直す（行列積1回で済む）
+    # 日次バッチは一部の銘柄しかマージしないので、重みを変えたときに新旧の重みの総合スコアが混ざらないようにする
+    cube["totals"] = cube_totals(cube["category_scores"], cube["has_data"])
+    _loaded[path] = (mtime, cube)
+    return cube
+
+
+def update_score_cube(rows, path=None):
+    """
+    rows: (銘柄コード, 企業名, 指標辞書) のリスト
+    保存済みのキューブにマージして保存し、マージ後のキューブを返す
+    """
+    if not rows:
+        return load_score_cube(path)
+    codes, names, indicator_list = zip(*rows)
+    cube = merge_score_cube(load_score_cube(path), build_score_cube(list(codes), list(names), list(indicator_list)))
+    save_score_cube(cube, path)
+    return cube
+
+
+def combo_index(style, period):
+    """スタイル・期間に対応するキューブの列番号（期間は calc_total_score と同じく部分一致）"""
+    weights = _match_weights(style, period)
+    style = style if style in STYLE_PERIOD_WEIGHTS else "バランス"
+    for k, (s, p) in enumerate(COMBOS):
+        if s == style and STYLE_PERIOD_WEIGHTS[s][p] is weights:
+            return k
+    return COMBOS.index(("バランス", "中期（1〜3年）"))
+
+
+def style_scores(cube, style, period):
+    """{銘柄コード: 総合スコア} を返す"""
+    if cube is None:
+        return {}
+    column = cube["totals"][:, combo_index(style, period)]
+    return dict(zip(cube["codes"].tolist(), column.tolist()))
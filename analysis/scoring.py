@@ -1,6 +1,8 @@
 """
 スコアリングエンジン - v3（厳格化：100点はトップ企業のみ）
 """
+import numpy as np
+
 THRESHOLDS = {
     # 収益性 - 日本企業の上位5%で100点
     "ROE":       {"excellent": 30, "zero": 0, "higher_is_better": True},
@@ -101,15 +103,25 @@ def score_category(category_name, indicators):
     return category_score, scores
 
 
-def calc_total_score(indicators, style="バランス", period="中期（1〜3年）"):
+def _match_weights(style, period):
+    """投資スタイル・期間に対応するカテゴリ重みを返す（期間は部分一致、見つからなければ中期）"""
     weights = STYLE_PERIOD_WEIGHTS.get(style, STYLE_PERIOD_WEIGHTS["バランス"])
-    matched = None
     for k in weights:
         if period in k or k in period:
-            matched = weights[k]
-            break
-    if not matched:
-        matched = list(weights.values())[1]
+            return weights[k]
+    return list(weights.values())[1]
+
+
+def _judge(total):
+    if total >= 75:
+        return "★ スコア高"
+    elif total >= 50:
+        return "▲ 標準的"
+    return "✖ スコア低"
+
+
+def calc_total_score(indicators, style="バランス", period="中期（1〜3年）"):
+    matched = _match_weights(style, period)
 
     category_scores = {}
     detail = {}
@@ -134,13 +146,7 @@ def calc_total_score(indicators, style="バランス", period="中期（1〜3年
             total += category_scores.get(cat_name, 0) * weight / total_weight
 
     total = max(0, min(100, round(total)))
-
-    if total >= 75:
-        judgment = "★ スコア高"
-    elif total >= 50:
-        judgment = "▲ 標準的"
-    else:
-        judgment = "✖ スコア低"
+    judgment = _judge(total)
 
     return {
         "total_score": total,
@@ -151,3 +157,106 @@ def calc_total_score(indicators, style="バランス", period="中期（1〜3年
         "detail": detail,
         "missing_categories": missing_categories,
     }
+
+
+# ========================================
+# 全銘柄一括スコアリング（NumPy）
+# ========================================
+# 一括計算で使う指標の列順
+INDICATOR_COLUMNS = list(THRESHOLDS)
+
+
+def indicators_to_matrix(indicator_list, columns=None):
+    """指標辞書のリストを (銘柄数, 指標数) の配列に変換する（欠損はNaN）"""
+    columns = columns or INDICATOR_COLUMNS
+    matrix = np.full((len(indicator_list), len(columns)), np.nan)
+    for i, indicators in enumerate(indicator_list):
+        for j, name in enumerate(columns):
+            value = indicators.get(name)
+            if value is not None:
+                matrix[i, j] = value
+    return matrix
+
+
+def score_indicator_matrix(values, columns=None):
+    """
+    指標値の配列を THRESHOLDS で一括スコア化する（score_indicator と同じ結果）
+    THRESHOLDS にない列と欠損値は NaN
+    """
+    columns = columns or INDICATOR_COLUMNS
+    values = np.asarray(values, dtype=float)
+    scores = np.full(values.shape, np.nan)
+    for j, name in enumerate(columns):
+        if name not in THRESHOLDS:
+            continue
+        t = THRESHOLDS[name]
+        v = values[:, j]
+        excellent, zero = t["excellent"], t["zero"]
+        if t["higher_is_better"]:
+            s = np.round((v - zero) / (excellent - zero) * 100)
+            s = np.where(v >= excellent, 100, np.where(v <= zero, 0, s))
+        else:
+            s = np.round((zero - v) / (zero - excellent) * 100)
+            s = np.where(v <= excellent, 100, np.where(v >= zero, 0, s))
+        scores[:, j] = np.where(np.isnan(v), np.nan, s)
+    return scores
+
+
+def score_category_matrix(indicator_scores, columns=None):
+    """
+    指標スコアの配列からカテゴリ別スコアを一括計算する
+    returns: ({カテゴリ: スコア配列}, {カテゴリ: データ有無の配列})
+    """
+    columns = columns or INDICATOR_COLUMNS
+    col_index = {name: j for j, name in enumerate(columns)}
+    n = indicator_scores.shape[0]
+    category_scores = {}
+    has_data = {}
+    for cat_name, config in CATEGORIES.items():
+        weighted_sum = np.zeros(n)
+        total_weight = np.zeros(n)
+        for indicator_name, weight in config.items():
+            if indicator_name not in col_index:
+                continue
+            s = indicator_scores[:, col_index[indicator_name]]
+            present = ~np.isnan(s)
+            weighted_sum += np.where(present, s * weight, 0)
+            total_weight += np.where(present, weight, 0)
+        has_data[cat_name] = total_weight > 0
+        category_scores[cat_name] = np.where(
+            has_data[cat_name], np.round(weighted_sum / np.where(has_data[cat_name], total_weight, 1)), 0
+        ).astype(int)
+    return category_scores, has_data
+
+
+def total_score_matrix(category_scores, has_data, style="バランス", period="中期（1〜3年）"):
+    """カテゴリスコアから総合スコアを一括計算する（データがないカテゴリは按分）"""
+    matched = _match_weights(style, period)
+    n = len(next(iter(category_scores.values())))
+    total_weight = np.zeros(n)
+    for cat_name, weight in matched.items():
+        total_weight += np.where(has_data[cat_name], weight, 0)
+    safe_weight = np.where(total_weight > 0, total_weight, 1)
+    # calc_total_score と同じ順序で足し込む（丸め結果を一致させるため）
+    total = np.zeros(n)
+    for cat_name, weight in matched.items():
+        total += np.where(has_data[cat_name], category_scores[cat_name] * weight / safe_weight, 0)
+    total = np.where(total_weight > 0, total, 0)
+    return np.clip(np.round(total), 0, 100).astype(int)
+
+
+def score_universe(values, columns=None, style="バランス", period="中期（1〜3年）"):
+    """
+    全銘柄を一括スコアリングする（calc_total_score を銘柄ごとに呼ぶのと同じ結果）
+    values: (銘柄数, 指標数) の配列（欠損はNaN）。columns は各列の指標名（既定 INDICATOR_COLUMNS）
+    """
+    indicator_scores = score_indicator_matrix(values, columns)
+    category_scores, has_data = score_category_matrix(indicator_scores, columns)
+    total = total_score_matrix(category_scores, has_data, style, period)
+    return {
+        "total_score": total,
+        "judgment": np.where(total >= 75, _judge(75), np.where(total >= 50, _judge(50), _judge(0))),
+        "category_scores": category_scores,
+        "missing_categories": {cat: ~has for cat, has in has_data.items()},
+        "indicator_scores": indicator_scores,
+    }
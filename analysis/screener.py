@@ -0,0 +1,69 @@
+"""
+スクリーニング
+条件（スライダーの値）をランキングスナップショットの列に対する NumPy のマスクにまとめて一度に判定する
+該当銘柄は計算済みの総合スコア順のまま取り出すので並べ替えは不要で、件数はマスクの合計で求まる
+スナップショットがないときは DB の screen_scores（条件をパラメータ化したSQL）を使う
+"""
+import numpy as np
+
+from analysis.score_cube import CATEGORY_NAMES, combo_index
+from analysis.ranking_snapshot import METRICS, SORT_CATEGORIES, ranking_order, ranking_rows, ranking_columns
+
+# 条件の既定値（None の条件は判定しない）
+# max_per: PERの上限（上限を指定したときはPERが0＝算出できない銘柄も除く）
+# exclude_flags: 除外する警告のビットマスク（analysis.filters.FILTER_FLAGS）
+SCREEN_CONDITIONS = {
+    "min_total": None,
+    "min_roe": None,
+    "min_dividend": None,
+    "max_per": None,
+    "min_profitability": None,
+    "min_safety": None,
+    "min_growth": None,
+    "min_value": None,
+    "exclude_flags": 0,
+}
+
+
+def screen_mask(snapshot, conditions, style, period):
+    """条件を満たす銘柄の真偽値配列（スナップショットの行順）"""
+    conditions = dict(SCREEN_CONDITIONS, **conditions)
+    mask = np.ones(len(snapshot["codes"]), dtype=bool)
+    if conditions["min_total"] is not None:
+        mask &= snapshot["totals"][:, combo_index(style, period)] >= conditions["min_total"]
+    for j, cat in enumerate(CATEGORY_NAMES):
+        threshold = conditions[f"min_{SORT_CATEGORIES[cat]}"]
+        if threshold is not None:
+            mask &= snapshot["category_scores"][:, j] >= threshold
+    metrics = {name: k for k, (name, _) in enumerate(METRICS)}
+    if conditions["min_roe"] is not None:
+        mask &= snapshot["metrics"][:, metrics["roe"]] >= conditions["min_roe"]
+    if conditions["min_dividend"] is not None:
+        mask &= snapshot["metrics"][:, metrics["dividend"]] >= conditions["min_dividend"]
+    if conditions["max_per"] is not None:
+        per = snapshot["metrics"][:, metrics["per"]]
+        mask &= (per != 0) & (per <= conditions["max_per"])
+    if conditions["exclude_flags"]:
+        mask &= (snapshot["risk_flags"] & conditions["exclude_flags"]) == 0
+    return mask
+
+
+def _hits(snapshot, conditions, style, period):
+    """条件を満たす行番号（総合スコアの高い順）"""
+    order = ranking_order(snapshot, style, period)
+    return order[screen_mask(snapshot, conditions, style, period)[order]]
+
+
+def screen(snapshot, conditions, style, period, offset=0, limit=None):
+    """
+    条件を満たす銘柄を総合スコアの高い順に offset 件目から limit 件返す
+    returns: (該当件数, ranking_rows の形の行のリスト)
+    """
+    hits = _hits(snapshot, conditions, style, period)
+    stop = None if limit is None else offset + limit
+    return len(hits), ranking_rows(snapshot, hits[offset:stop], style, period)
+
+
+def screen_columns(snapshot, conditions, style, period, keys):
+    """条件を満たす全銘柄の指定した列だけを総合スコアの高い順に {列名: 値のリスト} で返す（散布図・エクスポート用）"""
+    return ranking_columns(snapshot, _hits(snapshot, conditions, style, period), style, period, keys)
@@ -232,8 +232,10 @@ with st.sidebar:
 
 # ── 共通関数 ──
 def search_yuho(edinet_code, api_key):
-    import requests, datetime
-    url = "https://api.edinet-fsa.go.jp/api/v2/documents.json"
+    import datetime
+    from data_sources.edinet_index import get_synced_dates, sync_date, find_documents
+    # 取得済みの日付はローカルのインデックスを使い、未取得の日だけEDINETに問い合わせる
+    synced = get_synced_dates()
     found = []
     today = datetime.date.today()
     for year in range(today.year, today.year - 5, -1):
@@ -241,22 +243,15 @@ def search_yuho(edinet_code, api_key):
             for day in range(15, 31):
                 try:
                     d = datetime.date(year, month, day)
-                    if d > today: continue
-                    resp = requests.get(url, params={
-                        "date": f"{year}-{month:02d}-{day:02d}",
-                        "type": 2, "Subscription-Key": api_key,
-                    }, timeout=30)
-                    for doc in resp.json().get("results", []):
-                        if doc.get("edinetCode") == edinet_code and doc.get("docTypeCode") == "120":
-                            if doc["docID"] not in [x["docID"] for x in found]:
-                                found.append({"docID": doc["docID"], "periodEnd": doc.get("periodEnd", ""), "docDescription": doc.get("docDescription", "")})
-                except:
+                except ValueError:
                     continue
+                if d > today or d.isoformat() in synced: continue
+                sync_date(d.isoformat(), api_key)
+            found = find_documents(edinet_code, "120")
             if any(str(year) in x.get("periodEnd", "") for x in found):
                 break
         if len(found) >= 4:
             break
-    found.sort(key=lambda x: x.get("periodEnd", ""), reverse=True)
     return found[:4]
 
 
@@ -293,7 +288,8 @@ def analyze_company_safe(code, api_key, style="バランス", period="中期（1
 @st.cache_data(ttl=3600, show_spinner=False)
 def analyze_company(code, api_key):
     from data_sources.stock_client import get_stock_info
-    from data_sources.cache_manager import get_cache, set_cache
+    from data_sources.cache_manager import get_or_fetch
+    from data_sources.filing_store import filing_lock_key
     from parsers.xbrl_parser import download_and_parse
     from analysis.indicators import calc_indicators, calc_growth
     from analysis.scoring import calc_total_score
@@ -304,27 +300,18 @@ def analyze_company(code, api_key):
     stock_info = get_stock_info(code)
     price = stock_info["current_price"] if stock_info else 0
 
-    cache_key_docs = f"docs_{edinet_code}"
-    docs = get_cache(cache_key_docs, max_age_hours=168)
-    if not docs:
-        docs = search_yuho(edinet_code, api_key)
-        if docs: set_cache(cache_key_docs, docs)
+    # 同じ銘柄・書類を複数セッションが同時に要求しても取得は1回だけ
+    docs = get_or_fetch(f"docs_{edinet_code}", lambda: search_yuho(edinet_code, api_key), max_age_hours=168)
 
     if not docs: return None
 
-    cache_cur = f"xbrl_{docs[0]['docID']}"
-    current = get_cache(cache_cur)
-    if not current:
-        current = download_and_parse(docs[0]["docID"], api_key)
-        if current: set_cache(cache_cur, current)
+    current = get_or_fetch(f"xbrl_{docs[0]['docID']}", lambda: download_and_parse(docs[0]["docID"], api_key),
+                           lock_keys=[filing_lock_key(docs[0]["docID"])])
 
     previous = None
     if len(docs) > 1:
-        cache_prev = f"xbrl_{docs[1]['docID']}"
-        previous = get_cache(cache_prev)
-        if not previous:
-            previous = download_and_parse(docs[1]["docID"], api_key)
-            if previous: set_cache(cache_prev, previous)
+        previous = get_or_fetch(f"xbrl_{docs[1]['docID']}", lambda: download_and_parse(docs[1]["docID"], api_key),
+                                lock_keys=[filing_lock_key(docs[1]["docID"])])
 
     if not current: return None
 
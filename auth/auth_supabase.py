@@ -1,28 +1,12 @@
 """Supabase版認証マネージャー"""
 import hashlib
-import os
 import datetime
 
+from data.supabase_client import get_client
+
 def _get_client():
-    try:
-        import streamlit as st
-        url = st.secrets.get("SUPABASE_URL", "")
-        key = st.secrets.get("SUPABASE_KEY", "")
-    except:
-        url = os.environ.get("SUPABASE_URL", "")
-        key = os.environ.get("SUPABASE_KEY", "")
-    if not url or not key:
-        try:
-            with open(os.path.join(os.path.dirname(__file__), '..', '.streamlit', 'secrets.toml')) as f:
-                for line in f:
-                    if 'SUPABASE_URL' in line and '=' in line:
-                        url = line.split('=', 1)[1].strip().strip('"').strip("'")
-                    if 'SUPABASE_KEY' in line and '=' in line:
-                        key = line.split('=', 1)[1].strip().strip('"').strip("'")
-        except:
-            pass
-    from supabase import create_client
-    return create_client(url, key)
+    # クライアントはプロセスで1つを使い回す（毎回作るとsecretsの読み込みとTLS接続が発生する）
+    return get_client()
 
 def _hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -2,10 +2,20 @@
 import os, sys, json, time, datetime, requests
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from data.database import save_stock_score, get_scores_count
+from data.database import save_stock_scores_bulk, get_scores_count
 from analysis.indicators import calc_indicators, calc_growth
 from analysis.scoring import calc_total_score
-from parsers.xbrl_parser import parse_xbrl
+from analysis.score_cube import update_score_cube
+from analysis.peers import refresh_peer_stats
+from analysis.filters import refresh_risk_flags
+from analysis.ranking_snapshot import publish_ranking_snapshot
+from data_sources.edinet_index import find_latest_documents
+from data_sources.edinet_downloader import iter_downloads
+from data_sources.filing_store import fetch_filing
+from data_sources.financial_store import (get_or_parse_financial, get_parsed_doc_ids, save_indicators,
+                                          start_batch_run, finish_batch_run, append_score_history,
+                                          mark_scored, scoring_config_fingerprint, score_fingerprint)
+from sync_edinet import run_sync
 
 # APIキー
 API_KEY = ""
@@ -19,43 +29,10 @@ with open(os.path.join(os.path.dirname(__file__), 'config', 'edinet_code_map.jso
     CODE_MAP = json.load(f)
 
 # Step 1: 有報収集（2年分 - 成長率計算のため）
-print("📡 EDINET有報一覧を収集中（2年分）...")
-all_docs = {}  # edinet_code -> [doc_new, doc_old]
-
-search_dates = []
-for year in [2024, 2025, 2023]:
-    for month in [6, 7, 3, 4, 5, 8, 9, 10, 11, 12]:
-        for day in [1, 5, 10, 15, 20, 25, 28]:
-            try:
-                d = datetime.date(year, month, day)
-                if d <= datetime.date.today():
-                    search_dates.append(d.isoformat())
-            except:
-                pass
-search_dates.sort(reverse=True)
-
-found = 0
-for date_str in search_dates:
-    try:
-        url = f"https://api.edinet-fsa.go.jp/api/v2/documents.json?date={date_str}&type=2&Subscription-Key={API_KEY}"
-        resp = requests.get(url, timeout=30)
-        if resp.status_code != 200:
-            continue
-        data = resp.json()
-        for doc in data.get("results", []):
-            ec = doc.get("edinetCode", "")
-            if doc.get("docTypeCode") == "120" and ec:
-                if ec not in all_docs:
-                    all_docs[ec] = []
-                if len(all_docs[ec]) < 2:
-                    all_docs[ec].append(doc)
-                    found += 1
-        print(f"  {date_str}: 累計{found}件", flush=True)
-    except:
-        pass
-    time.sleep(0.3)
-    if found >= 4000:
-        break
+print("📡 EDINET有報一覧を同期中（2年分）...")
+# 書類一覧は未取得の日付だけ差分同期し、インデックスから引く
+run_sync(API_KEY)
+all_docs = find_latest_documents("120", per_code=2)  # edinet_code -> [doc_new, doc_old]
 
 print(f"✅ 有報収集完了（{len(all_docs)}社）", flush=True)
 
@@ -82,26 +59,57 @@ for j, code in enumerate(stock_codes_to_fetch):
     time.sleep(0.15)
 print(f"✅ 株価取得完了（{len(prices)}銘柄）", flush=True)
 
-# Step 3: 分析
-print(f"📊 分析開始（対象: {len(all_docs)}社）", flush=True)
+# Step 3: 分析（取得済みの書類は原本ストアから読み、未取得分のダウンロードは並列・レート制限付き、パースとスコアリングは取得済みのものから順に実行）
+jobs = []
+job_docs = {}  # stock_code -> [doc_new, doc_old]
+for edinet_code, docs in all_docs.items():
+    stock_code = edinet_to_stock.get(edinet_code)
+    if stock_code:
+        jobs.append((stock_code, [d["docID"] for d in docs[:2]]))
+        job_docs[stock_code] = docs[:2]
+
+print(f"📊 分析開始（対象: {len(jobs)}社）", flush=True)
 print("=" * 50, flush=True)
 success = fail = 0
+cube_rows = []  # スコアキューブ用（銘柄コード, 企業名, 指標）
+
+# スコアはまとめて保存する（1銘柄ごとのコミット・HTTPリクエストを避ける）
+SCORE_FLUSH_SIZE = 200
+score_buffer = []
+# スコア履歴はこの実行の run_id で追記する（前回から変わった銘柄だけ）
+run_id = start_batch_run("analyze")
+# 保存できた銘柄に記録するフィンガープリント用（設定は実行中に変わらない）
+config_fp = scoring_config_fingerprint()
+
+
+def flush_scores():
+    if score_buffer:
+        save_stock_scores_bulk(score_buffer)
+        # stock_scores に書けた銘柄だけ「スコア計算済み」にする（途中で落ちても rescore で拾える）
+        mark_scored({code: score_fingerprint(indicators, config_fp) for code, _, _, indicators in score_buffer})
+        append_score_history(run_id, score_buffer)
+        score_buffer.clear()
+
+# パース済みの書類はダウンロードしない（原本ストアが空でも財務データストアから読める）
+parsed_doc_ids = get_parsed_doc_ids([d for _, doc_ids in jobs for d in doc_ids])
+print(f"🗂️ パース済み: {len(parsed_doc_ids)}件（ダウンロード不要）", flush=True)
+
+
+def fetch_unparsed(doc_id, *args, **kwargs):
+    if doc_id in parsed_doc_ids:
+        return None
+    return fetch_filing(doc_id, *args, **kwargs)
+
+
 start_time = time.time()
 
-for i, (edinet_code, docs) in enumerate(all_docs.items(), 1):
-    stock_code = edinet_to_stock.get(edinet_code)
-    if not stock_code:
-        continue
+for i, (stock_code, contents) in enumerate(iter_downloads(jobs, API_KEY, fetch=fetch_unparsed), 1):
     name = CODE_MAP[stock_code]["name"]
 
     try:
-        # 最新有報のXBRL取得・パース
-        doc_id = docs[0]["docID"]
-        r = requests.get(f"https://api.edinet-fsa.go.jp/api/v2/documents/{doc_id}?type=1&Subscription-Key={API_KEY}", timeout=60)
-        if r.status_code != 200:
-            fail += 1
-            continue
-        financial = parse_xbrl(r.content)
+        # 最新有報のXBRLパース（パース済みなら財務データストアから読む）
+        docs = job_docs[stock_code]
+        financial = get_or_parse_financial(docs[0]["docID"], contents[0], stock_code, docs[0]["periodEnd"])
         if not financial:
             fail += 1
             continue
@@ -115,29 +123,45 @@ for i, (edinet_code, docs) in enumerate(all_docs.items(), 1):
         # 成長率（前年有報がある場合）
         if len(docs) >= 2:
             try:
-                r2 = requests.get(f"https://api.edinet-fsa.go.jp/api/v2/documents/{docs[1]['docID']}?type=1&Subscription-Key={API_KEY}", timeout=60)
-                if r2.status_code == 200:
-                    prev_fin = parse_xbrl(r2.content)
-                    if prev_fin:
-                        growth = calc_growth(financial, prev_fin)
-                        indicators.update(growth)
+                prev_fin = get_or_parse_financial(docs[1]["docID"], contents[1], stock_code, docs[1]["periodEnd"])
+                if prev_fin:
+                    growth = calc_growth(financial, prev_fin)
+                    indicators.update(growth)
             except:
                 pass
 
         # スコア
         score_result = calc_total_score(indicators, "バランス", "中期（1〜3年）")
-        save_stock_score(stock_code, name, score_result, indicators)
+        save_indicators(stock_code, name, indicators, docs[0]["docID"], docs[1]["docID"] if len(docs) >= 2 else None, price,
+                        scored=False)
+        score_buffer.append((stock_code, name, score_result, indicators))
+        if len(score_buffer) >= SCORE_FLUSH_SIZE:
+            flush_scores()
+        cube_rows.append((stock_code, name, indicators))
         success += 1
 
         elapsed = time.time() - start_time
-        rate = success / (elapsed / 60) if elapsed > 0 else 0
-        eta = (len(all_docs) - i) / rate if rate > 0 else 0
-        print(f"[{i}/{len(all_docs)}] ✅ {name[:15]}({stock_code}) {score_result['total_score']}点 成長{score_result['category_scores'].get('成長性',0)} 割安{score_result['category_scores'].get('割安度',0)} | 残り{eta:.0f}分", flush=True)
+        rate = i / (elapsed / 60) if elapsed > 0 else 0
+        eta = (len(jobs) - i) / rate if rate > 0 else 0
+        print(f"[{i}/{len(jobs)}] ✅ {name[:15]}({stock_code}) {score_result['total_score']}点 成長{score_result['category_scores'].get('成長性',0)} 割安{score_result['category_scores'].get('割安度',0)} | 残り{eta:.0f}分", flush=True)
 
     except Exception as e:
         fail += 1
 
-    time.sleep(0.3)
+flush_scores()
+finish_batch_run(run_id, success)
+
+# 全スタイル×期間の総合スコアをまとめて計算して保存（ランキング・スクリーニング用）
+cube = update_score_cube(cube_rows)
+if cube is not None:
+    print(f"🧊 スコアキューブ更新: {len(cube['codes'])}銘柄", flush=True)
+
+# 全銘柄内のパーセンタイルとセクター内zスコア（銘柄ページ・セクター分析用）
+print(f"📐 相対評価更新: {refresh_peer_stats()}銘柄", flush=True)
+# 強制フィルターの警告を全銘柄まとめて判定（スクリーニングでの除外用）
+print(f"🚩 警告判定更新: {refresh_risk_flags()}銘柄", flush=True)
+# ランキングページ用の並び替え済みスナップショット（この実行の run_id を版にする）
+print(f"🏆 ランキングスナップショット公開: 版{publish_ranking_snapshot(cube, run_id)}", flush=True)
 
 elapsed = time.time() - start_time
 print("=" * 50, flush=True)
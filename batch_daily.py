@@ -6,10 +6,19 @@
 import os, sys, json, time, datetime, requests
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from data.database import save_stock_score, get_scores_count, init_db
+from data.database import save_stock_scores_bulk, get_scores_count, init_db
 from analysis.indicators import calc_indicators, calc_growth
 from analysis.scoring import calc_total_score
-from parsers.xbrl_parser import parse_xbrl
+from analysis.score_cube import update_score_cube
+from analysis.peers import refresh_peer_stats
+from analysis.filters import refresh_risk_flags
+from analysis.ranking_snapshot import publish_ranking_snapshot
+from data_sources.edinet_index import find_latest_documents
+from data_sources.filing_store import fetch_filing
+from data_sources.financial_store import (get_or_parse_financial, save_indicators, start_batch_run,
+                                          finish_batch_run, append_score_history, mark_scored,
+                                          scoring_config_fingerprint, score_fingerprint)
+from sync_edinet import run_sync
 
 init_db()
 
@@ -70,41 +79,10 @@ for code in today_codes:
         target_edinet[ec] = code
 
 print(f"📡 有報検索中（{len(target_edinet)}社）...", flush=True)
-all_docs = {}  # edinet_code -> [doc_new, doc_old]
-
-search_dates = []
-for year in [2025, 2024, 2023]:
-    for month in range(1, 13):
-        for day in [1, 5, 10, 15, 20, 25, 28]:
-            try:
-                d = datetime.date(year, month, day)
-                if d <= datetime.date.today():
-                    search_dates.append(d.isoformat())
-            except:
-                pass
-search_dates.sort(reverse=True)
-
-for date_str in search_dates:
-    try:
-        url = f"https://api.edinet-fsa.go.jp/api/v2/documents.json?date={date_str}&type=2&Subscription-Key={API_KEY}"
-        resp = requests.get(url, timeout=30)
-        if resp.status_code != 200:
-            continue
-        data = resp.json()
-        for doc in data.get("results", []):
-            ec = doc.get("edinetCode", "")
-            if doc.get("docTypeCode") == "120" and ec in target_edinet:
-                if ec not in all_docs:
-                    all_docs[ec] = []
-                if len(all_docs[ec]) < 2:
-                    all_docs[ec].append(doc)
-    except:
-        pass
-    time.sleep(0.3)
-    # 全対象が2年分見つかったら終了
-    has_two = sum(1 for v in all_docs.values() if len(v) >= 2)
-    if has_two >= len(target_edinet) * 0.8:
-        break
+# 書類一覧は未取得の日付だけ差分同期し、インデックスから引く
+run_sync(API_KEY)
+latest_docs = find_latest_documents("120", per_code=2)
+all_docs = {ec: latest_docs[ec] for ec in target_edinet if ec in latest_docs}  # edinet_code -> [doc_new, doc_old]
 
 print(f"✅ 有報{len(all_docs)}社分収集完了", flush=True)
 
@@ -132,6 +110,25 @@ print(f"✅ 株価{len(prices)}件取得完了", flush=True)
 # 分析
 print("📊 分析中...", flush=True)
 success = fail = skip = 0
+cube_rows = []  # スコアキューブ用（銘柄コード, 企業名, 指標）
+
+# スコアはまとめて保存する（1銘柄ごとのコミット・HTTPリクエストを避ける）
+SCORE_FLUSH_SIZE = 200
+score_buffer = []
+# スコア履歴はこの実行の run_id で追記する（前回から変わった銘柄だけ）
+run_id = start_batch_run("daily")
+# 保存できた銘柄に記録するフィンガープリント用（設定は実行中に変わらない）
+config_fp = scoring_config_fingerprint()
+
+
+def flush_scores():
+    if score_buffer:
+        save_stock_scores_bulk(score_buffer)
+        # stock_scores に書けた銘柄だけ「スコア計算済み」にする（途中で落ちても rescore で拾える）
+        mark_scored({code: score_fingerprint(indicators, config_fp) for code, _, _, indicators in score_buffer})
+        append_score_history(run_id, score_buffer)
+        score_buffer.clear()
+
 
 for code in today_codes:
     name = CODE_MAP[code]["name"]
@@ -143,14 +140,9 @@ for code in today_codes:
 
     docs = all_docs[ec]
     try:
-        # 最新有報
-        doc_id = docs[0]["docID"]
-        r = requests.get(f"https://api.edinet-fsa.go.jp/api/v2/documents/{doc_id}?type=1&Subscription-Key={API_KEY}", timeout=60)
-        if r.status_code != 200:
-            fail += 1
-            continue
-
-        financial = parse_xbrl(r.content)
+        # 最新有報（パース済みなら財務データストアから、取得済みなら原本ストアから読む）
+        financial = get_or_parse_financial(docs[0]["docID"], lambda: fetch_filing(docs[0]["docID"], API_KEY),
+                                         code, docs[0]["periodEnd"])
         if not financial:
             fail += 1
             continue
@@ -161,16 +153,20 @@ for code in today_codes:
         # 成長率
         if len(docs) >= 2:
             try:
-                r2 = requests.get(f"https://api.edinet-fsa.go.jp/api/v2/documents/{docs[1]['docID']}?type=1&Subscription-Key={API_KEY}", timeout=60)
-                if r2.status_code == 200:
-                    prev_fin = parse_xbrl(r2.content)
-                    if prev_fin:
-                        indicators.update(calc_growth(financial, prev_fin))
+                prev_fin = get_or_parse_financial(docs[1]["docID"], lambda: fetch_filing(docs[1]["docID"], API_KEY),
+                                               code, docs[1]["periodEnd"])
+                if prev_fin:
+                    indicators.update(calc_growth(financial, prev_fin))
             except:
                 pass
 
         score_result = calc_total_score(indicators, "バランス", "中期（1〜3年）")
-        save_stock_score(code, name, score_result, indicators)
+        save_indicators(code, name, indicators, docs[0]["docID"], docs[1]["docID"] if len(docs) >= 2 else None, price,
+                        scored=False)
+        score_buffer.append((code, name, score_result, indicators))
+        if len(score_buffer) >= SCORE_FLUSH_SIZE:
+            flush_scores()
+        cube_rows.append((code, name, indicators))
         success += 1
         print(f"  ✅ {name[:15]}({code}) {score_result['total_score']}点 成長{score_result['category_scores'].get('成長性',0)} 割安{score_result['category_scores'].get('割安度',0)}", flush=True)
 
@@ -179,6 +175,21 @@ for code in today_codes:
 
     time.sleep(0.3)
 
+flush_scores()
+finish_batch_run(run_id, success)
+
+# 全スタイル×期間の総合スコアをまとめて計算して保存（ランキング・スクリーニング用）
+cube = update_score_cube(cube_rows)
+if cube is not None:
+    print(f"🧊 スコアキューブ更新: {len(cube['codes'])}銘柄", flush=True)
+
+# 全銘柄内のパーセンタイルとセクター内zスコア（銘柄ページ・セクター分析用）
+print(f"📐 相対評価更新: {refresh_peer_stats()}銘柄", flush=True)
+# 強制フィルターの警告を全銘柄まとめて判定（スクリーニングでの除外用）
+print(f"🚩 警告判定更新: {refresh_risk_flags()}銘柄", flush=True)
+# ランキングページ用の並び替え済みスナップショット（この実行の run_id を版にする）
+print(f"🏆 ランキングスナップショット公開: 版{publish_ranking_snapshot(cube, run_id)}", flush=True)
+
 # 進捗更新
 progress["offset"] = offset + BATCH_SIZE
 progress["last_run"] = datetime.datetime.now().isoformat()
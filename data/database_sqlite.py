@@ -1,22 +1,84 @@
-"""SQLiteデータベース管理"""
+"""SQLiteデータベース管理
+- 接続はスレッドごとに1本を使い回す（Streamlitのセッションごとのスレッド・バッチで共有しない）
+- WALモードなので、読み込み（ランキングなど）は書き込み（save_stock_score など）を待たない
+- テーブル作成は最初の接続時に1回だけ行う（import時には何もしない）
+"""
 import sqlite3
 import os
 import json
 import datetime
+import threading
+import atexit
 
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kabu_analyzer.db')
 
+# 接続設定
+BUSY_TIMEOUT_SEC = 30            # 他の書き込みがロック中のときに待つ秒数
+CACHE_SIZE_KB = 16 * 1024        # ページキャッシュ（接続ごと）
+MMAP_SIZE = 256 * 1024 * 1024    # 読み込みをメモリマップで行う上限
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+_local = threading.local()
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SEC)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _conn():
+    """このスレッドの共有接続を返す（閉じないこと）。DB_PATH が変わったら開き直す"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = _open(DB_PATH)
+    _local.conn = conn
+    _local.path = DB_PATH
+    if DB_PATH not in _initialized_paths:
+        with _init_lock:
+            if DB_PATH not in _initialized_paths:
+                _create_tables(conn)
+                _initialized_paths.add(DB_PATH)
     return conn
 
 
+def close_connection():
+    """このスレッドの共有接続を閉じる（WALの内容はDB本体に書き戻される）"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# 終了時にメインスレッドの接続を閉じ、WALの内容をDB本体に書き戻す
+atexit.register(close_connection)
+
+
+def get_connection():
+    """
+    新しい接続を返す（呼び出し側で close する。レポート履歴・管理画面などの個別SQL用）
+    設定は共有接続と同じ
+    """
+    _conn()  # テーブル作成を済ませておく
+    return _open(DB_PATH)
+
+
 def init_db():
-    """テーブル作成"""
-    conn = get_connection()
+    """テーブル作成（最初の接続時に自動で行われるので、明示的に呼ばなくてもよい）"""
+    _conn()
+
+
+def _create_tables(conn):
     c = conn.cursor()
 
     # ユーザーテーブル
@@ -113,114 +175,141 @@ def init_db():
     )""")
 
     conn.commit()
-    conn.close()
+    _migrate(conn)
+
+
+# スキーマ移行（PRAGMA user_version に適用済みの番号を記録し、未適用のものだけ順に実行する）
+MIGRATIONS = [
+    # 1: 参照パターンに合わせたインデックス
+    [
+        # get_analysis_history: username で絞って analyzed_at の新しい順
+        "CREATE INDEX IF NOT EXISTS idx_history_user_time ON analysis_history (username, analyzed_at DESC)",
+        # get_user_stats: 件数・銘柄数・銘柄別件数をテーブルを読まずにインデックスだけで数える
+        "CREATE INDEX IF NOT EXISTS idx_history_user_stock ON analysis_history (username, stock_code, company_name)",
+        # get_stock_history: stock_code で絞って analyzed_at の新しい順
+        "CREATE INDEX IF NOT EXISTS idx_history_stock_time ON analysis_history (stock_code, analyzed_at DESC)",
+        # get_watchlist: username で絞って added_at 順（stock_code まで含めてインデックスだけで返す）
+        "CREATE INDEX IF NOT EXISTS idx_watchlist_user_time ON watchlist (username, added_at, stock_code)",
+        # get_all_scores: total_score の高い順
+        "CREATE INDEX IF NOT EXISTS idx_stock_scores_total ON stock_scores (total_score DESC)",
+    ],
+    # 2: キーセットページング（total_score の高い順、同点は stock_code 順）を並べ替えなしで読む
+    [
+        "DROP INDEX IF EXISTS idx_stock_scores_total",
+        "CREATE INDEX idx_stock_scores_total ON stock_scores (total_score DESC, stock_code)",
+    ],
+]
+
+
+def _migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS, 1):
+        if number <= version:
+            continue
+        with conn:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version={number}")
+    if version < len(MIGRATIONS):
+        # 新しいインデックスをクエリプランナーに使わせるため統計を更新
+        conn.execute("PRAGMA optimize")
 
 
 # ── 分析履歴 ──
 def save_analysis(username, stock_code, company_name, score_result, indicators, style, period):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('''INSERT INTO analysis_history
-        (username, stock_code, company_name, total_score, profitability, safety, growth, value,
-         roe, per, pbr, dividend_yield, style, period, analyzed_at)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-        (username, stock_code, company_name,
-         score_result["total_score"],
-         score_result["category_scores"].get("収益性", 0),
-         score_result["category_scores"].get("安全性", 0),
-         score_result["category_scores"].get("成長性", 0),
-         score_result["category_scores"].get("割安度", 0),
-         indicators.get("ROE", 0), indicators.get("PER", 0),
-         indicators.get("PBR", 0), indicators.get("配当利回り", 0),
-         style, period,
-         datetime.datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+    conn = _conn()
+    with conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO analysis_history
+            (username, stock_code, company_name, total_score, profitability, safety, growth, value,
+             roe, per, pbr, dividend_yield, style, period, analyzed_at)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
+            (username, stock_code, company_name,
+             score_result["total_score"],
+             score_result["category_scores"].get("収益性", 0),
+             score_result["category_scores"].get("安全性", 0),
+             score_result["category_scores"].get("成長性", 0),
+             score_result["category_scores"].get("割安度", 0),
+             indicators.get("ROE", 0), indicators.get("PER", 0),
+             indicators.get("PBR", 0), indicators.get("配当利回り", 0),
+             style, period,
+             datetime.datetime.now().isoformat()))
 
 
 def get_analysis_history(username, limit=20):
-    conn = get_connection()
+    conn = _conn()
     c = conn.cursor()
     c.execute('''SELECT * FROM analysis_history WHERE username=?
                  ORDER BY analyzed_at DESC LIMIT ?''', (username, limit))
     rows = [dict(r) for r in c.fetchall()]
-    conn.close()
     return rows
 
 
 def get_stock_history(stock_code, limit=10):
-    conn = get_connection()
+    conn = _conn()
     c = conn.cursor()
     c.execute('''SELECT * FROM analysis_history WHERE stock_code=?
                  ORDER BY analyzed_at DESC LIMIT ?''', (stock_code, limit))
     rows = [dict(r) for r in c.fetchall()]
-    conn.close()
     return rows
 
 
 # ── ウォッチリスト ──
 def save_watchlist(username, stock_code):
-    conn = get_connection()
-    c = conn.cursor()
+    conn = _conn()
     try:
-        c.execute('INSERT OR IGNORE INTO watchlist (username, stock_code) VALUES (?,?)',
-                  (username, stock_code))
-        conn.commit()
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO watchlist (username, stock_code) VALUES (?,?)',
+                         (username, stock_code))
     except:
         pass
-    conn.close()
 
 
 def get_watchlist(username):
-    conn = get_connection()
+    conn = _conn()
     c = conn.cursor()
     c.execute('SELECT stock_code FROM watchlist WHERE username=? ORDER BY added_at', (username,))
     codes = [r["stock_code"] for r in c.fetchall()]
-    conn.close()
     return codes
 
 
 def remove_watchlist(username, stock_code):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('DELETE FROM watchlist WHERE username=? AND stock_code=?', (username, stock_code))
-    conn.commit()
-    conn.close()
+    conn = _conn()
+    with conn:
+        c = conn.cursor()
+        c.execute('DELETE FROM watchlist WHERE username=? AND stock_code=?', (username, stock_code))
 
 
 # ── ポートフォリオ ──
 def save_portfolio(username, stock_code, company_name, amount):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('''INSERT INTO portfolio (username, stock_code, company_name, amount, updated_at)
-                 VALUES (?,?,?,?,?)
-                 ON CONFLICT(username, stock_code) DO UPDATE SET amount=?, updated_at=?''',
-              (username, stock_code, company_name, amount,
-               datetime.datetime.now().isoformat(), amount, datetime.datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+    conn = _conn()
+    with conn:
+        c = conn.cursor()
+        c.execute('''INSERT INTO portfolio (username, stock_code, company_name, amount, updated_at)
+                     VALUES (?,?,?,?,?)
+                     ON CONFLICT(username, stock_code) DO UPDATE SET amount=?, updated_at=?''',
+                  (username, stock_code, company_name, amount,
+                   datetime.datetime.now().isoformat(), amount, datetime.datetime.now().isoformat()))
 
 
 def get_portfolio(username):
-    conn = get_connection()
+    conn = _conn()
     c = conn.cursor()
     c.execute('SELECT * FROM portfolio WHERE username=? ORDER BY updated_at', (username,))
     rows = [dict(r) for r in c.fetchall()]
-    conn.close()
     return rows
 
 
 def remove_portfolio(username, stock_code):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('DELETE FROM portfolio WHERE username=? AND stock_code=?', (username, stock_code))
-    conn.commit()
-    conn.close()
+    conn = _conn()
+    with conn:
+        c = conn.cursor()
+        c.execute('DELETE FROM portfolio WHERE username=? AND stock_code=?', (username, stock_code))
 
 
 # ── 統計 ──
 def get_user_stats(username):
-    conn = get_connection()
+    conn = _conn()
     c = conn.cursor()
     c.execute('SELECT COUNT(*) as total FROM analysis_history WHERE username=?', (username,))
     total = c.fetchone()["total"]
@@ -229,70 +318,181 @@ def get_user_stats(username):
     c.execute('''SELECT stock_code, company_name, COUNT(*) as cnt FROM analysis_history
                  WHERE username=? GROUP BY stock_code ORDER BY cnt DESC LIMIT 5''', (username,))
     top = [dict(r) for r in c.fetchall()]
-    conn.close()
     return {"total_analyses": total, "unique_stocks": unique, "top_stocks": top}
 
 
-    # スコアキャッシュテーブル
-    c.execute("""CREATE TABLE IF NOT EXISTS stock_scores (
-        stock_code TEXT PRIMARY KEY,
-        company_name TEXT,
-        total_score INTEGER,
-        profitability INTEGER,
-        safety INTEGER,
-        growth INTEGER,
-        value INTEGER,
-        roe REAL, roa REAL, per REAL, pbr REAL,
-        dividend_yield REAL, operating_margin REAL, equity_ratio REAL,
-        judgment TEXT, updated_at TEXT
-    )""")
-
-    conn.commit()
-    conn.close()
+_SCORE_UPSERT = """INSERT OR REPLACE INTO stock_scores
+    (stock_code, company_name, total_score, profitability, safety, growth, value,
+     roe, roa, per, pbr, dividend_yield, operating_margin, equity_ratio, judgment, updated_at)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"""
 
 
-def save_stock_score(code, name, score_result, indicators):
-    import datetime
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("""INSERT OR REPLACE INTO stock_scores
-        (stock_code, company_name, total_score, profitability, safety, growth, value,
-         roe, roa, per, pbr, dividend_yield, operating_margin, equity_ratio, judgment, updated_at)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-        (code, name,
-         score_result["total_score"],
-         score_result["category_scores"].get("収益性", 0),
-         score_result["category_scores"].get("安全性", 0),
-         score_result["category_scores"].get("成長性", 0),
-         score_result["category_scores"].get("割安度", 0),
-         indicators.get("ROE", 0), indicators.get("ROA", 0),
-         indicators.get("PER", 0), indicators.get("PBR", 0),
-         indicators.get("配当利回り", 0), indicators.get("営業利益率", 0),
-         indicators.get("自己資本比率", 0),
-         score_result.get("judgment", ""),
-         datetime.datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+def _score_row(code, name, score_result, indicators):
+    return (code, name,
+            score_result["total_score"],
+            score_result["category_scores"].get("収益性", 0),
+            score_result["category_scores"].get("安全性", 0),
+            score_result["category_scores"].get("成長性", 0),
+            score_result["category_scores"].get("割安度", 0),
+            indicators.get("ROE", 0), indicators.get("ROA", 0),
+            indicators.get("PER", 0), indicators.get("PBR", 0),
+            indicators.get("配当利回り", 0), indicators.get("営業利益率", 0),
+            indicators.get("自己資本比率", 0),
+            score_result.get("judgment", ""),
+            datetime.datetime.now().isoformat())
 
 
-def get_all_scores(min_score=0, limit=3732):
-    conn = get_connection()
+def save_stock_score(code, name, score_result, indicators):
+    conn = _conn()
+    with conn:
+        conn.execute(_SCORE_UPSERT, _score_row(code, name, score_result, indicators))
+
+
+def save_stock_scores_bulk(rows):
+    """
+    複数銘柄のスコアを1トランザクションで保存する
+    rows: (証券コード, 企業名, score_result, indicators) のリスト
+    """
+    conn = _conn()
+    with conn:
+        conn.executemany(_SCORE_UPSERT, [_score_row(*row) for row in rows])
+    return len(rows)
+
+
+# 一覧表示（ランキング・スクリーニングなど）で使う列
+SCORE_LIST_COLUMNS = ("stock_code", "company_name", "total_score", "profitability", "safety", "growth", "value",
+                      "roe", "per", "dividend_yield")
+SCORE_COLUMNS = SCORE_LIST_COLUMNS + ("roa", "pbr", "operating_margin", "equity_ratio", "judgment", "updated_at")
+# キーセットページングの1ページの行数
+SCORE_PAGE_SIZE = 1000
+
+
+def _score_columns(columns):
+    """SELECT する列（列名は SCORE_COLUMNS にあるものだけ受け付ける）"""
+    if not columns:
+        return "*"
+    unknown = set(columns) - set(SCORE_COLUMNS)
+    if unknown:
+        raise ValueError(f"unknown columns: {sorted(unknown)}")
+    return ", ".join(columns)
+
+
+def get_all_scores(min_score=0, limit=3732, columns=None):
+    conn = _conn()
     c = conn.cursor()
-    c.execute("""SELECT * FROM stock_scores WHERE total_score >= ?
+    c.execute(f"""SELECT {_score_columns(columns)} FROM stock_scores WHERE total_score >= ?
                  ORDER BY total_score DESC LIMIT ?""", (min_score, limit))
     rows = [dict(r) for r in c.fetchall()]
-    conn.close()
     return rows
 
 
+def get_scores_by_codes(codes, columns=None):
+    """指定した銘柄のスコアだけを返す（主キーで引く）"""
+    codes = list(dict.fromkeys(codes))
+    rows = []
+    conn = _conn()
+    # SQLiteのパラメータ上限を超えないよう分割
+    for i in range(0, len(codes), 500):
+        chunk = codes[i:i + 500]
+        c = conn.execute(f"SELECT {_score_columns(columns)} FROM stock_scores WHERE stock_code IN ({','.join('?' * len(chunk))})",
+                         chunk)
+        rows.extend(dict(r) for r in c.fetchall())
+    return rows
+
+
+def get_scores_page(min_score=0, limit=SCORE_PAGE_SIZE, after=None, columns=None):
+    """
+    total_score の高い順（同点は stock_code 順）に limit 件を返す
+    after: 前のページの最後の行の (total_score, stock_code)。その次の行から返す（OFFSETのように読み飛ばさない）
+    """
+    columns = list(columns) if columns else None
+    # 次のページのキーを作れるよう、並び順の列は必ず含める
+    if columns:
+        columns += [c for c in ("total_score", "stock_code") if c not in columns]
+    sql = f"SELECT {_score_columns(columns)} FROM stock_scores WHERE total_score >= ?"
+    params = [min_score]
+    if after is not None:
+        sql += " AND (total_score < ? OR (total_score = ? AND stock_code > ?))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY total_score DESC, stock_code LIMIT ?"
+    params.append(limit)
+    return [dict(r) for r in _conn().execute(sql, params)]
+
+
+def iter_scores(min_score=0, columns=None, page_size=SCORE_PAGE_SIZE):
+    """全銘柄のスコアを total_score の高い順に1ページずつ読みながら返す"""
+    after = None
+    while True:
+        rows = get_scores_page(min_score, page_size, after, columns)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["total_score"], rows[-1]["stock_code"])
+
+
+# スクリーニング条件（analysis.screener.SCREEN_CONDITIONS）の下限と列の対応
+_SCREEN_MIN_COLUMNS = {"min_total": "total_score", "min_roe": "roe", "min_dividend": "dividend_yield",
+                       "min_profitability": "profitability", "min_safety": "safety",
+                       "min_growth": "growth", "min_value": "value"}
+
+
+def screen_scores(conditions, offset=0, limit=100, columns=None, exclude_codes=None):
+    """
+    条件を満たす銘柄を total_score の高い順に offset 件目から limit 件返す
+    条件はパラメータ化した1つのWHEREにまとめ、件数も同じ条件の COUNT(*) で数える
+    returns: (該当件数, 行のリスト)
+    """
+    where, params = [], []
+    for key, column in _SCREEN_MIN_COLUMNS.items():
+        if conditions.get(key) is not None:
+            where.append(f"{column} >= ?")
+            params.append(conditions[key])
+    if conditions.get("max_per") is not None:
+        # PERが0（算出できない）銘柄は上限を指定したときは除く
+        where.append("per != 0 AND per <= ?")
+        params.append(conditions["max_per"])
+    if exclude_codes:
+        exclude_codes = list(exclude_codes)
+        where.append(f"stock_code NOT IN ({','.join('?' * len(exclude_codes))})")
+        params += exclude_codes
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    conn = _conn()
+    count = conn.execute(f"SELECT COUNT(*) FROM stock_scores {where_sql}", params).fetchone()[0]
+    rows = conn.execute(f"""SELECT {_score_columns(columns)} FROM stock_scores {where_sql}
+                            ORDER BY total_score DESC, stock_code LIMIT ? OFFSET ?""", params + [limit, offset])
+    return count, [dict(r) for r in rows]
+
+
+def get_score_summary():
+    """全銘柄の総合スコアの件数・平均・最高・最低・中央値（銘柄がなければ件数0だけ）"""
+    conn = _conn()
+    row = conn.execute("""SELECT COUNT(*) as cnt, AVG(total_score) as avg,
+                                 MAX(total_score) as max, MIN(total_score) as min
+                          FROM stock_scores""").fetchone()
+    summary = dict(row)
+    if summary["cnt"] == 0:
+        return {"cnt": 0}
+    # 中央値（sorted(scores)[件数 // 2] と同じ値）はインデックスを高い方から読み進めて取る
+    summary["median"] = conn.execute(
+        "SELECT total_score FROM stock_scores ORDER BY total_score DESC LIMIT 1 OFFSET ?",
+        ((summary["cnt"] - 1) // 2,)).fetchone()["total_score"]
+    return summary
+
+
+def get_score_histogram(bin_width=5):
+    """
+    総合スコアを bin_width 点刻みで数える。[{"bin": 区間の下限, "cnt": 銘柄数}, ...]（0件の区間は含まない）
+    100点は最後の区間（100 - bin_width 〜 100）に含める
+    """
+    c = _conn().execute("""SELECT MIN((total_score / ?) * ?, 100 - ?) as bin, COUNT(*) as cnt FROM stock_scores
+                           GROUP BY bin ORDER BY bin""", (bin_width, bin_width, bin_width))
+    return [dict(r) for r in c.fetchall()]
+
+
 def get_scores_count():
-    conn = get_connection()
+    conn = _conn()
     c = conn.cursor()
     c.execute("SELECT COUNT(*) as cnt FROM stock_scores")
     cnt = c.fetchone()["cnt"]
-    conn.close()
     return cnt
 
-
-# 初期化実行
-init_db()
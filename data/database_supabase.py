@@ -1,48 +1,145 @@
 """Supabase版データベース関数"""
-import os
+
+from data.supabase_client import get_client
 
 def _get_client():
-    try:
-        import streamlit as st
-        url = st.secrets.get("SUPABASE_URL", "")
-        key = st.secrets.get("SUPABASE_KEY", "")
-    except:
-        url = os.environ.get("SUPABASE_URL", "")
-        key = os.environ.get("SUPABASE_KEY", "")
-    
-    if not url or not key:
-        # secrets.tomlから直接読む
-        try:
-            with open(os.path.join(os.path.dirname(__file__), '..', '.streamlit', 'secrets.toml')) as f:
-                for line in f:
-                    if 'SUPABASE_URL' in line and '=' in line:
-                        url = line.split('=', 1)[1].strip().strip('"').strip("'")
-                    if 'SUPABASE_KEY' in line and '=' in line:
-                        key = line.split('=', 1)[1].strip().strip('"').strip("'")
-        except:
-            pass
-    
-    from supabase import create_client
-    return create_client(url, key)
+    # クライアントはプロセスで1つを使い回す（毎回作るとsecretsの読み込みとTLS接続が発生する）
+    return get_client()
 
 
 # ===== stock_scores =====
 
-def get_all_scores(min_score=0, limit=100):
+# 一覧表示（ランキング・スクリーニングなど）で使う列
+SCORE_LIST_COLUMNS = ("stock_code", "company_name", "total_score", "profitability", "safety", "growth", "value",
+                      "roe", "per", "dividend_yield")
+# キーセットページングの1ページの行数（PostgRESTの max-rows 以下にする）
+SCORE_PAGE_SIZE = 1000
+
+
+def _select(columns):
+    return ",".join(columns) if columns else "*"
+
+
+def get_all_scores(min_score=0, limit=100, columns=None):
     client = _get_client()
-    result = client.table("stock_scores").select("*").gte("total_score", min_score).order("total_score", desc=True).limit(limit).execute()
+    result = client.table("stock_scores").select(_select(columns)).gte("total_score", min_score).order("total_score", desc=True).limit(limit).execute()
     return result.data
 
 
+def get_scores_by_codes(codes, columns=None):
+    """指定した銘柄のスコアだけを返す（URLが長くなりすぎないよう分割して in で引く）"""
+    codes = list(dict.fromkeys(codes))
+    client = _get_client()
+    rows = []
+    for i in range(0, len(codes), 200):
+        result = client.table("stock_scores").select(_select(columns)).in_("stock_code", codes[i:i + 200]).execute()
+        rows.extend(result.data)
+    return rows
+
+
+def get_scores_page(min_score=0, limit=SCORE_PAGE_SIZE, after=None, columns=None):
+    """
+    total_score の高い順（同点は stock_code 順）に limit 件を返す
+    after: 前のページの最後の行の (total_score, stock_code)。その次の行から返す（offsetのように読み飛ばさない）
+    """
+    columns = list(columns) if columns else None
+    # 次のページのキーを作れるよう、並び順の列は必ず含める
+    if columns:
+        columns += [c for c in ("total_score", "stock_code") if c not in columns]
+    query = _get_client().table("stock_scores").select(_select(columns)).gte("total_score", min_score)
+    if after is not None:
+        score, code = after
+        query = query.or_(f"total_score.lt.{score},and(total_score.eq.{score},stock_code.gt.{code})")
+    result = query.order("total_score", desc=True).order("stock_code").limit(limit).execute()
+    return result.data
+
+
+def iter_scores(min_score=0, columns=None, page_size=SCORE_PAGE_SIZE):
+    """全銘柄のスコアを total_score の高い順に1ページずつ取得しながら返す"""
+    after = None
+    while True:
+        rows = get_scores_page(min_score, page_size, after, columns)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]["total_score"], rows[-1]["stock_code"])
+
+
+# スクリーニング条件（analysis.screener.SCREEN_CONDITIONS）の下限と列の対応
+_SCREEN_MIN_COLUMNS = {"min_total": "total_score", "min_roe": "roe", "min_dividend": "dividend_yield",
+                       "min_profitability": "profitability", "min_safety": "safety",
+                       "min_growth": "growth", "min_value": "value"}
+
+
+def screen_scores(conditions, offset=0, limit=100, columns=None, exclude_codes=None):
+    """
+    条件を満たす銘柄を total_score の高い順に offset 件目から limit 件返す
+    条件はすべてDB側のフィルターにし、件数は count="exact" で同じリクエストで受け取る
+    returns: (該当件数, 行のリスト)
+    """
+    query = _get_client().table("stock_scores").select(_select(columns), count="exact")
+    for key, column in _SCREEN_MIN_COLUMNS.items():
+        if conditions.get(key) is not None:
+            query = query.gte(column, conditions[key])
+    if conditions.get("max_per") is not None:
+        # PERが0（算出できない）銘柄は上限を指定したときは除く
+        query = query.neq("per", 0).lte("per", conditions["max_per"])
+    if exclude_codes:
+        query = query.not_.in_("stock_code", list(exclude_codes))
+    query = query.order("total_score", desc=True).order("stock_code")
+    # limit=0 は件数だけ
+    query = query.range(offset, offset + limit - 1) if limit > 0 else query.limit(0)
+    result = query.execute()
+    return result.count or 0, result.data
+
+
+def _rpc(name, params=None):
+    """supabase_functions.sql の集計関数を呼ぶ。未作成などで呼べなければNone"""
+    try:
+        return _get_client().rpc(name, params or {}).execute().data
+    except Exception:
+        return None
+
+
+def get_score_summary():
+    """全銘柄の総合スコアの件数・平均・最高・最低・中央値（銘柄がなければ件数0だけ）"""
+    summary = _rpc("score_summary")
+    if summary is not None:
+        return summary
+    scores = sorted(r["total_score"] for r in iter_scores(columns=["total_score"]))
+    if not scores:
+        return {"cnt": 0}
+    return {"cnt": len(scores), "avg": sum(scores) / len(scores), "max": scores[-1], "min": scores[0],
+            "median": scores[len(scores) // 2]}
+
+
+def get_score_histogram(bin_width=5):
+    """
+    総合スコアを bin_width 点刻みで数える。[{"bin": 区間の下限, "cnt": 銘柄数}, ...]（0件の区間は含まない）
+    100点は最後の区間（100 - bin_width 〜 100）に含める
+    """
+    histogram = _rpc("score_histogram", {"bin_width": bin_width})
+    if histogram is not None:
+        return histogram
+    counts = {}
+    for r in iter_scores(columns=["total_score"]):
+        b = min(r["total_score"] // bin_width * bin_width, 100 - bin_width)
+        counts[b] = counts.get(b, 0) + 1
+    return [{"bin": b, "cnt": counts[b]} for b in sorted(counts)]
+
+
 def get_scores_count():
     client = _get_client()
     result = client.table("stock_scores").select("*", count="exact").limit(1).execute()
     return result.count or 0
 
 
-def save_stock_score(stock_code, name, score_result, indicators):
-    client = _get_client()
-    row = {
+# 一括upsertで1リクエストに含める行数
+UPSERT_CHUNK_SIZE = 500
+
+
+def _score_row(stock_code, name, score_result, indicators):
+    return {
         "stock_code": stock_code,
         "company_name": name,
         "total_score": score_result["total_score"],
@@ -59,7 +156,25 @@ def save_stock_score(stock_code, name, score_result, indicators):
         "equity_ratio": indicators.get("自己資本比率", 0),
         "judgment": score_result["judgment"],
     }
-    client.table("stock_scores").upsert(row).execute()
+
+
+def save_stock_score(stock_code, name, score_result, indicators):
+    client = _get_client()
+    client.table("stock_scores").upsert(_score_row(stock_code, name, score_result, indicators)).execute()
+
+
+def save_stock_scores_bulk(rows):
+    """
+    複数銘柄のスコアを UPSERT_CHUNK_SIZE 行ずつまとめてupsertする
+    rows: (証券コード, 企業名, score_result, indicators) のリスト
+    """
+    if not rows:
+        return 0
+    client = _get_client()
+    data = [_score_row(*row) for row in rows]
+    for i in range(0, len(data), UPSERT_CHUNK_SIZE):
+        client.table("stock_scores").upsert(data[i:i + UPSERT_CHUNK_SIZE]).execute()
+    return len(data)
 
 
 # ===== watchlist =====
@@ -112,13 +227,19 @@ def get_analysis_history(username, limit=10):
 
 
 def get_user_stats(username):
+    stats = _rpc("user_stats", {"p_username": username})
+    if stats is not None:
+        return stats
+    # 集計関数がなければ銘柄コード・企業名の列だけ取得して数える
     client = _get_client()
-    result = client.table("analysis_history").select("*").eq("username", username).execute()
-    data = result.data
-    if not data:
-        return {"total_analyses": 0, "unique_stocks": 0}
-    unique = set(r["stock_code"] for r in data)
-    return {"total_analyses": len(data), "unique_stocks": len(unique)}
+    result = client.table("analysis_history").select("stock_code,company_name").eq("username", username).execute()
+    counts, names = {}, {}
+    for r in result.data:
+        counts[r["stock_code"]] = counts.get(r["stock_code"], 0) + 1
+        names[r["stock_code"]] = r["company_name"]
+    top = sorted(counts, key=counts.get, reverse=True)[:5]
+    return {"total_analyses": sum(counts.values()), "unique_stocks": len(counts),
+            "top_stocks": [{"stock_code": c, "company_name": names[c], "cnt": counts[c]} for c in top]}
 
 
 # ===== 互換性のため =====
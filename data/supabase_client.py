@@ -0,0 +1,60 @@
+"""Supabaseクライアント
+プロセスで1つだけ作って全セッション・全モジュールで使い回す
+create_client は内部にHTTPのコネクションプールを持つため、使い回せばTLS接続もキープアライブで再利用される
+接続先は SUPABASE_URL で差し替えられる（ローカルのPostgREST互換サーバーに向けてテストする場合など）
+"""
+import os
+import threading
+
+SECRETS_PATH = os.path.join(os.path.dirname(__file__), '..', '.streamlit', 'secrets.toml')
+
+_client = None
+_lock = threading.Lock()
+
+
+def load_credentials():
+    """(url, key) を st.secrets → 環境変数 → secrets.toml の順に探す"""
+    try:
+        import streamlit as st
+        url = st.secrets.get("SUPABASE_URL", "")
+        key = st.secrets.get("SUPABASE_KEY", "")
+    except:
+        url = os.environ.get("SUPABASE_URL", "")
+        key = os.environ.get("SUPABASE_KEY", "")
+
+    if not url or not key:
+        # secrets.tomlから直接読む
+        try:
+            with open(SECRETS_PATH) as f:
+                for line in f:
+                    if 'SUPABASE_URL' in line and '=' in line:
+                        url = line.split('=', 1)[1].strip().strip('"').strip("'")
+                    if 'SUPABASE_KEY' in line and '=' in line:
+                        key = line.split('=', 1)[1].strip().strip('"').strip("'")
+        except:
+            pass
+    return url, key
+
+
+def _create(url, key):
+    from supabase import create_client
+    return create_client(url, key)
+
+
+def get_client():
+    """共有クライアントを返す（初回だけ作成）"""
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            url, key = load_credentials()
+            _client = _create(url, key)
+    return _client
+
+
+def reset_client():
+    """共有クライアントを破棄する（接続先の変更後やテスト用）。次の get_client で作り直す"""
+    global _client
+    with _lock:
+        _client = None
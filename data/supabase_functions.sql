@@ -0,0 +1,49 @@
+-- Supabase（PostgreSQL）側の集計関数とインデックス
+-- SQL Editor で一度実行しておくと、database_supabase.py の集計は行を取得せずDB側で計算される
+-- （未作成のときは database_supabase.py が必要な列だけを取得して数える）
+
+-- 参照パターンに合わせたインデックス
+create index if not exists idx_history_user_time on analysis_history (username, created_at desc);
+create index if not exists idx_history_user_stock on analysis_history (username, stock_code, company_name);
+create index if not exists idx_stock_scores_total on stock_scores (total_score desc, stock_code);
+
+-- get_user_stats: 分析回数・分析銘柄数・よく分析する銘柄（上位 top_n 件）
+create or replace function user_stats(p_username text, top_n int default 5)
+returns json
+language sql stable
+as $$
+  select json_build_object(
+    'total_analyses', (select count(*) from analysis_history where username = p_username),
+    'unique_stocks', (select count(distinct stock_code) from analysis_history where username = p_username),
+    'top_stocks', coalesce((
+      select json_agg(t) from (
+        select stock_code, max(company_name) as company_name, count(*) as cnt
+        from analysis_history where username = p_username
+        group by stock_code order by cnt desc limit top_n
+      ) t), '[]'::json)
+  );
+$$;
+
+-- get_score_summary: 総合スコアの件数・平均・最高・最低・中央値
+create or replace function score_summary()
+returns json
+language sql stable
+as $$
+  select case when count(*) = 0 then json_build_object('cnt', 0) else json_build_object(
+    'cnt', count(*),
+    'avg', avg(total_score),
+    'max', max(total_score),
+    'min', min(total_score),
+    'median', (select total_score from stock_scores order by total_score offset (select count(*) from stock_scores) / 2 limit 1)
+  ) end
+  from stock_scores;
+$$;
+
+-- get_score_histogram: 総合スコアを bin_width 点刻みで数える（100点は最後の区間に含める）
+create or replace function score_histogram(bin_width int default 5)
+returns table (bin int, cnt bigint)
+language sql stable
+as $$
+  select least((total_score / bin_width) * bin_width, 100 - bin_width) as bin, count(*) as cnt
+  from stock_scores group by 1 order by 1;
+$$;
@@ -1,12 +1,50 @@
 """
 分析データキャッシュ
 EDINETから取得したデータをローカルに保存し、再取得を防ぐ
+- 1段目: プロセス内のLRU（Streamlitの全セッションで共有）
+- 2段目: .cache/cache.db（SQLite、既定）または .cache/ 配下のJSONファイル
+  環境変数 KABU_CACHE_BACKEND=file でJSONファイルを使う
+  SQLiteを開いたときに .cache/ 直下に以前のJSONファイルが残っていれば取り込んで削除する
 """
+import copy
 import json
 import os
+import sqlite3
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache")
+CACHE_BACKEND = os.environ.get("KABU_CACHE_BACKEND", "sqlite")
+
+# メモリキャッシュの最大件数
+MEMORY_MAX_ENTRIES = 512
+
+# SQLiteキャッシュの掃除設定（最長の有効期限より古いものを削除し、容量上限を超えたら古い順に削除）
+SWEEP_MAX_AGE_HOURS = 168
+SWEEP_INTERVAL_SEC = 600
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+_memory = OrderedDict()  # key -> (timestamp, value)
+_memory_lock = threading.Lock()
+
+_local = threading.local()
+_last_sweep = 0.0
+
+# キー単位のロック（同じキーの取得処理が同時に走らないようにする）
+# キーのハッシュで固定数のロックに振り分けるので、キーが増えてもロック・ロックファイルは増えない
+LOCK_TIMEOUT_SEC = 180
+LOCK_STRIPES = 64
+_stripe_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+_held = threading.local()  # このスレッドが保持中のストライプ
+_lock_dir_ready = set()
 
 
 def _ensure_dir():
@@ -17,30 +55,323 @@ def _cache_path(key):
     return os.path.join(CACHE_DIR, f"{key}.json")
 
 
-def get_cache(key, max_age_hours=24):
-    """
-    キャッシュを取得。有効期限切れならNoneを返す
-    """
+def _db_path():
+    return os.path.join(CACHE_DIR, "cache.db")
+
+
+# ── メモリ ──
+def _memory_get(key):
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+        return entry
+
+
+def _memory_set(key, timestamp, value):
+    with _memory_lock:
+        _memory[key] = (timestamp, value)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def clear_memory_cache():
+    """メモリキャッシュを空にする（ファイル・DBは残す）"""
+    with _memory_lock:
+        _memory.clear()
+
+
+# ── SQLite ──
+def _get_db():
+    """スレッドごとに接続を使い回す（パスが変わったら開き直す）"""
+    path = _db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == path:
+        return conn
+    _ensure_dir()
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        timestamp REAL NOT NULL,
+        size INTEGER NOT NULL,
+        value TEXT NOT NULL
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_timestamp ON cache_entries (timestamp)")
+    conn.commit()
+    _import_json_files(conn)
+    _local.conn = conn
+    _local.path = path
+    return conn
+
+
+def _import_json_files(conn):
+    """JSONファイルのバックエンドで保存されたエントリを取り込み、ファイルを削除する（DBに同じキーがあればDBを優先）"""
+    names = [f for f in os.listdir(CACHE_DIR) if f.endswith(".json")]
+    if not names:
+        return 0
+    rows = []
+    for name in names:
+        entry = _file_get(name[:-len(".json")])
+        if entry is None or entry[1] is None:
+            continue
+        text = json.dumps(entry[1], ensure_ascii=False)
+        rows.append((name[:-len(".json")], entry[0], len(text.encode("utf-8")), text))
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO cache_entries (key, timestamp, size, value) VALUES (?,?,?,?)", rows)
+    for name in names:
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except OSError:
+            pass
+    return len(rows)
+
+
+def _db_get_many(keys):
+    conn = _get_db()
+    found = {}
+    keys = list(keys)
+    # SQLiteのパラメータ上限を超えないよう分割
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT key, timestamp, value FROM cache_entries WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        for key, timestamp, value in rows:
+            found[key] = (timestamp, json.loads(value))
+    return found
+
+
+def _db_set_many(entries):
+    rows = []
+    for key, timestamp, value in entries:
+        text = json.dumps(value, ensure_ascii=False)
+        rows.append((key, timestamp, len(text.encode("utf-8")), text))
+    conn = _get_db()
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO cache_entries (key, timestamp, size, value) VALUES (?,?,?,?)", rows)
+    _maybe_sweep()
+
+
+def _maybe_sweep():
+    global _last_sweep
+    if time.time() - _last_sweep < SWEEP_INTERVAL_SEC:
+        return
+    _last_sweep = time.time()
+    try:
+        sweep()
+    except sqlite3.Error:
+        pass
+
+
+def sweep(max_age_hours=SWEEP_MAX_AGE_HOURS, max_bytes=MAX_CACHE_BYTES):
+    """期限切れのエントリを削除し、容量上限を超えていれば古い順に削除する。削除件数を返す"""
+    if CACHE_BACKEND != "sqlite":
+        return 0
+    conn = _get_db()
+    with conn:
+        deleted = conn.execute("DELETE FROM cache_entries WHERE timestamp < ?",
+                               (time.time() - max_age_hours * 3600,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total > max_bytes:
+            excess = total - max_bytes
+            cutoff_rows = conn.execute("SELECT key, size FROM cache_entries ORDER BY timestamp").fetchall()
+            victims = []
+            for key, size in cutoff_rows:
+                if excess <= 0:
+                    break
+                victims.append((key,))
+                excess -= size
+            conn.executemany("DELETE FROM cache_entries WHERE key=?", victims)
+            deleted += len(victims)
+    return deleted
+
+
+# ── JSONファイル ──
+def _file_get(key):
     path = _cache_path(key)
     if not os.path.exists(path):
         return None
     try:
         with open(path, "r") as f:
             data = json.load(f)
-        # 有効期限チェック
-        if time.time() - data.get("timestamp", 0) > max_age_hours * 3600:
-            return None
-        return data.get("value")
     except:
         return None
+    return data.get("timestamp", 0), data.get("value")
 
 
-def set_cache(key, value):
-    """キャッシュに保存"""
+def _file_set(key, timestamp, value):
+    """一時ファイルに書き切ってから置き換える（読み手が書きかけのファイルを見ることはない）"""
     _ensure_dir()
     path = _cache_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(path, "w") as f:
-            json.dump({"timestamp": time.time(), "value": value}, f, ensure_ascii=False)
+        with open(tmp_path, "w") as f:
+            json.dump({"timestamp": timestamp, "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
     except:
-        pass
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+# ── 公開API ──
+def _is_fresh(timestamp, max_age_hours):
+    return time.time() - timestamp <= max_age_hours * 3600
+
+
+def get_many(keys, max_age_hours=24):
+    """
+    複数キーをまとめて取得。有効なものだけ {key: value} で返す
+    """
+    entries = {}
+    missing = []
+    for key in keys:
+        entry = _memory_get(key)
+        # メモリ上で期限切れでも、他のプロセスが新しい値を保存している可能性があるので読み直す
+        if entry is None or not _is_fresh(entry[0], max_age_hours):
+            missing.append(key)
+        else:
+            entries[key] = entry
+    if missing:
+        if CACHE_BACKEND == "sqlite":
+            try:
+                loaded = _db_get_many(missing)
+            except sqlite3.Error:
+                loaded = {}
+        else:
+            loaded = {k: e for k, e in ((k, _file_get(k)) for k in missing) if e is not None}
+        for key, entry in loaded.items():
+            _memory_set(key, *entry)
+        entries.update(loaded)
+    # 有効期限チェック（保存時刻はメモリとDB・ファイルで同じなので判定も同じ）
+    # 呼び出し側で変更されても共有中の値が壊れないようコピーを返す
+    return {key: copy.deepcopy(value) for key, (timestamp, value) in entries.items()
+            if _is_fresh(timestamp, max_age_hours)}
+
+
+def set_many(items):
+    """複数の {key: value} をまとめて保存"""
+    timestamp = time.time()
+    entries = [(key, timestamp, value) for key, value in items.items()]
+    for key, ts, value in entries:
+        _memory_set(key, ts, copy.deepcopy(value))
+    if CACHE_BACKEND == "sqlite":
+        try:
+            _db_set_many(entries)
+        except sqlite3.Error:
+            pass
+    else:
+        for entry in entries:
+            _file_set(*entry)
+
+
+def get_cache(key, max_age_hours=24):
+    """
+    キャッシュを取得。有効期限切れならNoneを返す
+    """
+    return get_many([key], max_age_hours).get(key)
+
+
+def set_cache(key, value):
+    """キャッシュに保存"""
+    set_many({key: value})
+
+
+# ── キー単位のロック ──
+def _lock_dir():
+    """ロックファイルの置き場所。最初に使うときに、以前のキーごとのロックファイルを削除する"""
+    lock_dir = os.path.join(CACHE_DIR, "locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    if lock_dir not in _lock_dir_ready:
+        stripes = {f"{i}.lock" for i in range(LOCK_STRIPES)}
+        for name in os.listdir(lock_dir):
+            if name not in stripes:
+                try:
+                    os.remove(os.path.join(lock_dir, name))
+                except OSError:
+                    pass
+        _lock_dir_ready.add(lock_dir)
+    return lock_dir
+
+
+def _stripe_of(key):
+    return zlib.crc32(key.encode("utf-8")) % LOCK_STRIPES
+
+
+@contextmanager
+def key_lock(*keys, timeout=LOCK_TIMEOUT_SEC):
+    """
+    キー単位の排他ロック。プロセス内はスレッドロック、プロセス間は .cache/locks/ のファイルロックで排他する
+    ロックはキーのハッシュで LOCK_STRIPES 個に振り分ける（別のキーが同じロックを共有することがある）
+    複数のキーを渡すと番号の小さいロックから順に取る（順番を揃えないと、逆順に取るスレッド同士が待ち合う）
+    同じスレッドが保持中のロックを入れ子で取ろうとしたときはそのまま続行する（取得処理の中で別のキーをロックするため）
+    入れ子で保持中のものより番号の小さいロックを取るときは待たずに試すだけにする（取れなければロックなしで続行）
+    timeout秒待っても取れなければロックなしで続行する
+    入れ子でロックすることが分かっているキー（取得処理の中でロックするキー）は外側でまとめて渡す
+    """
+    held = getattr(_held, "stripes", None)
+    if held is None:
+        held = _held.stripes = set()
+    highest = max(held, default=-1)
+    with ExitStack() as stack:
+        for stripe in sorted({_stripe_of(key) for key in keys} - held):
+            stack.enter_context(_stripe_lock(stripe, timeout if stripe > highest else 0, held))
+        yield
+
+
+@contextmanager
+def _stripe_lock(stripe, timeout, held):
+    """1本のストライプのスレッドロックとファイルロックを取る。timeout=0 なら待たない"""
+    lock = _stripe_locks[stripe]
+    acquired = lock.acquire(timeout=timeout) if timeout > 0 else lock.acquire(blocking=False)
+    lock_file = None
+    try:
+        if fcntl is not None:
+            try:
+                lock_file = open(os.path.join(_lock_dir(), f"{stripe}.lock"), "w")
+            except OSError:
+                lock_file = None
+        if lock_file is not None:
+            deadline = time.time() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.time() >= deadline:
+                        lock_file.close()
+                        lock_file = None
+                        break
+                    time.sleep(0.1)
+        held.add(stripe)
+        yield
+    finally:
+        held.discard(stripe)
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+        if acquired:
+            lock.release()
+
+
+def get_or_fetch(key, fetch, max_age_hours=24, lock_keys=()):
+    """
+    キャッシュにあれば返し、なければfetch()の結果を保存して返す
+    同じキーを同時に要求された場合は1つだけがfetchし、他はその結果を待って受け取る
+    lock_keys: fetch() の中でロックするキー（key と一緒に順番を揃えて先に取る）
+    """
+    value = get_cache(key, max_age_hours)
+    if value:
+        return value
+    with key_lock(key, *lock_keys):
+        # 待っている間に他のプロセス・スレッドが保存していればそれを使う
+        value = get_cache(key, max_age_hours)
+        if value:
+            return value
+        value = fetch()
+        if value:
+            set_cache(key, value)
+        return value
@@ -8,6 +8,7 @@ import zipfile
 import io
 import datetime
 from dotenv import load_dotenv
+from data_sources.edinet_index import get_synced_dates, sync_date, find_documents
 
 load_dotenv()
 
@@ -41,6 +42,7 @@ def search_documents(stock_code, years=5):
         print(f"❌ 証券コード {stock_code} のEDINETコードが見つかりません")
         return []
 
+    synced = get_synced_dates()
     documents = []
     today = datetime.date.today()
 
@@ -50,7 +52,7 @@ def search_documents(stock_code, years=5):
         target_year = today.year - year_offset
         # 有報は通常4〜6月に提出されるので、その期間を重点検索
         for month in [6, 5, 4, 3, 7, 8]:
-            # その月の各週の初日を検索
+            # その月の各週の初日を検索（インデックス取得済みの日は問い合わせない）
             for day in [1, 8, 15, 22]:
                 date_str = f"{target_year}-{month:02d}-{day:02d}"
                 try:
@@ -59,46 +61,18 @@ def search_documents(stock_code, years=5):
                         continue
                 except ValueError:
                     continue
-
-                try:
-                    resp = requests.get(
-                        f"{BASE_URL}/documents.json",
-                        params={
-                            "date": date_str,
-                            "type": 2,
-                            "Subscription-Key": EDINET_API_KEY,
-                        },
-                        timeout=30,
-                    )
-                    if resp.status_code != 200:
-                        continue
-
-                    data = resp.json()
-                    if "results" not in data:
-                        continue
-
-                    for doc in data["results"]:
-                        if (doc.get("edinetCode") == edinet_code
-                                and doc.get("docTypeCode") == "120"
-                                and doc.get("docID")):
-                            doc_ids = [d["docID"] for d in documents]
-                            if doc["docID"] not in doc_ids:
-                                documents.append({
-                                    "docID": doc["docID"],
-                                    "filerName": doc.get("filerName", ""),
-                                    "docDescription": doc.get("docDescription", ""),
-                                    "submitDateTime": doc.get("submitDateTime", ""),
-                                    "periodStart": doc.get("periodStart", ""),
-                                    "periodEnd": doc.get("periodEnd", ""),
-                                })
-                                print(f"  📄 発見: {doc.get('docDescription', '')} ({doc.get('periodEnd', '')[:7]})")
-                except Exception as e:
+                if date_str in synced:
                     continue
+                sync_date(date_str, EDINET_API_KEY)
+
+            documents = find_documents(edinet_code, "120")
 
             # この年の有報が見つかったら次の年へ
             if any(str(target_year) in d.get("periodEnd", "") or str(target_year) in d.get("submitDateTime", "") for d in documents):
                 break
 
+    for d in documents:
+        print(f"  📄 発見: {d.get('docDescription', '')} ({d.get('periodEnd', '')[:7]})")
     documents.sort(key=lambda x: x.get("periodEnd", ""), reverse=True)
     print(f"✅ {len(documents)} 件の有報を発見")
     return documents
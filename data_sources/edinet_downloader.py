@@ -0,0 +1,98 @@
+"""
+EDINET書類の並列ダウンロード
+共有トークンバケットでAPIへのリクエスト数を制限しつつ、複数スレッドでZIPを取得する
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+
+DOCUMENT_URL = "https://api.edinet-fsa.go.jp/api/v2/documents/{doc_id}"
+
+# EDINET APIへのリクエスト上限（秒間）と同時接続数
+DEFAULT_RATE = 3.0
+DEFAULT_WORKERS = 4
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """スレッド間で共有するトークンバケット（rate: 1秒あたりの補充数, capacity: 最大バースト）"""
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def download_document(doc_id, api_key, limiter=None, retries=3, backoff=1.0, session=None):
+    """
+    書類ZIPをダウンロードする。429・5xx・通信エラーは指数バックオフで再試行
+    取得できなければNoneを返す
+    """
+    http = session or requests
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            resp = http.get(DOCUMENT_URL.format(doc_id=doc_id),
+                            params={"type": 1, "Subscription-Key": api_key}, timeout=60)
+            if resp.status_code == 200:
+                return resp.content
+            if resp.status_code not in RETRY_STATUS:
+                return None
+        except requests.RequestException:
+            pass
+        if attempt < retries:
+            time.sleep(backoff * (2 ** attempt))
+    return None
+
+
+def iter_downloads(jobs, api_key, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, fetch=None):
+    """
+    jobs: (key, [docID, ...]) のリスト
+    ダウンロードが終わった順に (key, [content or None, ...]) を返す。呼び出し側のパース中も次の取得が進む
+    fetch: 1書類を取得する関数（既定は download_document。原本ストアを使う場合は filing_store.fetch_filing）
+    """
+    fetch = fetch or download_document
+    limiter = TokenBucket(rate)
+    local = threading.local()
+
+    def _session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def _fetch(doc_ids):
+        return [fetch(d, api_key, limiter, session=_session()) for d in doc_ids]
+
+    # 取得済みで未処理のZIPが溜まりすぎないよう、同時に投入するジョブ数を制限する
+    jobs = iter(jobs)
+    window = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for key, doc_ids in jobs:
+            pending[pool.submit(_fetch, doc_ids)] = key
+            if len(pending) >= window:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                yield key, future.result()
+                for next_key, doc_ids in jobs:
+                    pending[pool.submit(_fetch, doc_ids)] = next_key
+                    break
@@ -0,0 +1,197 @@
+"""
+EDINET書類一覧インデックス
+documents.json の日次一覧をSQLiteに保存し、銘柄ごとの日付探索を不要にする
+"""
+import os
+import sqlite3
+import datetime
+import time
+import requests
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "edinet_index.db")
+LIST_URL = "https://api.edinet-fsa.go.jp/api/v2/documents.json"
+
+# 保存する書類種別（120: 有価証券報告書, 130: 訂正有価証券報告書）
+INDEXED_DOC_TYPES = ("120", "130")
+
+_initialized = False
+
+
+def get_connection():
+    global _initialized
+    conn = sqlite3.connect(INDEX_PATH)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        _init_tables(conn)
+        _initialized = True
+    return conn
+
+
+def _init_tables(conn):
+    c = conn.cursor()
+    # 書類一覧（1書類1行）
+    c.execute("""CREATE TABLE IF NOT EXISTS edinet_documents (
+        doc_id TEXT PRIMARY KEY,
+        list_date TEXT NOT NULL,
+        edinet_code TEXT,
+        sec_code TEXT,
+        doc_type_code TEXT,
+        filer_name TEXT,
+        doc_description TEXT,
+        period_start TEXT,
+        period_end TEXT,
+        submit_datetime TEXT
+    )""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_edinet_documents_code
+        ON edinet_documents (edinet_code, doc_type_code, period_end)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_edinet_documents_date
+        ON edinet_documents (list_date)""")
+    # 取得済みの日付
+    c.execute("""CREATE TABLE IF NOT EXISTS edinet_sync_dates (
+        list_date TEXT PRIMARY KEY,
+        doc_count INTEGER,
+        synced_at TEXT
+    )""")
+    conn.commit()
+
+
+def get_synced_dates():
+    """
+    取得済みの日付セットを返す
+    当日中に取得した一覧は後から書類が増えるため、翌日以降に取得したものだけを確定扱いにする
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("SELECT list_date FROM edinet_sync_dates WHERE substr(synced_at, 1, 10) > list_date")
+    dates = {r["list_date"] for r in c.fetchall()}
+    conn.close()
+    return dates
+
+
+def fetch_listing(date_str, api_key):
+    """documents.json から1日分の書類一覧を取得。失敗時はNone"""
+    try:
+        resp = requests.get(LIST_URL, params={
+            "date": date_str, "type": 2, "Subscription-Key": api_key,
+        }, timeout=30)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
+    except Exception:
+        return None
+    if "results" not in data:
+        return None
+    return data["results"]
+
+
+def ingest_listing(date_str, results):
+    """1日分の書類一覧をインデックスに保存し、その日付を取得済みにする"""
+    rows = []
+    for doc in results:
+        if doc.get("docTypeCode") not in INDEXED_DOC_TYPES or not doc.get("docID"):
+            continue
+        rows.append((
+            doc["docID"], date_str, doc.get("edinetCode") or "", doc.get("secCode") or "",
+            doc.get("docTypeCode"), doc.get("filerName") or "", doc.get("docDescription") or "",
+            doc.get("periodStart") or "", doc.get("periodEnd") or "", doc.get("submitDateTime") or "",
+        ))
+    conn = get_connection()
+    c = conn.cursor()
+    c.executemany("""INSERT OR REPLACE INTO edinet_documents
+        (doc_id, list_date, edinet_code, sec_code, doc_type_code, filer_name,
+         doc_description, period_start, period_end, submit_datetime)
+        VALUES (?,?,?,?,?,?,?,?,?,?)""", rows)
+    c.execute("INSERT OR REPLACE INTO edinet_sync_dates (list_date, doc_count, synced_at) VALUES (?,?,?)",
+              (date_str, len(rows), datetime.datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+    return len(rows)
+
+
+def sync_date(date_str, api_key):
+    """1日分を取得して保存。取得できた件数（失敗時はNone）を返す"""
+    results = fetch_listing(date_str, api_key)
+    if results is None:
+        return None
+    return ingest_listing(date_str, results)
+
+
+def find_documents(edinet_code, doc_type="120", limit=None):
+    """インデックスからEDINETコードの書類を決算期の新しい順に返す"""
+    conn = get_connection()
+    c = conn.cursor()
+    sql = """SELECT * FROM edinet_documents WHERE edinet_code=? AND doc_type_code=?
+             ORDER BY period_end DESC, submit_datetime DESC"""
+    params = [edinet_code, doc_type]
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    c.execute(sql, params)
+    docs = [_to_doc(r) for r in c.fetchall()]
+    conn.close()
+    return docs
+
+
+def _to_doc(row):
+    return {
+        "docID": row["doc_id"],
+        "edinetCode": row["edinet_code"],
+        "secCode": row["sec_code"],
+        "docTypeCode": row["doc_type_code"],
+        "filerName": row["filer_name"],
+        "docDescription": row["doc_description"],
+        "periodStart": row["period_start"],
+        "periodEnd": row["period_end"],
+        "submitDateTime": row["submit_datetime"],
+    }
+
+
+def find_latest_documents(doc_type="120", per_code=2):
+    """全社分の書類をEDINETコードごとに新しい順で最大per_code件ずつ返す"""
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute("""SELECT * FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY edinet_code ORDER BY period_end DESC, submit_datetime DESC) AS rn
+        FROM edinet_documents WHERE doc_type_code=? AND edinet_code != ''
+    ) WHERE rn <= ? ORDER BY edinet_code, rn""", (doc_type, per_code))
+    docs = {}
+    for r in c.fetchall():
+        docs.setdefault(r["edinet_code"], []).append(_to_doc(r))
+    conn.close()
+    return docs
+
+
+def dates_to_sync(start_date, end_date=None, recheck_days=7):
+    """
+    取得が必要な日付を新しい順に返す
+    未取得（または当日中にしか取得していない）日付に加え、訂正・遅延提出を拾うため直近recheck_days日は必ず再取得する
+    """
+    end_date = end_date or datetime.date.today()
+    synced = get_synced_dates()
+    recheck_from = end_date - datetime.timedelta(days=recheck_days - 1)
+    dates = []
+    d = end_date
+    while d >= start_date:
+        if d >= recheck_from or d.isoformat() not in synced:
+            dates.append(d.isoformat())
+        d -= datetime.timedelta(days=1)
+    return dates
+
+
+def sync_missing(api_key, start_date, end_date=None, recheck_days=7, interval=0.3):
+    """未取得の日付だけ一覧を取得してインデックスに保存する"""
+    dates = dates_to_sync(start_date, end_date, recheck_days)
+    print(f"📡 一覧取得対象: {len(dates)}日分", flush=True)
+    stats = {"requested": len(dates), "synced": 0, "failed": 0, "documents": 0}
+    for date_str in dates:
+        count = sync_date(date_str, api_key)
+        if count is None:
+            stats["failed"] += 1
+        else:
+            stats["synced"] += 1
+            stats["documents"] += count
+            if count:
+                print(f"  {date_str}: 有報{count}件", flush=True)
+        time.sleep(interval)
+    return stats
@@ -0,0 +1,73 @@
+"""
+提出書類の原本ストア
+EDINETの書類は公開後に変わらないため、docIDごとにメインのXBRLをgzip圧縮して保存し、二度とダウンロードしない
+"""
+import gzip
+import os
+
+from data_sources.cache_manager import key_lock
+from data_sources.edinet_downloader import download_document
+from parsers.xbrl_parser import extract_xbrl_from_zip
+
+STORE_DIR = os.path.join(os.path.dirname(__file__), "..", ".cache", "filings")
+
+
+def _store_path(doc_id):
+    return os.path.join(STORE_DIR, f"{doc_id}.xbrl.gz")
+
+
+def has_filing(doc_id):
+    return os.path.exists(_store_path(doc_id))
+
+
+def get_filing(doc_id):
+    """保存済みのXBRLを返す。なければNone"""
+    path = _store_path(doc_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rb") as f:
+            return f.read()
+    except (OSError, EOFError):
+        return None
+
+
+def put_filing(doc_id, xbrl_data):
+    """XBRLを圧縮して保存（一時ファイルに書いてから置き換えるので途中で読まれても壊れない）"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _store_path(doc_id)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+        f.write(xbrl_data)
+    os.replace(tmp_path, path)
+
+
+def filing_lock_key(doc_id):
+    """fetch_filing がダウンロード中にロックするキー（get_or_fetch の中で呼ぶときは lock_keys に渡す）"""
+    return f"filing_{doc_id}"
+
+
+def fetch_filing(doc_id, api_key, limiter=None, session=None):
+    """
+    docIDのメインXBRLを返す。ストアになければEDINETからZIPを取得し、メインのXBRLだけを保存する
+    取得できなければNone
+    """
+    xbrl_data = get_filing(doc_id)
+    if xbrl_data:
+        return xbrl_data
+    # 同じ書類を複数のプロセス・スレッドが同時に取りに行かないよう、ダウンロードはdocID単位で排他する
+    with key_lock(filing_lock_key(doc_id)):
+        xbrl_data = get_filing(doc_id)
+        if xbrl_data:
+            return xbrl_data
+        zip_data = download_document(doc_id, api_key, limiter, session=session)
+        if not zip_data:
+            return None
+        xbrl_data = extract_xbrl_from_zip(zip_data)
+        if not xbrl_data:
+            return None
+        try:
+            put_filing(doc_id, xbrl_data)
+        except OSError:
+            pass
+        return xbrl_data
@@ -0,0 +1,552 @@
+"""
+財務データ・指標ストア
+parse_xbrl の結果を docID ごとに、calc_indicators / calc_growth の結果を銘柄ごとに data/financials.db に保存する
+スコアリング設定を変えたときは rescore.py で保存済みの指標から再計算でき、書類の再取得・再パースは不要
+財務データは (銘柄コード, 決算期末, 項目, 値) の縦持ちでも保存し、複数年の推移を1回のクエリで引けるようにする
+バッチのスコアは実行（batch_runs）ごとに score_history へ追記し、過去のある時点のスコアや前回からの変化を引けるようにする
+"""
+import os
+import sqlite3
+import json
+import hashlib
+import datetime
+
+FINANCIALS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "financials.db")
+
+_initialized = False
+
+
+def get_connection():
+    global _initialized
+    conn = sqlite3.connect(FINANCIALS_PATH)
+    conn.row_factory = sqlite3.Row
+    if not _initialized:
+        _init_tables(conn)
+        _initialized = True
+    return conn
+
+
+def _init_tables(conn):
+    c = conn.cursor()
+    # 書類ごとの財務データ（parse_xbrl の出力）
+    c.execute("""CREATE TABLE IF NOT EXISTS filing_financials (
+        doc_id TEXT PRIMARY KEY,
+        stock_code TEXT,
+        financial TEXT NOT NULL,
+        parsed_at TEXT,
+        parser_version INTEGER
+    )""")
+    # 銘柄ごとの最新指標と、最後にスコアを計算したときの入力・設定のフィンガープリント
+    c.execute("""CREATE TABLE IF NOT EXISTS stock_indicators (
+        stock_code TEXT PRIMARY KEY,
+        company_name TEXT,
+        doc_id TEXT,
+        prev_doc_id TEXT,
+        price REAL,
+        indicators TEXT NOT NULL,
+        score_fingerprint TEXT,
+        risk_flags INTEGER,
+        updated_at TEXT
+    )""")
+    # 既存DBへの列追加
+    if "parser_version" not in {r[1] for r in c.execute("PRAGMA table_info(filing_financials)")}:
+        c.execute("ALTER TABLE filing_financials ADD COLUMN parser_version INTEGER")
+    columns = {r[1] for r in c.execute("PRAGMA table_info(stock_indicators)")}
+    if "risk_flags" not in columns:
+        c.execute("ALTER TABLE stock_indicators ADD COLUMN risk_flags INTEGER")
+    # 財務データの縦持ち（項目は TAG_GROUPS のラベル）。主キーで銘柄の時系列、インデックスで項目の横断を引く
+    c.execute("""CREATE TABLE IF NOT EXISTS financial_facts (
+        stock_code TEXT NOT NULL,
+        period_end TEXT NOT NULL,
+        label TEXT NOT NULL,
+        value REAL,
+        doc_id TEXT,
+        PRIMARY KEY (stock_code, period_end, label)
+    )""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_financial_facts_label
+        ON financial_facts (label, period_end)""")
+    # 全銘柄内のパーセンタイルとセクター内zスコア（バッチで全件を作り直す）
+    c.execute("""CREATE TABLE IF NOT EXISTS peer_stats (
+        stock_code TEXT NOT NULL,
+        indicator TEXT NOT NULL,
+        value REAL,
+        percentile REAL,
+        sector TEXT,
+        sector_z REAL,
+        PRIMARY KEY (stock_code, indicator)
+    )""")
+    # バッチの実行記録（run_id は実行順に増える）
+    c.execute("""CREATE TABLE IF NOT EXISTS batch_runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT,
+        started_at TEXT NOT NULL,
+        finished_at TEXT,
+        stock_count INTEGER
+    )""")
+    # スコア履歴（追記のみ）。前回から変わった銘柄だけを書くので、ある実行時点のスコアは
+    # その実行以前で最後に書かれた行になる。主キー順に実行ごとの行がまとまって並ぶ
+    c.execute("""CREATE TABLE IF NOT EXISTS score_history (
+        batch_run_id INTEGER NOT NULL,
+        stock_code TEXT NOT NULL,
+        total_score INTEGER NOT NULL,
+        profitability INTEGER,
+        safety INTEGER,
+        growth INTEGER,
+        value INTEGER,
+        PRIMARY KEY (batch_run_id, stock_code)
+    ) WITHOUT ROWID""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_score_history_stock
+        ON score_history (stock_code, batch_run_id)""")
+    conn.commit()
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+# ── 財務データ ──
+def _parser_version():
+    from parsers.xbrl_parser import PARSER_VERSION
+    return PARSER_VERSION
+
+
+def get_financial(doc_id):
+    """保存済みの財務データを返す。なければ（今のパーサーと違う版でパースしたものも）None"""
+    conn = get_connection()
+    row = conn.execute("SELECT financial FROM filing_financials WHERE doc_id=? AND parser_version=?",
+                       (doc_id, _parser_version())).fetchone()
+    conn.close()
+    return json.loads(row["financial"]) if row else None
+
+
+def get_financials(doc_ids):
+    """複数書類の財務データをまとめて返す {docID: 財務データ}（今のパーサーの版でパースしたものだけ）"""
+    doc_ids = list(dict.fromkeys(doc_ids))
+    found = {}
+    conn = get_connection()
+    # SQLiteのパラメータ上限を超えないよう分割
+    for i in range(0, len(doc_ids), 500):
+        chunk = doc_ids[i:i + 500]
+        rows = conn.execute(f"""SELECT doc_id, financial FROM filing_financials
+            WHERE parser_version=? AND doc_id IN ({','.join('?' * len(chunk))})""",
+                            [_parser_version()] + chunk).fetchall()
+        found.update((r["doc_id"], json.loads(r["financial"])) for r in rows)
+    conn.close()
+    return found
+
+
+def save_financial(doc_id, financial, stock_code=None, period_end=None):
+    """財務データを保存。銘柄コードと決算期末があれば縦持ちの financial_facts にも書く"""
+    conn = get_connection()
+    with conn:
+        conn.execute("""INSERT OR REPLACE INTO filing_financials (doc_id, stock_code, financial, parsed_at, parser_version)
+            VALUES (?,?,?,?,?)""",
+                     (doc_id, stock_code, _dumps(financial), datetime.datetime.now().isoformat(), _parser_version()))
+        if stock_code and period_end:
+            _write_facts(conn, stock_code, period_end, financial, doc_id)
+    conn.close()
+
+
+def get_or_parse_financial(doc_id, xbrl_data, stock_code=None, period_end=None):
+    """
+    保存済みなら財務データを返し、なければ xbrl_data をパースして保存する
+    xbrl_data はバイト列か、バイト列を返す関数（保存済みのときはダウンロードしない）
+    """
+    financial = get_financial(doc_id)
+    if financial:
+        return financial
+    if callable(xbrl_data):
+        xbrl_data = xbrl_data()
+    if not xbrl_data:
+        return None
+    from parsers.xbrl_parser import parse_xbrl
+    financial = parse_xbrl(xbrl_data)
+    if financial:
+        # 古い版のパース結果を置き換えるときは、銘柄コード・決算期末を保存済みの行から引き継ぐ
+        if stock_code is None or period_end is None:
+            stored = _stored_keys(doc_id)
+            stock_code = stock_code or stored[0]
+            period_end = period_end or stored[1]
+        save_financial(doc_id, financial, stock_code, period_end)
+    return financial
+
+
+def _stored_keys(doc_id):
+    """保存済みの書類の (銘柄コード, 決算期末)。なければ None"""
+    conn = get_connection()
+    row = conn.execute("""SELECT f.stock_code, (SELECT period_end FROM financial_facts WHERE doc_id=f.doc_id LIMIT 1)
+        FROM filing_financials f WHERE f.doc_id=?""", (doc_id,)).fetchone()
+    conn.close()
+    return tuple(row) if row else (None, None)
+
+
+def get_parsed_doc_ids(doc_ids):
+    """今のパーサーの版でパース済みの書類のdocIDの集合（財務データ本体は読まない）"""
+    doc_ids = list(dict.fromkeys(d for d in doc_ids if d))
+    parsed = set()
+    conn = get_connection()
+    for i in range(0, len(doc_ids), 500):
+        chunk = doc_ids[i:i + 500]
+        rows = conn.execute(f"""SELECT doc_id FROM filing_financials
+            WHERE parser_version=? AND doc_id IN ({','.join('?' * len(chunk))})""",
+                            [_parser_version()] + chunk).fetchall()
+        parsed.update(r["doc_id"] for r in rows)
+    conn.close()
+    return parsed
+
+
+def get_stale_doc_ids(doc_ids):
+    """保存済みだが今のパーサーと違う版でパースした書類のdocIDの集合"""
+    doc_ids = list(dict.fromkeys(d for d in doc_ids if d))
+    stale = set()
+    conn = get_connection()
+    for i in range(0, len(doc_ids), 500):
+        chunk = doc_ids[i:i + 500]
+        rows = conn.execute(f"""SELECT doc_id FROM filing_financials
+            WHERE parser_version IS NOT ? AND doc_id IN ({','.join('?' * len(chunk))})""",
+                            [_parser_version()] + chunk).fetchall()
+        stale.update(r["doc_id"] for r in rows)
+    conn.close()
+    return stale
+
+
+# ── 財務データ（縦持ち） ──
+def _write_facts(conn, stock_code, period_end, financial, doc_id):
+    # 同じ決算期の値は丸ごと置き換える（訂正報告書で項目が減る場合があるため）
+    conn.execute("DELETE FROM financial_facts WHERE stock_code=? AND period_end=?", (stock_code, period_end))
+    conn.executemany("INSERT INTO financial_facts (stock_code, period_end, label, value, doc_id) VALUES (?,?,?,?,?)",
+                     [(stock_code, period_end, label, value, doc_id) for label, value in financial.items()])
+
+
+def save_facts(stock_code, period_end, financial, doc_id=None):
+    conn = get_connection()
+    with conn:
+        _write_facts(conn, stock_code, period_end, financial, doc_id)
+    conn.close()
+
+
+def get_history(stock_code, labels=None):
+    """銘柄の決算期ごとの財務データを返す {決算期末: {項目: 値}}（古い順）"""
+    sql = "SELECT period_end, label, value FROM financial_facts WHERE stock_code=?"
+    params = [stock_code]
+    if labels:
+        sql += f" AND label IN ({','.join('?' * len(labels))})"
+        params += list(labels)
+    conn = get_connection()
+    rows = conn.execute(sql + " ORDER BY period_end", params).fetchall()
+    conn.close()
+    history = {}
+    for r in rows:
+        history.setdefault(r["period_end"], {})[r["label"]] = r["value"]
+    return history
+
+
+def load_history(stock_code, docs, fetch):
+    """
+    書類一覧（docID・periodEnd）に対応する財務データを {決算期末: 財務データ} で返す
+    保存済みの決算期は financial_facts から読み、ないものだけ fetch(doc) で取得して保存する
+    """
+    history = get_history(stock_code)
+    for doc in docs:
+        period_end = doc.get("periodEnd")
+        if not period_end or period_end in history:
+            continue
+        financial = fetch(doc)
+        if financial:
+            save_facts(stock_code, period_end, financial, doc.get("docID"))
+            history[period_end] = financial
+    wanted = {doc.get("periodEnd") for doc in docs}
+    return {p: history[p] for p in sorted(history) if p in wanted}
+
+
+def facts_frame(labels=None, stock_codes=None, start=None, end=None):
+    """
+    財務データを (銘柄コード, 決算期末) × 項目 の pandas DataFrame で返す（NumPyへは .to_numpy()）
+    start / end: 決算期末の範囲（YYYY-MM-DD、両端を含む）
+    """
+    import pandas as pd
+    conditions, params = [], []
+    if labels:
+        conditions.append(f"label IN ({','.join('?' * len(labels))})")
+        params += list(labels)
+    if stock_codes:
+        conditions.append(f"stock_code IN ({','.join('?' * len(stock_codes))})")
+        params += list(stock_codes)
+    if start:
+        conditions.append("period_end >= ?")
+        params.append(start)
+    if end:
+        conditions.append("period_end <= ?")
+        params.append(end)
+    sql = "SELECT stock_code, period_end, label, value FROM financial_facts"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    conn = get_connection()
+    long_df = pd.read_sql_query(sql, conn, params=params)
+    conn.close()
+    return long_df.pivot_table(index=["stock_code", "period_end"], columns="label", values="value", aggfunc="first")
+
+
+# ── 指標 ──
+def scoring_config_fingerprint():
+    """スコアリング設定（THRESHOLDS・CATEGORIES・STYLE_PERIOD_WEIGHTS）のフィンガープリント"""
+    from analysis.scoring import THRESHOLDS, CATEGORIES, STYLE_PERIOD_WEIGHTS
+    config = {"thresholds": THRESHOLDS, "categories": CATEGORIES, "weights": STYLE_PERIOD_WEIGHTS}
+    return hashlib.sha256(_dumps(config).encode("utf-8")).hexdigest()[:16]
+
+
+def score_fingerprint(indicators, config_fingerprint=None):
+    """指標とスコアリング設定の組のフィンガープリント。どちらかが変われば値が変わる"""
+    config_fingerprint = config_fingerprint or scoring_config_fingerprint()
+    return hashlib.sha256((config_fingerprint + _dumps(indicators)).encode("utf-8")).hexdigest()[:16]
+
+
+def save_indicators(stock_code, company_name, indicators, doc_id=None, prev_doc_id=None, price=None,
+                    scored=True):
+    """
+    銘柄の最新指標を保存する
+    scored: この指標で stock_scores を更新済みなら True（rescore で再計算を省く）
+    """
+    fingerprint = score_fingerprint(indicators) if scored else None
+    conn = get_connection()
+    conn.execute("""INSERT OR REPLACE INTO stock_indicators
+        (stock_code, company_name, doc_id, prev_doc_id, price, indicators, score_fingerprint, updated_at)
+        VALUES (?,?,?,?,?,?,?,?)""",
+        (stock_code, company_name, doc_id, prev_doc_id, price, _dumps(indicators), fingerprint,
+         datetime.datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+
+
+def get_all_indicators():
+    """保存済みの全銘柄の指標を返す"""
+    conn = get_connection()
+    rows = conn.execute("SELECT * FROM stock_indicators ORDER BY stock_code").fetchall()
+    conn.close()
+    result = []
+    for r in rows:
+        row = dict(r)
+        row["indicators"] = json.loads(row["indicators"])
+        result.append(row)
+    return result
+
+
+def save_risk_flags(flags):
+    """{stock_code: 警告のビットマスク（analysis.filters.FILTER_FLAGS）} を保存する"""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE stock_indicators SET risk_flags=? WHERE stock_code=?",
+                         [(int(mask), code) for code, mask in flags.items()])
+    conn.close()
+
+
+def get_flagged_stocks(mask):
+    """mask のビットのいずれかに該当する銘柄コードの集合を返す"""
+    conn = get_connection()
+    rows = conn.execute("SELECT stock_code FROM stock_indicators WHERE (risk_flags & ?) != 0", (mask,)).fetchall()
+    conn.close()
+    return {r["stock_code"] for r in rows}
+
+
+def mark_scored(fingerprints):
+    """{stock_code: フィンガープリント} を記録する"""
+    conn = get_connection()
+    with conn:
+        conn.executemany("UPDATE stock_indicators SET score_fingerprint=? WHERE stock_code=?",
+                         [(fp, code) for code, fp in fingerprints.items()])
+    conn.close()
+
+
+# ── 相対評価 ──
+def save_peer_stats(frame):
+    """analysis.peers.compute_peer_stats の結果で peer_stats を置き換える"""
+    rows = [(r.stock_code, r.indicator, r.value, _nullable(r.percentile), _nullable(r.sector), _nullable(r.sector_z))
+            for r in frame.itertuples(index=False)]
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM peer_stats")
+        conn.executemany("""INSERT INTO peer_stats (stock_code, indicator, value, percentile, sector, sector_z)
+            VALUES (?,?,?,?,?,?)""", rows)
+    conn.close()
+
+
+def _nullable(value):
+    # NaN（pandas の欠損）は NULL で保存する
+    return None if value is None or value != value else value
+
+
+def get_peer_stats(stock_code):
+    """銘柄の相対評価を返す {指標: {"value", "percentile", "sector", "sector_z"}}"""
+    conn = get_connection()
+    rows = conn.execute("SELECT * FROM peer_stats WHERE stock_code=?", (stock_code,)).fetchall()
+    conn.close()
+    return {r["indicator"]: {"value": r["value"], "percentile": r["percentile"], "sector": r["sector"],
+                             "sector_z": r["sector_z"]} for r in rows}
+
+
+# ── スコア履歴 ──
+HISTORY_COLUMNS = ("total_score", "profitability", "safety", "growth", "value")
+_HISTORY_CATEGORIES = {"profitability": "収益性", "safety": "安全性", "growth": "成長性", "value": "割安度"}
+
+
+def start_batch_run(kind):
+    """バッチの実行を記録して run_id を返す（kind: "daily" / "analyze" / "rescore" など）"""
+    conn = get_connection()
+    with conn:
+        run_id = conn.execute("INSERT INTO batch_runs (kind, started_at) VALUES (?,?)",
+                              (kind, datetime.datetime.now().isoformat())).lastrowid
+    conn.close()
+    return run_id
+
+
+def finish_batch_run(run_id, stock_count=None):
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE batch_runs SET finished_at=?, stock_count=? WHERE run_id=?",
+                     (datetime.datetime.now().isoformat(), stock_count, run_id))
+    conn.close()
+
+
+def get_batch_runs(limit=20):
+    """新しい順のバッチ実行記録"""
+    conn = get_connection()
+    rows = conn.execute("SELECT * FROM batch_runs ORDER BY run_id DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def _run_as_of(conn, at):
+    """at（ISO形式の日時）までに開始した最後の実行の run_id"""
+    row = conn.execute("SELECT MAX(run_id) FROM batch_runs WHERE started_at <= ?", (at,)).fetchone()
+    return row[0]
+
+
+def _history_values(score_result):
+    cats = score_result["category_scores"]
+    return (int(score_result["total_score"]),) + tuple(
+        int(cats[name]) if cats.get(name) is not None else None for name in _HISTORY_CATEGORIES.values())
+
+
+def append_score_history(run_id, rows):
+    """
+    rows: (証券コード, 企業名, score_result, indicators) のリスト（save_stock_scores_bulk と同じ形）
+    直前の履歴から変わった銘柄だけを追記し、追記した件数を返す
+    """
+    latest = get_scores_as_of(stock_codes=[row[0] for row in rows])
+    new_rows = []
+    for code, _name, score_result, _indicators in rows:
+        values = _history_values(score_result)
+        prev = latest.get(code)
+        if prev is not None and tuple(prev[c] for c in HISTORY_COLUMNS) == values:
+            continue
+        new_rows.append((run_id, code) + values)
+    conn = get_connection()
+    with conn:
+        conn.executemany(f"""INSERT OR REPLACE INTO score_history (batch_run_id, stock_code, {", ".join(HISTORY_COLUMNS)})
+            VALUES (?,?,?,?,?,?,?)""", new_rows)
+    conn.close()
+    return len(new_rows)
+
+
+def get_scores_as_of(run_id=None, at=None, stock_codes=None):
+    """
+    ある実行時点の各銘柄のスコア {証券コード: {"batch_run_id", "total_score", ...}}
+    run_id・at（ISO形式の日時）のどちらも省略すると最新。batch_run_id はそのスコアが書かれた実行
+    """
+    conn = get_connection()
+    if run_id is None and at is not None:
+        run_id = _run_as_of(conn, at)
+        if run_id is None:
+            conn.close()
+            return {}
+    # 銘柄ごとの「run_id 以前で最後の実行」はインデックス (stock_code, batch_run_id) だけで求まる
+    conditions, params = [], []
+    if run_id is not None:
+        conditions.append("batch_run_id <= ?")
+        params.append(run_id)
+    chunks = [None]
+    if stock_codes is not None:
+        codes = list(dict.fromkeys(stock_codes))
+        # SQLiteのパラメータ上限を超えないよう分割
+        chunks = [codes[i:i + 500] for i in range(0, len(codes), 500)]
+    found = {}
+    for chunk in chunks:
+        where, chunk_params = list(conditions), list(params)
+        if chunk is not None:
+            where.append(f"stock_code IN ({','.join('?' * len(chunk))})")
+            chunk_params += chunk
+        sql = f"""SELECT h.* FROM score_history h JOIN (
+            SELECT stock_code, MAX(batch_run_id) AS batch_run_id FROM score_history
+            {"WHERE " + " AND ".join(where) if where else ""} GROUP BY stock_code) last
+            USING (stock_code, batch_run_id)"""
+        found.update((r["stock_code"], dict(r)) for r in conn.execute(sql, chunk_params))
+    conn.close()
+    return found
+
+
+def get_score_deltas(run_id=None, stock_codes=None):
+    """
+    run_id の実行（省略時は最新の実行）でスコアが変わった銘柄と、その前のスコア
+    returns: [{"stock_code", "total_score", ..., "prev_total_score", "delta"}, ...]（変化の大きい順。新規銘柄は prev・delta が None）
+    """
+    conn = get_connection()
+    if run_id is None:
+        run_id = conn.execute("SELECT MAX(run_id) FROM batch_runs").fetchone()[0]
+    # run_id の行は主キー順にまとまっているので範囲で読み、前回の行は銘柄のインデックスで1件ずつ引く
+    rows = conn.execute("""SELECT cur.*, prev.total_score AS prev_total_score,
+            prev.batch_run_id AS prev_batch_run_id
+        FROM score_history cur LEFT JOIN score_history prev
+          ON prev.stock_code = cur.stock_code
+         AND prev.batch_run_id = (SELECT MAX(batch_run_id) FROM score_history
+                                  WHERE stock_code = cur.stock_code AND batch_run_id < cur.batch_run_id)
+        WHERE cur.batch_run_id = ?""", (run_id,)).fetchall()
+    conn.close()
+    codes = set(stock_codes) if stock_codes is not None else None
+    return _with_deltas(r for r in rows if codes is None or r["stock_code"] in codes)
+
+
+def get_latest_score_changes(stock_codes):
+    """
+    銘柄ごとの直近のスコア変化（最後に書かれた履歴と、その1つ前の履歴。どの実行で書かれたかは問わない）
+    returns: get_score_deltas と同じ形に、直近の履歴を書いた実行の開始日時 started_at を加えたもの
+    """
+    codes = list(dict.fromkeys(stock_codes))
+    conn = get_connection()
+    rows = []
+    # 直近・1つ前の batch_run_id はどちらもインデックス (stock_code, batch_run_id) で1件ずつ引ける
+    for i in range(0, len(codes), 500):
+        chunk = codes[i:i + 500]
+        rows += conn.execute(f"""SELECT cur.*, prev.total_score AS prev_total_score,
+                prev.batch_run_id AS prev_batch_run_id, r.started_at
+            FROM score_history cur
+            LEFT JOIN score_history prev
+              ON prev.stock_code = cur.stock_code
+             AND prev.batch_run_id = (SELECT MAX(batch_run_id) FROM score_history
+                                      WHERE stock_code = cur.stock_code AND batch_run_id < cur.batch_run_id)
+            LEFT JOIN batch_runs r ON r.run_id = cur.batch_run_id
+            WHERE cur.stock_code IN ({','.join('?' * len(chunk))})
+              AND cur.batch_run_id = (SELECT MAX(batch_run_id) FROM score_history WHERE stock_code = cur.stock_code)""",
+            chunk).fetchall()
+    conn.close()
+    return _with_deltas(rows)
+
+
+def _with_deltas(rows):
+    """履歴の行に delta（前回との差。前回がなければ None）を付け、変化の大きい順に並べる"""
+    deltas = []
+    for r in rows:
+        row = dict(r)
+        row["delta"] = None if row["prev_total_score"] is None else row["total_score"] - row["prev_total_score"]
+        deltas.append(row)
+    deltas.sort(key=lambda d: abs(d["delta"]) if d["delta"] is not None else -1, reverse=True)
+    return deltas
+
+
+def get_score_history(stock_code):
+    """銘柄のスコアが変わった実行ごとの履歴（古い順、実行の開始日時つき）"""
+    conn = get_connection()
+    rows = conn.execute("""SELECT h.*, r.started_at FROM score_history h
+        LEFT JOIN batch_runs r ON r.run_id = h.batch_run_id
+        WHERE h.stock_code=? ORDER BY h.batch_run_id""", (stock_code,)).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
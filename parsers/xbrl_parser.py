@@ -1,9 +1,13 @@
 """
 XBRLパーサー - IFRS/日本基準対応・セグメント除外版
 """
-import requests, zipfile, io
+import requests, zipfile, io, re
+from functools import lru_cache
 from lxml import etree
 
+# parse_xbrl の出力が変わる修正をしたら上げる（保存済みの財務データは版が違えばパースし直される）
+PARSER_VERSION = 1
+
 TAG_GROUPS = {
     "売上高": [
         "SalesAndFinancialServicesRevenueIFRS",
@@ -53,28 +57,32 @@ TAG_GROUPS = {
 }
 
 
+# セグメント別・個別のデータを示すcontextRefのキーワード
+SEGMENT_KEYWORDS = [
+    "_jpcrp030000", "Segment", "Game", "Music", "Picture",
+    "Enter", "Imag", "Finan", "Reportable",
+    "NonConsolidated", "Elimination",
+]
+_SEGMENT_RE = re.compile("|".join(re.escape(kw) for kw in SEGMENT_KEYWORDS))
+
+# contextRefの分類（数値が大きいほど優先）
+CTX_OTHER = 0            # 前期など
+CTX_CURRENT_ANY = 1      # 当期（セグメント含む）
+CTX_CURRENT_CONSOL = 2   # 当期の連結全体
+
+
 def _is_current_consolidated(context_ref):
     """当期の連結全体データかどうか判定"""
     if not context_ref:
         return False
     # セグメント別データを除外
-    segment_keywords = [
-        "_jpcrp030000", "Segment", "Game", "Music", "Picture",
-        "Enter", "Imag", "Finan", "Reportable",
-        "NonConsolidated", "Elimination",
-    ]
-    for kw in segment_keywords:
-        if kw in context_ref:
-            return False
+    if _SEGMENT_RE.search(context_ref):
+        return False
     # 前期を除外
     if "Prior" in context_ref:
         return False
-    # 当期の連結
-    if "CurrentYear" in context_ref:
-        return True
-    if "Current" in context_ref:
-        return True
-    return False
+    # 当期の連結（"CurrentYear" を含む）
+    return "Current" in context_ref
 
 
 def _is_current_any(context_ref):
@@ -86,92 +94,147 @@ def _is_current_any(context_ref):
     return True
 
 
+@lru_cache(maxsize=8192)
+def _classify_context(context_ref):
+    """contextRefを分類する。同じcontextRefは文書内・文書間で繰り返し現れるためキャッシュする"""
+    if _is_current_consolidated(context_ref):
+        return CTX_CURRENT_CONSOL
+    if _is_current_any(context_ref):
+        return CTX_CURRENT_ANY
+    return CTX_OTHER
+
+
 def download_and_parse(doc_id, api_key):
-    resp = requests.get(
-        f"https://api.edinet-fsa.go.jp/api/v2/documents/{doc_id}",
-        params={"type": 1, "Subscription-Key": api_key},
-        timeout=60,
-    )
-    if resp.status_code != 200:
-        return None
-    try:
-        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
-            xbrl_files = [n for n in zf.namelist() if n.endswith(".xbrl")]
-            if not xbrl_files:
-                return None
-            main_xbrl = max(xbrl_files, key=lambda n: len(zf.read(n)))
-            xml_data = zf.read(main_xbrl)
-    except zipfile.BadZipFile:
+    """docIDの書類を取得してパースする（取得済みの書類はローカルの原本ストアから読む）"""
+    from data_sources.filing_store import fetch_filing
+    xml_data = fetch_filing(doc_id, api_key)
+    if not xml_data:
         return None
     return parse_xbrl(xml_data)
 
 
+def select_main_xbrl(zf):
+    """
+    ZIP内のメインのXBRLインスタンス名を返す
+    PublicDoc配下を優先し、中央ディレクトリのサイズ情報で最大のものを選ぶ（中身は展開しない）
+    """
+    infos = [i for i in zf.infolist() if i.filename.endswith(".xbrl")]
+    if not infos:
+        return None
+    public = [i for i in infos if "XBRL/PublicDoc/" in i.filename]
+    return max(public or infos, key=lambda i: i.file_size).filename
+
+
 def extract_xbrl_from_zip(zip_data):
-    """ZIPからXBRLファイルを抽出"""
+    """ZIPからメインのXBRLファイルを抽出"""
     try:
-        z = zipfile.ZipFile(io.BytesIO(zip_data))
-        for name in z.namelist():
-            if name.endswith('.xbrl') and 'XBRL/PublicDoc/' in name:
-                return z.read(name)
-        # PublicDocがない場合
-        for name in z.namelist():
-            if name.endswith('.xbrl'):
-                return z.read(name)
-    except:
+        with zipfile.ZipFile(io.BytesIO(zip_data)) as zf:
+            name = select_main_xbrl(zf)
+            if name:
+                return zf.read(name)
+    except zipfile.BadZipFile:
         pass
     return None
 
 
-def parse_xbrl(xml_data):
-    # ZIPの場合は展開
-    if xml_data[:2] == b'PK':
-        xml_data = extract_xbrl_from_zip(xml_data)
-        if not xml_data:
-            return None
-    root = etree.fromstring(xml_data)
+# タグ名 → (ラベル, 優先度) の逆引き表（優先度は TAG_GROUPS 内の順番、小さいほど優先）
+TAG_LOOKUP = {tag: (label, priority) for label, tags in TAG_GROUPS.items() for priority, tag in enumerate(tags)}
+
+
+def _local_name(tag):
+    return tag.split("}")[-1] if "}" in tag else tag
+
+
+class _FactCollector:
+    """
+    対象タグの数値を1パスで集計する
+    タグごとに contextRef の分類別の「絶対値最大の値」だけを保持する
+    """
+
+    def __init__(self):
+        self.best = {}  # tag -> [全体, 当期, 当期連結] の絶対値最大値
+
+    def add(self, tag, text, context_ref):
+        if tag not in TAG_LOOKUP or not text:
+            return
+        try:
+            val = float(text.replace(",", ""))
+        except ValueError:
+            return
+        slots = self.best.get(tag)
+        if slots is None:
+            slots = self.best[tag] = [None, None, None]
+        # 当期連結は当期にも全体にも含まれる
+        for level in range(_classify_context(context_ref) + 1):
+            if slots[level] is None or abs(val) > abs(slots[level]):
+                slots[level] = val
 
-    # 全タグを収集（contextRef付き）
-    all_entries = {}
+    def results(self):
+        """ラベルごとに優先度の高いタグから、当期連結 → 当期 → 全体 の順で値を選ぶ"""
+        chosen = {}
+        for tag, slots in self.best.items():
+            label, priority = TAG_LOOKUP[tag]
+            if label not in chosen or priority < chosen[label][0]:
+                value = next(v for v in reversed(slots) if v is not None)
+                chosen[label] = (priority, value)
+        return {label: chosen[label][1] for label in TAG_GROUPS if label in chosen}
+
+
+def _collect_facts_tree(xml_data):
+    """文書全体をツリーに読み込んで集計"""
+    root = etree.fromstring(xml_data)
+    collector = _FactCollector()
     for elem in root.iter():
-        tag = elem.tag.split("}")[-1] if "}" in elem.tag else elem.tag
-        ctx = elem.get("contextRef", "")
-        if elem.text:
-            try:
-                val = float(elem.text.replace(",", ""))
-                if tag not in all_entries:
-                    all_entries[tag] = []
-                all_entries[tag].append({"value": val, "context": ctx})
-            except ValueError:
-                pass
-
-    def get_current_consolidated(tag_name):
-        """当期の連結全体の値を取得"""
-        entries = all_entries.get(tag_name, [])
-        if not entries:
-            return None
+        if isinstance(elem.tag, str):
+            collector.add(_local_name(elem.tag), elem.text, elem.get("contextRef", ""))
+    return collector
 
-        # まず当期連結でフィルタ
-        current = [e for e in entries if _is_current_consolidated(e["context"])]
-        if current:
-            # 連結全体は通常最大値（セグメント合計 > 個別セグメント）
-            return max(current, key=lambda e: abs(e["value"]))["value"]
 
-        # 当期連結が見つからなければ、当期のデータから
-        current_any = [e for e in entries if _is_current_any(e["context"])]
-        if current_any:
-            return max(current_any, key=lambda e: abs(e["value"]))["value"]
+def _collect_facts_streaming(source):
+    """
+    iterparseで要素を1つずつ読み、TAG_GROUPSのタグの数値だけを集計する
+    読み終えた要素は都度破棄するため、メモリ使用量は文書サイズではなく対象タグ数に比例する
+    source: XMLのバイト列またはファイルオブジェクト
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    collector = _FactCollector()
+    for _, elem in etree.iterparse(source, events=("end",), huge_tree=True, resolve_entities=False):
+        if isinstance(elem.tag, str):
+            collector.add(_local_name(elem.tag), elem.text, elem.get("contextRef", ""))
+        # 処理済みの要素と先行する兄弟要素を解放
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    return collector
 
-        # それでもなければ全体から最大値
-        return max(entries, key=lambda e: abs(e["value"]))["value"]
+
+def parse_xbrl(xml_data, streaming=True):
+    """
+    XBRLインスタンス（またはEDINETのZIP）から財務データを抽出する
+    streaming=False で従来のツリー解析を使う
+    """
+    # ZIPの場合はメインのXBRLだけを展開しながらパーサーに流す
+    if xml_data[:2] == b'PK':
+        try:
+            with zipfile.ZipFile(io.BytesIO(xml_data)) as zf:
+                name = select_main_xbrl(zf)
+                if not name:
+                    return None
+                if streaming:
+                    with zf.open(name) as member:
+                        collector = _collect_facts_streaming(member)
+                else:
+                    collector = _collect_facts_tree(zf.read(name))
+        except zipfile.BadZipFile:
+            return None
+    elif streaming:
+        collector = _collect_facts_streaming(xml_data)
+    else:
+        collector = _collect_facts_tree(xml_data)
 
     # 優先度順でマッチング
-    results = {}
-    for label, tag_list in TAG_GROUPS.items():
-        for tag_name in tag_list:
-            val = get_current_consolidated(tag_name)
-            if val is not None:
-                results[label] = val
-                break
+    results = collector.results()
 
     # 有利子負債 = 短期 + 長期
     if "有利子負債_短期" in results or "有利子負債_長期" in results:
@@ -0,0 +1,91 @@
+"""保存済みの指標からスコアを再計算する
+- THRESHOLDS・CATEGORIES・重みを変えたあとに実行する。書類の再取得・再パースはしない
+- 指標とスコアリング設定が前回のスコア計算時から変わっていない銘柄はスキップする
+- パーサーの版が変わった書類は原本ストアにあればパースし直し、指標も計算し直す（原本がなければ前の指標のまま）
+
+使い方: python rescore.py [--force]
+"""
+import os, sys, argparse, time
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data_sources.financial_store import (get_all_indicators, mark_scored, save_indicators,
+                                          scoring_config_fingerprint, score_fingerprint,
+                                          get_or_parse_financial, get_stale_doc_ids,
+                                          start_batch_run, finish_batch_run, append_score_history)
+
+
+def reparse_indicators(row):
+    """
+    古い版のパーサーで作った指標を、原本ストアのXBRLからパースし直して計算し直す
+    原本がなく計算し直せなければNone
+    """
+    from analysis.indicators import calc_indicators, calc_growth
+    from data_sources.filing_store import get_filing
+    financial = get_or_parse_financial(row["doc_id"], lambda: get_filing(row["doc_id"]))
+    if not financial:
+        return None
+    indicators = calc_indicators(financial, row["price"] or 0)
+    if row["prev_doc_id"]:
+        prev_fin = get_or_parse_financial(row["prev_doc_id"], lambda: get_filing(row["prev_doc_id"]))
+        if prev_fin:
+            indicators.update(calc_growth(financial, prev_fin))
+    save_indicators(row["stock_code"], row["company_name"], indicators, row["doc_id"], row["prev_doc_id"],
+                    row["price"], scored=False)
+    return indicators
+
+
+def run_rescore(force=False, save_bulk=None):
+    """
+    force: 変更がない銘柄も再計算する
+    save_bulk: スコアをまとめて保存する関数（既定は data.database.save_stock_scores_bulk）
+    """
+    from analysis.scoring import calc_total_score
+    from analysis.score_cube import update_score_cube
+    from analysis.peers import refresh_peer_stats
+    from analysis.ranking_snapshot import publish_ranking_snapshot
+    if save_bulk is None:
+        from data.database import save_stock_scores_bulk as save_bulk
+
+    start = time.time()
+    config_fp = scoring_config_fingerprint()
+    rescored = {}
+    score_rows = []
+    cube_rows = []
+    skipped = 0
+    rows = get_all_indicators()
+    stale = get_stale_doc_ids([d for r in rows for d in (r["doc_id"], r["prev_doc_id"])])
+    reparsed = 0
+    for row in rows:
+        if row["doc_id"] in stale or row["prev_doc_id"] in stale:
+            indicators = reparse_indicators(row)
+            if indicators is not None:
+                row["indicators"] = indicators
+                reparsed += 1
+        fingerprint = score_fingerprint(row["indicators"], config_fp)
+        if not force and row["score_fingerprint"] == fingerprint:
+            skipped += 1
+            continue
+        score_result = calc_total_score(row["indicators"], "バランス", "中期（1〜3年）")
+        score_rows.append((row["stock_code"], row["company_name"], score_result, row["indicators"]))
+        rescored[row["stock_code"]] = fingerprint
+        cube_rows.append((row["stock_code"], row["company_name"], row["indicators"]))
+    save_bulk(score_rows)
+    mark_scored(rescored)
+    if score_rows:
+        run_id = start_batch_run("rescore")
+        append_score_history(run_id, score_rows)
+        finish_batch_run(run_id, len(score_rows))
+    cube = update_score_cube(cube_rows)
+    # 相対評価の向きも THRESHOLDS に従うので作り直す
+    if rescored:
+        refresh_peer_stats()
+        publish_ranking_snapshot(cube, run_id)
+    print(f"✅ 再スコアリング完了 更新:{len(rescored)}銘柄 スキップ:{skipped}銘柄 再パース:{reparsed}銘柄 ({time.time() - start:.1f}秒)", flush=True)
+    return {"rescored": len(rescored), "skipped": skipped, "reparsed": reparsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="保存済みの指標からスコアを再計算")
+    parser.add_argument("--force", action="store_true", help="変更がない銘柄も再計算する")
+    args = parser.parse_args()
+    run_rescore(args.force)
@@ -0,0 +1,44 @@
+"""EDINET書類一覧の差分同期
+- 取得済みの日付は data/edinet_index.db に記録し、未取得の日付だけを取得する
+- 訂正・遅延提出を拾うため直近RECHECK_DAYS日は毎回取り直す
+
+使い方: python sync_edinet.py [--years 3] [--recheck-days 7]
+"""
+import os, sys, argparse, datetime
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from data_sources.edinet_index import sync_missing
+
+SYNC_YEARS = 3
+RECHECK_DAYS = 7
+
+
+def load_api_key():
+    secrets_path = os.path.join(os.path.dirname(__file__), '.streamlit', 'secrets.toml')
+    if os.path.exists(secrets_path):
+        with open(secrets_path) as f:
+            for line in f:
+                if 'EDINET_API_KEY' in line:
+                    return line.split('=')[1].strip().strip('"').strip("'")
+    return os.environ.get("EDINET_API_KEY", "")
+
+
+def run_sync(api_key, years=SYNC_YEARS, recheck_days=RECHECK_DAYS):
+    today = datetime.date.today()
+    start = datetime.date(today.year - years, 1, 1)
+    stats = sync_missing(api_key, start, today, recheck_days)
+    print(f"✅ 一覧同期完了 取得:{stats['synced']}日 失敗:{stats['failed']}日 有報:{stats['documents']}件", flush=True)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EDINET書類一覧の差分同期")
+    parser.add_argument("--years", type=int, default=SYNC_YEARS, help="何年前の1月1日から同期するか")
+    parser.add_argument("--recheck-days", type=int, default=RECHECK_DAYS, help="毎回取り直す直近の日数")
+    args = parser.parse_args()
+
+    API_KEY = load_api_key()
+    if not API_KEY:
+        print("❌ EDINET_API_KEYが見つかりません")
+        sys.exit(1)
+    run_sync(API_KEY, args.years, args.recheck_days)
@@ -0,0 +1,211 @@
+"""キャッシュのテスト"""
+import pytest
+import sys, os, time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data_sources import cache_manager
+from data_sources.cache_manager import get_cache, set_cache, get_many, set_many, clear_memory_cache, sweep
+
+
+@pytest.fixture(autouse=True, params=["sqlite", "file"])
+def backend(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_manager, "CACHE_DIR", str(tmp_path / ".cache"))
+    monkeypatch.setattr(cache_manager, "CACHE_BACKEND", request.param)
+    clear_memory_cache()
+    yield request.param
+    clear_memory_cache()
+
+
+class TestCacheManager:
+    def test_roundtrip(self):
+        set_cache("xbrl_S100TEST", {"売上高": 100.0})
+        assert get_cache("xbrl_S100TEST") == {"売上高": 100.0}
+
+    def test_missing(self):
+        assert get_cache("xbrl_NONE") is None
+
+    def test_persistent_tier(self):
+        set_cache("docs_E00000", [{"docID": "S1"}])
+        clear_memory_cache()
+        assert get_cache("docs_E00000") == [{"docID": "S1"}]
+
+    def test_memory_tier_skips_disk(self, backend):
+        if backend != "file":
+            pytest.skip("JSONファイル固有")
+        set_cache("docs_E00000", [{"docID": "S1"}])
+        os.remove(cache_manager._cache_path("docs_E00000"))
+        assert get_cache("docs_E00000") == [{"docID": "S1"}]
+
+    def test_expired(self, monkeypatch):
+        set_cache("docs_E00000", [{"docID": "S1"}])
+        now = time.time()
+        monkeypatch.setattr(cache_manager.time, "time", lambda: now + 2 * 3600)
+        assert get_cache("docs_E00000", max_age_hours=1) is None
+        assert get_cache("docs_E00000", max_age_hours=3) == [{"docID": "S1"}]
+
+    def test_lru_eviction(self, monkeypatch):
+        monkeypatch.setattr(cache_manager, "MEMORY_MAX_ENTRIES", 2)
+        for key in ["a", "b", "c"]:
+            set_cache(key, key)
+        assert "a" not in cache_manager._memory
+        assert get_cache("a") == "a"  # DB・ファイルから復元
+
+    def test_returned_value_is_copy(self):
+        set_cache("xbrl_S100TEST", {"売上高": 100.0})
+        get_cache("xbrl_S100TEST")["売上高"] = 0
+        assert get_cache("xbrl_S100TEST") == {"売上高": 100.0}
+
+    def test_get_many_set_many(self):
+        set_many({"xbrl_A": {"売上高": 1.0}, "xbrl_B": {"売上高": 2.0}})
+        clear_memory_cache()
+        result = get_many(["xbrl_A", "xbrl_B", "xbrl_C"])
+        assert result == {"xbrl_A": {"売上高": 1.0}, "xbrl_B": {"売上高": 2.0}}
+
+
+class TestSweep:
+    def test_expired_entries_removed(self, backend, monkeypatch):
+        if backend != "sqlite":
+            pytest.skip("SQLite固有")
+        set_cache("old", 1)
+        now = time.time()
+        monkeypatch.setattr(cache_manager.time, "time", lambda: now + 10 * 3600)
+        set_cache("new", 2)
+        assert sweep(max_age_hours=5) == 1
+        clear_memory_cache()
+        assert get_cache("old", max_age_hours=100) is None
+        assert get_cache("new") == 2
+
+    def test_size_cap(self, backend):
+        if backend != "sqlite":
+            pytest.skip("SQLite固有")
+        for i in range(5):
+            set_cache(f"k{i}", "x" * 100)
+            time.sleep(0.01)
+        sweep(max_bytes=250)
+        clear_memory_cache()
+        assert get_cache("k0") is None
+        assert get_cache("k4") == "x" * 100
+
+
+class TestGetOrFetch:
+    def test_fetch_once_and_cache(self):
+        calls = []
+        fetch = lambda: calls.append(1) or {"売上高": 1.0}
+        assert cache_manager.get_or_fetch("xbrl_A", fetch) == {"売上高": 1.0}
+        assert cache_manager.get_or_fetch("xbrl_A", fetch) == {"売上高": 1.0}
+        assert len(calls) == 1
+
+    def test_empty_result_not_cached(self):
+        calls = []
+        fetch = lambda: calls.append(1) or None
+        assert cache_manager.get_or_fetch("xbrl_A", fetch) is None
+        assert cache_manager.get_or_fetch("xbrl_A", fetch) is None
+        assert len(calls) == 2
+
+    def test_concurrent_requests_fetch_once(self):
+        import threading
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"売上高": 1.0}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache_manager.get_or_fetch("xbrl_A", fetch)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert results == [{"売上高": 1.0}] * 5
+
+    def test_atomic_file_write(self, backend):
+        if backend != "file":
+            pytest.skip("JSONファイル固有")
+        set_cache("xbrl_A", {"売上高": 1.0})
+        leftovers = [f for f in os.listdir(cache_manager.CACHE_DIR) if f.endswith(".tmp")]
+        assert leftovers == []
+
+    def test_json_entries_imported_into_sqlite(self, backend, monkeypatch):
+        if backend != "sqlite":
+            pytest.skip("SQLite固有")
+        # 以前のJSONファイルのバックエンドで保存されたエントリ
+        monkeypatch.setattr(cache_manager, "CACHE_BACKEND", "file")
+        set_cache("xbrl_OLD", {"売上高": 3.0})
+        monkeypatch.setattr(cache_manager, "CACHE_BACKEND", "sqlite")
+        clear_memory_cache()
+        assert get_cache("xbrl_OLD") == {"売上高": 3.0}
+        assert [f for f in os.listdir(cache_manager.CACHE_DIR) if f.endswith(".json")] == []
+
+
+class TestKeyLock:
+    def test_lock_files_bounded(self, backend):
+        for i in range(200):
+            with cache_manager.key_lock(f"k{i}"):
+                pass
+        assert len(os.listdir(os.path.join(cache_manager.CACHE_DIR, "locks"))) <= cache_manager.LOCK_STRIPES
+
+    def test_nested_same_stripe(self, backend, monkeypatch):
+        monkeypatch.setattr(cache_manager, "LOCK_STRIPES", 1)
+        # 同じスレッドが同じロックを入れ子で取っても待たない
+        start = time.time()
+        with cache_manager.key_lock("a", timeout=2):
+            with cache_manager.key_lock("b", timeout=2):
+                pass
+        assert time.time() - start < 1
+
+    def _crossed_keys(self):
+        """ストライプ番号が 低い・高い になる2つのキー"""
+        keys = {}
+        for i in range(1000):
+            keys.setdefault(cache_manager._stripe_of(f"k{i}"), f"k{i}")
+            if len(keys) >= 2:
+                break
+        low, high = sorted(keys)
+        return keys[low], keys[high]
+
+    def test_crossed_nested_locks_do_not_wait(self, backend):
+        import threading
+        low, high = self._crossed_keys()
+        barrier = threading.Barrier(2)
+        done = []
+
+        def worker(outer, inner):
+            with cache_manager.key_lock(outer, timeout=30):
+                barrier.wait()
+                # 相手が保持中のロックを逆順に取りに行っても待ち合わない
+                with cache_manager.key_lock(inner, timeout=30):
+                    time.sleep(0.05)
+            done.append(outer)
+
+        threads = [threading.Thread(target=worker, args=(high, low)), threading.Thread(target=worker, args=(low, high))]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+        assert sorted(done) == sorted([low, high]) and time.time() - start < 5
+
+    def test_get_or_fetch_takes_lock_keys_in_order(self, backend):
+        import threading
+        low, high = self._crossed_keys()
+        locked = []
+
+        def fetch(inner):
+            with cache_manager.key_lock(inner, timeout=30):
+                # 内側のキーは外側でまとめて取っているので、待たずに入れる
+                locked.append(cache_manager._stripe_locks[cache_manager._stripe_of(inner)].locked())
+                time.sleep(0.1)
+            return {"売上高": 1.0}
+
+        threads = [threading.Thread(target=cache_manager.get_or_fetch, args=(f"xbrl_{outer}", lambda inner=inner: fetch(inner)),
+                                    kwargs={"lock_keys": [inner]})
+                   for outer, inner in [(high, low), (low, high)]]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+        assert locked == [True, True] and time.time() - start < 5
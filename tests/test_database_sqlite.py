@@ -0,0 +1,231 @@
+"""SQLite版データベース（接続の使い回し・WAL）のテスト"""
+import pytest
+import sqlite3
+import threading
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data import database_sqlite as db
+
+SCORE = {"total_score": 70, "judgment": "▲ 標準的",
+         "category_scores": {"収益性": 60, "安全性": 70, "成長性": 80, "割安度": 90}}
+
+
+@pytest.fixture(autouse=True)
+def temp_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    yield
+    db.close_connection()
+
+
+class TestConnection:
+    def test_connection_reused_per_thread(self):
+        assert db._conn() is db._conn()
+        other = []
+        t = threading.Thread(target=lambda: other.append(db._conn()))
+        t.start(); t.join()
+        assert other[0] is not db._conn()
+
+    def test_wal_mode(self):
+        assert db._conn().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_reader_not_blocked_by_writer(self):
+        db.save_stock_score("1111", "A", SCORE, {"ROE": 10})
+        writer = sqlite3.connect(db.DB_PATH)
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("UPDATE stock_scores SET total_score=0")
+        try:
+            # 書き込みトランザクション中でも、確定済みの値がすぐ読める
+            result = []
+            t = threading.Thread(target=lambda: result.append(db.get_all_scores()))
+            t.start(); t.join(timeout=5)
+            assert result and result[0][0]["total_score"] == 70
+        finally:
+            writer.rollback()
+            writer.close()
+
+    def test_get_connection_is_independent(self):
+        conn = db.get_connection()
+        conn.execute("INSERT INTO watchlist (username, stock_code) VALUES ('u', '7203')")
+        conn.commit()
+        conn.close()
+        assert db.get_watchlist("u") == ["7203"]
+
+
+class TestFunctions:
+    def test_scores_roundtrip(self):
+        db.save_stock_score("1111", "A", SCORE, {"ROE": 10})
+        assert db.get_scores_count() == 1
+        assert db.get_all_scores()[0]["profitability"] == 60
+
+    def test_watchlist(self):
+        db.save_watchlist("u", "7203")
+        db.save_watchlist("u", "7203")
+        assert db.get_watchlist("u") == ["7203"]
+        db.remove_watchlist("u", "7203")
+        assert db.get_watchlist("u") == []
+
+    def test_scores_by_codes(self):
+        db.save_stock_scores_bulk([(f"{i:04d}", f"社{i}", SCORE, {}) for i in range(600)])
+        rows = db.get_scores_by_codes(["0001", "0599", "9999", "0001"] + [f"{i:04d}" for i in range(100, 600)],
+                                      ["stock_code", "total_score"])
+        assert len(rows) == 501 and set(rows[0]) == {"stock_code", "total_score"}
+
+    def test_bulk_upsert(self):
+        rows = [(f"{i:04d}", f"社{i}", SCORE, {"ROE": i}) for i in range(1000)]
+        assert db.save_stock_scores_bulk(rows) == 1000
+        db.save_stock_scores_bulk([("0001", "更新", SCORE, {"ROE": 99})])
+        assert db.get_scores_count() == 1000
+        row = [r for r in db.get_all_scores(limit=1000) if r["stock_code"] == "0001"][0]
+        assert row["company_name"] == "更新" and row["roe"] == 99
+
+
+class TestSupabaseBulk:
+    def test_chunked_upsert(self, monkeypatch):
+        from data import database_supabase
+
+        class FakeTable:
+            def __init__(self, calls):
+                self.calls = calls
+
+            def upsert(self, data):
+                self.calls.append(data)
+                return self
+
+            def execute(self):
+                return None
+
+        class FakeClient:
+            def table(self, name):
+                return FakeTable(calls)
+
+        calls = []
+        monkeypatch.setattr(database_supabase, "_get_client", FakeClient)
+        rows = [(f"{i:04d}", f"社{i}", SCORE, {}) for i in range(1200)]
+        assert database_supabase.save_stock_scores_bulk(rows) == 1200
+        assert [len(c) for c in calls] == [500, 500, 200]
+        assert calls[0][0]["stock_code"] == "0000"
+
+
+class TestIndexes:
+    def _plan(self, sql, params):
+        rows = db._conn().execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return " / ".join(r["detail"] for r in rows)
+
+    def test_migration_recorded(self):
+        assert db._conn().execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+
+    def test_history_queries_use_indexes(self):
+        plan = self._plan("SELECT * FROM analysis_history WHERE username=? ORDER BY analyzed_at DESC LIMIT ?", ("u", 20))
+        assert "idx_history_user_time" in plan and "TEMP B-TREE" not in plan
+        plan = self._plan("SELECT * FROM analysis_history WHERE stock_code=? ORDER BY analyzed_at DESC LIMIT ?", ("7203", 10))
+        assert "idx_history_stock_time" in plan and "TEMP B-TREE" not in plan
+
+    def test_user_stats_index_only(self):
+        for sql in ["SELECT COUNT(*) as total FROM analysis_history WHERE username=?",
+                    "SELECT COUNT(DISTINCT stock_code) as unique_stocks FROM analysis_history WHERE username=?",
+                    "SELECT stock_code, company_name, COUNT(*) as cnt FROM analysis_history WHERE username=? GROUP BY stock_code"]:
+            assert "COVERING INDEX" in self._plan(sql, ("u",))
+
+    def test_scores_sorted_by_index(self):
+        plan = self._plan("SELECT * FROM stock_scores WHERE total_score >= ? ORDER BY total_score DESC LIMIT ?", (0, 100))
+        assert "idx_stock_scores_total" in plan and "TEMP B-TREE" not in plan
+
+    def test_user_stats(self):
+        score = dict(SCORE)
+        for code in ["7203", "7203", "6758"]:
+            db.save_analysis("u", code, code, score, {}, "バランス", "中期")
+        stats = db.get_user_stats("u")
+        assert stats["total_analyses"] == 3 and stats["unique_stocks"] == 2
+        assert stats["top_stocks"][0]["stock_code"] == "7203"
+
+    def test_keyset_page_uses_index(self):
+        plan = self._plan("SELECT stock_code, total_score FROM stock_scores WHERE total_score >= ? "
+                          "AND (total_score < ? OR (total_score = ? AND stock_code > ?)) "
+                          "ORDER BY total_score DESC, stock_code LIMIT ?", (0, 50, 50, "1000", 100))
+        assert "idx_stock_scores_total" in plan and "TEMP B-TREE" not in plan
+
+    def test_screen_query_uses_index(self):
+        plan = self._plan("SELECT * FROM stock_scores WHERE total_score >= ? AND roe >= ? "
+                          "ORDER BY total_score DESC, stock_code LIMIT ? OFFSET ?", (50, 0, 100, 0))
+        assert "idx_stock_scores_total" in plan and "TEMP B-TREE" not in plan
+
+
+class TestAggregates:
+    def _save(self, scores):
+        db.save_stock_scores_bulk([(f"{i:04d}", f"社{i}", dict(SCORE, total_score=s), {})
+                                   for i, s in enumerate(scores)])
+
+    def test_iter_scores_pages_through_ties(self):
+        self._save([50] * 7 + [80, 20, 50])
+        rows = list(db.iter_scores(columns=["stock_code"], page_size=3))
+        # 同点（50点）の銘柄がページの境目をまたいでも、漏れも重複もなく stock_code 順に続く
+        expected = ["0007"] + [f"{i:04d}" for i in range(7)] + ["0009", "0008"]
+        assert [r["stock_code"] for r in rows] == expected
+        assert set(rows[0]) == {"stock_code", "total_score"}
+
+    def test_projection_rejects_unknown_column(self):
+        with pytest.raises(ValueError):
+            db.get_all_scores(columns=["stock_code; DROP TABLE stock_scores"])
+
+    def test_summary_and_histogram(self):
+        assert db.get_score_summary() == {"cnt": 0}
+        scores = [12, 14, 55, 71, 99]
+        self._save(scores)
+        summary = db.get_score_summary()
+        assert summary["cnt"] == 5 and summary["max"] == 99 and summary["min"] == 12
+        assert summary["avg"] == pytest.approx(sum(scores) / 5)
+        assert summary["median"] == sorted(scores)[len(scores) // 2]
+        self._save([12, 14, 55, 71])
+        assert db.get_score_summary()["median"] == 55
+        assert db.get_score_histogram(10) == [{"bin": 10, "cnt": 2}, {"bin": 50, "cnt": 1},
+                                              {"bin": 70, "cnt": 1}, {"bin": 90, "cnt": 1}]
+        # 100点は最後の区間に入る（グラフの範囲外に出ない）
+        self._save([0, 95, 100, 100, 3])
+        assert db.get_score_histogram(5) == [{"bin": 0, "cnt": 2}, {"bin": 95, "cnt": 3}]
+
+    def test_screen_scores(self):
+        rows = []
+        for i in range(60):
+            score = dict(SCORE, total_score=i, category_scores=dict(SCORE["category_scores"], 収益性=i % 10 * 10))
+            rows.append((f"{i:04d}", f"社{i}", score, {"ROE": i % 7, "PER": i % 5 * 10, "配当利回り": 1.0}))
+        db.save_stock_scores_bulk(rows)
+        conditions = {"min_total": 20, "min_roe": 2, "max_per": 20, "min_profitability": 30}
+        expected = [r[0] for r in sorted(rows, key=lambda r: -r[2]["total_score"])
+                    if r[2]["total_score"] >= 20 and r[3]["ROE"] >= 2 and 0 < r[3]["PER"] <= 20
+                    and r[2]["category_scores"]["収益性"] >= 30]
+        count, page = db.screen_scores(conditions, 0, 5, ["stock_code"])
+        assert count == len(expected) and [r["stock_code"] for r in page] == expected[:5]
+        count, page = db.screen_scores(conditions, 5, 100, None, exclude_codes=expected[:1])
+        assert count == len(expected) - 1 and [r["stock_code"] for r in page] == expected[6:]
+
+    def test_supabase_user_stats_fallback(self, monkeypatch):
+        from data import database_supabase
+
+        class Result:
+            data = [{"stock_code": "7203", "company_name": "トヨタ"}] * 2 + [{"stock_code": "6758", "company_name": "ソニー"}]
+
+        class FakeQuery:
+            def select(self, columns):
+                selected.append(columns)
+                return self
+
+            def eq(self, *args):
+                return self
+
+            def execute(self):
+                return Result()
+
+        class FakeClient:
+            def rpc(self, name, params):
+                raise RuntimeError("function not found")
+
+            def table(self, name):
+                return FakeQuery()
+
+        selected = []
+        monkeypatch.setattr(database_supabase, "_get_client", FakeClient)
+        stats = database_supabase.get_user_stats("u")
+        assert stats["total_analyses"] == 3 and stats["unique_stocks"] == 2
+        assert stats["top_stocks"][0] == {"stock_code": "7203", "company_name": "トヨタ", "cnt": 2}
+        assert selected == ["stock_code,company_name"]
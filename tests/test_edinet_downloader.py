@@ -0,0 +1,60 @@
+"""EDINET並列ダウンロードのテスト"""
+import pytest
+import sys, os, time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data_sources import edinet_downloader
+from data_sources.edinet_downloader import TokenBucket, download_document, iter_downloads
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b""):
+        self.status_code = status_code
+        self.content = content
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return FakeResponse(self.statuses.pop(0), b"PK")
+
+
+class TestTokenBucket:
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        # 2件はバースト、残り2件は1/20秒ずつ待つ
+        assert time.monotonic() - start >= 0.08
+
+
+class TestDownloadDocument:
+    def test_retry_on_429(self):
+        session = FakeSession([429, 200])
+        assert download_document("S1", "key", retries=2, backoff=0, session=session) == b"PK"
+        assert session.calls == 2
+
+    def test_no_retry_on_404(self):
+        session = FakeSession([404, 200])
+        assert download_document("S1", "key", retries=2, backoff=0, session=session) is None
+        assert session.calls == 1
+
+    def test_give_up_after_retries(self):
+        session = FakeSession([503, 503, 503])
+        assert download_document("S1", "key", retries=2, backoff=0, session=session) is None
+        assert session.calls == 3
+
+
+class TestIterDownloads:
+    def test_all_jobs_returned(self, monkeypatch):
+        monkeypatch.setattr(edinet_downloader, "download_document",
+                            lambda doc_id, api_key, limiter=None, session=None: doc_id.encode())
+        jobs = [(f"{i:04d}", [f"S{i}", f"P{i}"]) for i in range(20)]
+        results = dict(iter_downloads(jobs, "key", workers=3, rate=1000))
+        assert len(results) == 20
+        assert results["0005"] == [b"S5", b"P5"]
@@ -0,0 +1,75 @@
+"""EDINET書類一覧インデックスのテスト"""
+import pytest
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data_sources import edinet_index
+
+
+@pytest.fixture(autouse=True)
+def temp_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(edinet_index, "INDEX_PATH", str(tmp_path / "edinet_index.db"))
+    monkeypatch.setattr(edinet_index, "_initialized", False)
+
+
+def _doc(doc_id, edinet_code, period_end, doc_type="120"):
+    return {"docID": doc_id, "edinetCode": edinet_code, "docTypeCode": doc_type,
+            "periodEnd": period_end, "docDescription": "有価証券報告書"}
+
+
+class TestEdinetIndex:
+    def test_ingest_and_find(self):
+        edinet_index.ingest_listing("2024-06-20", [_doc("S1", "E02144", "2024-03-31")])
+        edinet_index.ingest_listing("2023-06-20", [_doc("S0", "E02144", "2023-03-31")])
+        docs = edinet_index.find_documents("E02144")
+        assert [d["docID"] for d in docs] == ["S1", "S0"]
+        assert docs[0]["periodEnd"] == "2024-03-31"
+
+    def test_limit(self):
+        edinet_index.ingest_listing("2024-06-20", [_doc("S1", "E02144", "2024-03-31"), _doc("S0", "E02144", "2023-03-31")])
+        assert len(edinet_index.find_documents("E02144", limit=1)) == 1
+
+    def test_unindexed_doc_types_skipped(self):
+        count = edinet_index.ingest_listing("2024-06-20", [_doc("Q1", "E02144", "2024-03-31", doc_type="140")])
+        assert count == 0
+        assert edinet_index.find_documents("E02144") == []
+
+    def test_other_company_not_returned(self):
+        edinet_index.ingest_listing("2024-06-20", [_doc("S1", "E01777", "2024-03-31")])
+        assert edinet_index.find_documents("E02144") == []
+
+    def test_past_date_is_synced(self):
+        edinet_index.ingest_listing("2024-06-20", [])
+        assert "2024-06-20" in edinet_index.get_synced_dates()
+
+    def test_today_not_final(self):
+        import datetime
+        today = datetime.date.today().isoformat()
+        edinet_index.ingest_listing(today, [])
+        assert today not in edinet_index.get_synced_dates()
+
+    def test_find_latest_documents(self):
+        edinet_index.ingest_listing("2024-06-20", [_doc("S2", "E02144", "2024-03-31"), _doc("X1", "E01777", "2024-03-31")])
+        edinet_index.ingest_listing("2023-06-20", [_doc("S1", "E02144", "2023-03-31")])
+        edinet_index.ingest_listing("2022-06-20", [_doc("S0", "E02144", "2022-03-31")])
+        docs = edinet_index.find_latest_documents("120", per_code=2)
+        assert [d["docID"] for d in docs["E02144"]] == ["S2", "S1"]
+        assert [d["docID"] for d in docs["E01777"]] == ["X1"]
+
+
+class TestDatesToSync:
+    def test_only_missing_dates(self):
+        import datetime
+        edinet_index.ingest_listing("2024-06-19", [])
+        dates = edinet_index.dates_to_sync(datetime.date(2024, 6, 18), datetime.date(2024, 6, 30), recheck_days=0)
+        assert "2024-06-19" not in dates
+        assert "2024-06-18" in dates
+        assert dates[0] == "2024-06-30"
+
+    def test_recheck_recent_days(self):
+        import datetime
+        edinet_index.ingest_listing("2024-06-29", [])
+        edinet_index.ingest_listing("2024-06-20", [])
+        dates = edinet_index.dates_to_sync(datetime.date(2024, 6, 18), datetime.date(2024, 6, 30), recheck_days=3)
+        assert "2024-06-29" in dates
+        assert "2024-06-20" not in dates
@@ -0,0 +1,46 @@
+"""原本ストアのテスト"""
+import pytest
+import sys, os, io, zipfile
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data_sources import filing_store
+
+
+@pytest.fixture(autouse=True)
+def temp_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(filing_store, "STORE_DIR", str(tmp_path / "filings"))
+
+
+def _zip(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+class TestFilingStore:
+    def test_put_and_get(self):
+        filing_store.put_filing("S100TEST", b"<xbrl/>")
+        assert filing_store.has_filing("S100TEST")
+        assert filing_store.get_filing("S100TEST") == b"<xbrl/>"
+
+    def test_missing(self):
+        assert filing_store.get_filing("S100NONE") is None
+
+    def test_fetch_downloads_once(self, monkeypatch):
+        calls = []
+
+        def fake_download(doc_id, api_key, limiter=None, session=None):
+            calls.append(doc_id)
+            return _zip({"XBRL/PublicDoc/main.xbrl": b"<main/>", "XBRL/AuditDoc/audit.xbrl": b"<audit/>"})
+
+        monkeypatch.setattr(filing_store, "download_document", fake_download)
+        assert filing_store.fetch_filing("S100TEST", "key") == b"<main/>"
+        assert filing_store.fetch_filing("S100TEST", "key") == b"<main/>"
+        assert calls == ["S100TEST"]
+
+    def test_fetch_failure(self, monkeypatch):
+        monkeypatch.setattr(filing_store, "download_document", lambda *a, **k: None)
+        assert filing_store.fetch_filing("S100FAIL", "key") is None
+        assert not filing_store.has_filing("S100FAIL")
@@ -35,3 +35,49 @@ class TestFilters:
     def test_empty_data(self):
         warnings = check_filters({}, None)
         assert isinstance(warnings, list)
+
+
+class TestCheckFiltersFrame:
+    """一括判定が check_filters と同じ警告になることのテスト"""
+
+    def _random_financials(self, rng):
+        data = {}
+        for label in ["自己資本", "総資産", "純利益", "営業CF", "有利子負債", "流動資産", "流動負債"]:
+            if rng.random() < 0.2:
+                continue
+            data[label] = rng.randint(-3 * 10**6, 10**7)
+        return data
+
+    def test_matches_check_filters(self):
+        import random
+        import pandas as pd
+        from analysis.filters import check_filters_frame, filter_titles
+        rng = random.Random(0)
+        current = [self._random_financials(rng) for _ in range(500)]
+        previous = [self._random_financials(rng) if rng.random() < 0.8 else None for _ in range(500)]
+        masks = check_filters_frame(pd.DataFrame(current), pd.DataFrame([p or {} for p in previous]))
+        for cur, prev, mask in zip(current, previous, masks):
+            expected = sorted(w["title"] for w in check_filters(cur, prev))
+            assert sorted(filter_titles(mask)) == expected
+
+    def test_without_previous(self):
+        import pandas as pd
+        from analysis.filters import check_filters_frame, FILTER_FLAGS
+        masks = check_filters_frame(pd.DataFrame([{"純利益": -1, "総資産": 100, "自己資本": 5}]))
+        assert masks[0] == FILTER_FLAGS["直近期赤字"] | FILTER_FLAGS["債務超過リスク"]
+
+
+class TestRiskFlagsStore:
+    def test_refresh_and_exclude(self, tmp_path, monkeypatch):
+        from data_sources import financial_store
+        from analysis.filters import refresh_risk_flags, FILTER_FLAGS
+        monkeypatch.setattr(financial_store, "FINANCIALS_PATH", str(tmp_path / "financials.db"))
+        monkeypatch.setattr(financial_store, "_initialized", False)
+        financial_store.save_financial("S1", {"純利益": -10, "総資産": 100, "自己資本": 50})
+        financial_store.save_financial("P1", {"純利益": -5})
+        financial_store.save_financial("S2", {"純利益": 10, "総資産": 100, "自己資本": 50})
+        financial_store.save_indicators("1111", "A", {}, "S1", "P1")
+        financial_store.save_indicators("2222", "B", {}, "S2")
+        assert refresh_risk_flags() == 2
+        assert financial_store.get_flagged_stocks(FILTER_FLAGS["赤字継続"]) == {"1111"}
+        assert financial_store.get_flagged_stocks(FILTER_FLAGS["債務超過リスク"]) == set()
@@ -0,0 +1,204 @@
+"""財務データ・指標ストアと再スコアリングのテスト"""
+import pytest
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data_sources import financial_store
+from analysis import scoring, score_cube, ranking_snapshot
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(financial_store, "FINANCIALS_PATH", str(tmp_path / "financials.db"))
+    monkeypatch.setattr(financial_store, "_initialized", False)
+    monkeypatch.setattr(score_cube, "CUBE_PATH", str(tmp_path / "score_cube.npz"))
+    monkeypatch.setattr(ranking_snapshot, "SNAPSHOT_DIR", str(tmp_path / "ranking"))
+    return financial_store
+
+
+class TestFinancials:
+    def test_parse_once(self, store, monkeypatch):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return None
+
+        assert store.get_or_parse_financial("S1", fetch) is None
+        store.save_financial("S1", {"売上高": 100}, "1111")
+        assert store.get_or_parse_financial("S1", fetch) == {"売上高": 100}
+        assert len(calls) == 1
+
+    def test_parser_version_change_reparses(self, store, monkeypatch):
+        from parsers import xbrl_parser
+        store.save_financial("S1", {"売上高": 100}, "1111", "2024-03-31")
+        monkeypatch.setattr(xbrl_parser, "PARSER_VERSION", xbrl_parser.PARSER_VERSION + 1)
+        assert store.get_financial("S1") is None and store.get_financials(["S1"]) == {}
+        assert store.get_stale_doc_ids(["S1", "S2"]) == {"S1"}
+        assert store.get_parsed_doc_ids(["S1", "S2"]) == set()
+        monkeypatch.setattr(xbrl_parser, "parse_xbrl", lambda data: {"売上高": 200})
+        assert store.get_or_parse_financial("S1", lambda: b"<xbrl/>") == {"売上高": 200}
+        assert store.get_stale_doc_ids(["S1"]) == set()
+        assert store.get_parsed_doc_ids(["S1", "S2"]) == {"S1"}
+        # 銘柄コード・決算期末は前の行から引き継ぐ
+        assert store.get_history("1111")["2024-03-31"]["売上高"] == 200
+
+
+class TestRescore:
+    def _saved(self):
+        saved = {}
+
+        def save_bulk(rows):
+            for code, name, score_result, indicators in rows:
+                saved[code] = score_result["total_score"]
+        return saved, save_bulk
+
+    def test_skip_unchanged(self, store):
+        from rescore import run_rescore
+        store.save_indicators("1111", "A", {"ROE": 15}, "S1", scored=True)
+        store.save_indicators("2222", "B", {"ROE": 30}, "S2", scored=False)
+        saved, save = self._saved()
+        assert run_rescore(save_bulk=save) == {"rescored": 1, "skipped": 1, "reparsed": 0}
+        assert saved == {"2222": 100}
+        # 2回目は全銘柄スキップ
+        saved.clear()
+        assert run_rescore(save_bulk=save) == {"rescored": 0, "skipped": 2, "reparsed": 0}
+        assert run_rescore(force=True, save_bulk=save)["rescored"] == 2
+
+    def test_stale_parse_reparsed_from_filing_store(self, store, monkeypatch):
+        from rescore import run_rescore
+        from parsers import xbrl_parser
+        from data_sources import filing_store
+        store.save_financial("S1", {"売上高": 100, "純利益": 5, "自己資本": 100}, "1111")
+        store.save_indicators("1111", "A", {"ROE": 5.0}, "S1")
+        monkeypatch.setattr(xbrl_parser, "PARSER_VERSION", xbrl_parser.PARSER_VERSION + 1)
+        monkeypatch.setattr(xbrl_parser, "parse_xbrl", lambda data: {"売上高": 100, "純利益": 20, "自己資本": 100})
+        monkeypatch.setattr(filing_store, "get_filing", lambda doc_id: b"<xbrl/>")
+        saved, save = self._saved()
+        result = run_rescore(save_bulk=save)
+        assert result["reparsed"] == 1 and result["rescored"] == 1
+        assert store.get_all_indicators()[0]["indicators"]["ROE"] == 20.0
+
+    def test_config_change_rescores_all(self, store, monkeypatch):
+        from rescore import run_rescore
+        store.save_indicators("1111", "A", {"ROE": 15}, "S1")
+        store.save_indicators("2222", "B", {"ROE": 30}, "S2")
+        thresholds = dict(scoring.THRESHOLDS, ROE={"excellent": 15, "zero": 0, "higher_is_better": True})
+        monkeypatch.setattr(scoring, "THRESHOLDS", thresholds)
+        saved, save = self._saved()
+        assert run_rescore(save_bulk=save) == {"rescored": 2, "skipped": 0, "reparsed": 0}
+        assert saved == {"1111": 100, "2222": 100}
+        cube = score_cube.load_score_cube()
+        assert sorted(cube["codes"]) == ["1111", "2222"]
+        assert ranking_snapshot.load_ranking_snapshot()["manifest"]["count"] == 2
+
+    def test_snapshot_seeded_from_stored_indicators(self, store):
+        # キューブにはこの実行の1銘柄しかなくても、保存済みの全銘柄でスナップショットを作る
+        store.save_indicators("1111", "A", {"ROE": 15}, "S1")
+        store.save_indicators("2222", "B", {"ROE": 30}, "S2")
+        cube = score_cube.update_score_cube([("2222", "B", {"ROE": 30})])
+        ranking_snapshot.publish_ranking_snapshot(cube, "1")
+        snap = ranking_snapshot.load_ranking_snapshot()
+        assert snap["manifest"]["count"] == 2 and sorted(snap["codes"].tolist()) == ["1111", "2222"]
+        assert sorted(score_cube.load_score_cube()["codes"].tolist()) == ["1111", "2222"]
+
+
+class TestFacts:
+    def test_history_and_frame(self, store):
+        store.save_financial("S1", {"売上高": 100, "純利益": 10}, "1111", "2023-03-31")
+        store.save_facts("1111", "2024-03-31", {"売上高": 120, "純利益": 12}, "S2")
+        store.save_facts("2222", "2024-03-31", {"売上高": 50})
+        assert store.get_history("1111") == {
+            "2023-03-31": {"売上高": 100, "純利益": 10},
+            "2024-03-31": {"売上高": 120, "純利益": 12},
+        }
+        assert store.get_history("1111", labels=["売上高"])["2024-03-31"] == {"売上高": 120}
+        frame = store.facts_frame(labels=["売上高"], start="2024-01-01")
+        assert frame.loc[("2222", "2024-03-31"), "売上高"] == 50
+        assert len(frame) == 2
+
+    def test_resave_replaces_period(self, store):
+        store.save_facts("1111", "2024-03-31", {"売上高": 120, "純利益": 12})
+        store.save_facts("1111", "2024-03-31", {"売上高": 130})
+        assert store.get_history("1111") == {"2024-03-31": {"売上高": 130}}
+
+    def test_load_history_fetches_missing_only(self, store):
+        store.save_facts("1111", "2023-03-31", {"売上高": 100})
+        fetched = []
+
+        def fetch(doc):
+            fetched.append(doc["docID"])
+            return {"売上高": 120}
+
+        docs = [{"docID": "S2", "periodEnd": "2024-03-31"}, {"docID": "S1", "periodEnd": "2023-03-31"}]
+        history = store.load_history("1111", docs, fetch)
+        assert list(history) == ["2023-03-31", "2024-03-31"]
+        assert fetched == ["S2"]
+        # 2回目は取得しない
+        store.load_history("1111", docs, fetch)
+        assert fetched == ["S2"]
+
+
+class TestScoreHistory:
+    def _row(self, code, total, growth=50):
+        return (code, code, {"total_score": total, "category_scores": {"収益性": 60, "安全性": 70, "成長性": growth}}, {})
+
+    def test_append_only_changes(self, store):
+        run1 = store.start_batch_run("daily")
+        assert store.append_score_history(run1, [self._row("1111", 60), self._row("2222", 40)]) == 2
+        store.finish_batch_run(run1, 2)
+        run2 = store.start_batch_run("daily")
+        # 変化のない銘柄は書かない
+        assert store.append_score_history(run2, [self._row("1111", 60), self._row("2222", 55, 80)]) == 1
+        run3 = store.start_batch_run("daily")
+        store.append_score_history(run3, [self._row("1111", 70), self._row("3333", 90)])
+
+        latest = store.get_scores_as_of()
+        assert {c: r["total_score"] for c, r in latest.items()} == {"1111": 70, "2222": 55, "3333": 90}
+        assert latest["2222"]["growth"] == 80 and latest["2222"]["value"] is None
+        as_of2 = store.get_scores_as_of(run_id=run2)
+        assert {c: r["total_score"] for c, r in as_of2.items()} == {"1111": 60, "2222": 55}
+        assert store.get_scores_as_of(run_id=run1, stock_codes=["2222"])["2222"]["total_score"] == 40
+        assert [h["total_score"] for h in store.get_score_history("1111")] == [60, 70]
+
+    def test_deltas(self, store):
+        run1 = store.start_batch_run("daily")
+        store.append_score_history(run1, [self._row("1111", 60), self._row("2222", 40)])
+        run2 = store.start_batch_run("daily")
+        store.append_score_history(run2, [self._row("1111", 65), self._row("2222", 20), self._row("3333", 50)])
+        deltas = store.get_score_deltas()
+        assert [(d["stock_code"], d["delta"]) for d in deltas] == [("2222", -20), ("1111", 5), ("3333", None)]
+        assert store.get_score_deltas(run2, stock_codes={"1111"})[0]["prev_total_score"] == 60
+        assert [d["delta"] for d in store.get_score_deltas(run1)] == [None, None]
+
+    def test_latest_changes_span_runs(self, store):
+        run1 = store.start_batch_run("daily")
+        store.append_score_history(run1, [self._row("1111", 60), self._row("2222", 40)])
+        run2 = store.start_batch_run("daily")
+        store.append_score_history(run2, [self._row("1111", 70)])
+        run3 = store.start_batch_run("daily")
+        store.append_score_history(run3, [self._row("3333", 50)])
+        # 最新の実行（run3）で書かれていない銘柄も、それぞれの直近の変化が出る
+        assert store.get_score_deltas(stock_codes={"1111", "2222"}) == []
+        changes = {d["stock_code"]: d for d in store.get_latest_score_changes(["1111", "2222", "9999"])}
+        assert set(changes) == {"1111", "2222"}
+        assert (changes["1111"]["prev_total_score"], changes["1111"]["delta"]) == (60, 10)
+        assert changes["1111"]["batch_run_id"] == run2 and changes["1111"]["started_at"]
+        assert changes["2222"]["delta"] is None
+
+    def test_as_of_time(self, store):
+        run1 = store.start_batch_run("daily")
+        store.append_score_history(run1, [self._row("1111", 60)])
+        assert store.get_scores_as_of(at="2000-01-01") == {}
+        assert store.get_scores_as_of(at="9999-12-31")["1111"]["batch_run_id"] == run1
+
+    def test_queries_use_indexes(self, store):
+        conn = store.get_connection()
+        plan = " / ".join(r["detail"] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT stock_code, MAX(batch_run_id) FROM score_history "
+            "WHERE batch_run_id <= ? GROUP BY stock_code", (1,)))
+        assert "idx_score_history_stock" in plan and "TEMP B-TREE" not in plan
+        plan = " / ".join(r["detail"] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM score_history WHERE batch_run_id = ?", (1,)))
+        assert "PRIMARY KEY" in plan
+        conn.close()
@@ -107,3 +107,57 @@ class TestCalcGrowth:
         previous = {"売上高": 0, "営業利益": 0, "純利益": 0}
         result = calc_growth(current, previous)
         assert result.get("売上高成長率", 0) == 0
+
+
+class TestFrameVersions:
+    """DataFrame版が辞書版と同じ値・同じ欠損になることのテスト"""
+
+    LABELS = ["純利益", "自己資本", "総資産", "営業利益", "売上高", "支払利息", "流動資産",
+              "流動負債", "有利子負債", "1株配当", "発行済株式数"]
+
+    def _random_financials(self, rng):
+        data = {}
+        for label in self.LABELS:
+            r = rng.random()
+            if r < 0.15:
+                continue
+            data[label] = 0 if r < 0.2 else rng.choice([-1, 1, 1, 1]) * rng.randint(1, 10**7)
+        return data
+
+    def _assert_same(self, expected_dicts, frame):
+        from analysis.indicators import frame_to_records
+        for expected, actual in zip(expected_dicts, frame_to_records(frame)):
+            assert set(expected) == set(actual)
+            for k in expected:
+                assert actual[k] == pytest.approx(expected[k], abs=0.011)
+
+    def test_indicators_match_dict_version(self):
+        import random
+        import pandas as pd
+        from analysis.indicators import calc_indicators_frame
+        rng = random.Random(0)
+        rows = [self._random_financials(rng) for _ in range(500)]
+        prices = [rng.choice([None, 0, -5, rng.uniform(1, 5000)]) for _ in rows]
+        frame = calc_indicators_frame(pd.DataFrame(rows), [float("nan") if p is None else p for p in prices])
+        self._assert_same([calc_indicators(d, p) for d, p in zip(rows, prices)], frame)
+
+    def test_growth_match_dict_version(self):
+        import random
+        import pandas as pd
+        from analysis.indicators import calc_growth_frame
+        rng = random.Random(1)
+        current = [self._random_financials(rng) for _ in range(300)]
+        previous = [self._random_financials(rng) for _ in range(300)]
+        frame = calc_growth_frame(pd.DataFrame(current), pd.DataFrame(previous))
+        self._assert_same([calc_growth(c, p) for c, p in zip(current, previous)], frame)
+
+    def test_growth_history(self):
+        import pandas as pd
+        from analysis.indicators import calc_growth_history
+        index = pd.MultiIndex.from_tuples([("1111", "2024-03-31"), ("1111", "2023-03-31"), ("2222", "2024-03-31")],
+                                          names=["stock_code", "period_end"])
+        frame = pd.DataFrame({"売上高": [120, 100, 50]}, index=index)
+        growth = calc_growth_history(frame)
+        assert growth.loc[("1111", "2024-03-31"), "売上高成長率"] == 20.0
+        assert pd.isna(growth.loc[("1111", "2023-03-31"), "売上高成長率"])
+        assert pd.isna(growth.loc[("2222", "2024-03-31"), "売上高成長率"])
@@ -0,0 +1,60 @@
+"""全銘柄内・セクター内の相対評価のテスト"""
+import pytest
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+from analysis.peers import compute_peer_stats, load_sectors, sector_map
+
+
+def _stats(frame, code, indicator):
+    row = frame[(frame["stock_code"] == code) & (frame["indicator"] == indicator)]
+    return row.iloc[0] if len(row) else None
+
+
+class TestComputePeerStats:
+    def setup_method(self):
+        self.values = pd.DataFrame({
+            "ROE": [5.0, 10.0, 15.0, 20.0, None],
+            "PER": [10.0, 20.0, 30.0, 40.0, 50.0],
+        }, index=["A", "B", "C", "D", "E"])
+        self.sectors = {"A": "X", "B": "X", "C": "X", "D": "Y"}
+
+    def test_percentile_oriented(self):
+        stats = compute_peer_stats(self.values, self.sectors)
+        assert _stats(stats, "D", "ROE")["percentile"] == 100
+        assert _stats(stats, "A", "ROE")["percentile"] == 25
+        # PERは低いほど良い
+        assert _stats(stats, "A", "PER")["percentile"] == 100
+        assert _stats(stats, "E", "ROE") is None
+
+    def test_sector_z(self):
+        stats = compute_peer_stats(self.values, self.sectors)
+        assert _stats(stats, "C", "ROE")["sector_z"] == pytest.approx(1.0)
+        assert _stats(stats, "A", "PER")["sector_z"] == pytest.approx(1.0)
+        assert _stats(stats, "A", "ROE")["sector"] == "X"
+        # 銘柄数が足りないセクター・セクター不明はNaN
+        assert pd.isna(_stats(stats, "D", "ROE")["sector_z"])
+        assert pd.isna(_stats(stats, "E", "PER")["sector_z"])
+
+
+class TestSectors:
+    def test_sector_map(self):
+        sectors = load_sectors()
+        assert sector_map(sectors)["7203"] == "自動車"
+
+
+class TestPeerStatsStore:
+    def test_refresh_and_lookup(self, tmp_path, monkeypatch):
+        from data_sources import financial_store
+        from analysis import peers
+        monkeypatch.setattr(financial_store, "FINANCIALS_PATH", str(tmp_path / "financials.db"))
+        monkeypatch.setattr(financial_store, "_initialized", False)
+        for code, roe in [("7203", 5.0), ("7267", 10.0), ("7269", 15.0)]:
+            financial_store.save_indicators(code, code, {"ROE": roe})
+        assert peers.refresh_peer_stats() == 3
+        stats = financial_store.get_peer_stats("7269")
+        assert stats["ROE"]["percentile"] == 100
+        assert stats["ROE"]["sector"] == "自動車"
+        assert stats["ROE"]["sector_z"] == pytest.approx(1.0)
+        assert financial_store.get_peer_stats("9999") == {}
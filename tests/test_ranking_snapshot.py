@@ -0,0 +1,76 @@
+"""ランキングスナップショットのテスト"""
+import pytest
+import random
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+from analysis import ranking_snapshot as rs
+from analysis.scoring import THRESHOLDS
+from analysis.score_cube import build_score_cube, style_scores
+
+
+def _cube(n=200, seed=3):
+    rng = random.Random(seed)
+    rows = [{name: round(rng.uniform(-20, 60), 1) for name in THRESHOLDS if rng.random() < 0.8} for _ in range(n)]
+    codes = [f"{i:04d}" for i in range(n)]
+    return build_score_cube(codes, [f"社{c}" for c in codes], rows), dict(zip(codes, rows))
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    rs._loaded.clear()
+    return str(tmp_path / "ranking")
+
+
+class TestRankingSnapshot:
+    def test_orders_match_python_sort(self, snapshot_dir):
+        cube, indicators = _cube()
+        rs.save_ranking_snapshot(rs.build_ranking_snapshot(cube, indicators), "1", snapshot_dir)
+        snap = rs.load_ranking_snapshot(snapshot_dir)
+        assert isinstance(snap["orders"], np.memmap)
+
+        style, period = "成長株", "長期（3年以上）"
+        scores = style_scores(cube, style, period)
+        rows = rs.ranking_rows(snap, rs.ranking_order(snap, style, period)[:30], style, period)
+        expected = sorted(scores, key=lambda c: (-scores[c], c))[:30]
+        assert [r["code"] for r in rows] == expected
+        assert [r["total"] for r in rows] == [scores[c] for c in expected]
+        assert rows[0]["roe"] == pytest.approx(indicators[expected[0]].get("ROE") or 0)
+
+        by_growth = rs.ranking_rows(snap, rs.ranking_order(snap, style, period, "成長性"), style, period)
+        growth = [r["growth"] for r in by_growth]
+        assert growth == sorted(growth, reverse=True) and len(by_growth) == 200
+
+    def test_metrics_keep_stored_values(self, snapshot_dir):
+        cube, _ = _cube(2)
+        indicators = {"0000": {"ROE": 12.34, "PER": 8.1, "配当利回り": 2.35}, "0001": {}}
+        rs.save_ranking_snapshot(rs.build_ranking_snapshot(cube, indicators), "1", snapshot_dir)
+        snap = rs.load_ranking_snapshot(snapshot_dir)
+        row = rs.ranking_rows(snap, [0], "バランス", "中期（1〜3年）")[0]
+        # float32 に丸めると 12.34000015258789 のように一覧・CSVに余計な桁が出る
+        assert (row["roe"], row["per"], row["dividend"]) == (12.34, 8.1, 2.35)
+
+    def test_versions_switch_and_prune(self, snapshot_dir):
+        cube, indicators = _cube(20)
+        for version in ["1", "2", "3"]:
+            rs.save_ranking_snapshot(rs.build_ranking_snapshot(cube, indicators), version, snapshot_dir)
+        assert rs.current_version(snapshot_dir) == "3"
+        assert sorted(d for d in os.listdir(snapshot_dir) if d != "CURRENT") == ["2", "3"]
+        assert rs.load_ranking_snapshot(snapshot_dir)["manifest"]["version"] == "3"
+
+    def test_stale_layout_ignored(self, snapshot_dir, monkeypatch):
+        cube, indicators = _cube(10)
+        rs.save_ranking_snapshot(rs.build_ranking_snapshot(cube, indicators), "1", snapshot_dir)
+        monkeypatch.setattr(rs, "COMBOS", rs.COMBOS[:-1])
+        assert rs.load_ranking_snapshot(snapshot_dir) is None
+        assert rs.load_ranking_snapshot(str(os.path.join(snapshot_dir, "missing"))) is None
+
+    def test_weight_change_ignored(self, snapshot_dir, monkeypatch):
+        cube, indicators = _cube(10)
+        rs.save_ranking_snapshot(rs.build_ranking_snapshot(cube, indicators), "1", snapshot_dir)
+        assert rs.load_ranking_snapshot(snapshot_dir) is not None
+        # 列の並びが同じでも重みの値が変われば古い総合スコア・並び順は使わない
+        rs._loaded.clear()
+        monkeypatch.setattr(rs, "weights_fingerprint", lambda: "changed")
+        assert rs.load_ranking_snapshot(snapshot_dir) is None
@@ -0,0 +1,75 @@
+"""スコアキューブのテスト"""
+import pytest
+import random
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from analysis.scoring import calc_total_score, THRESHOLDS
+from analysis.score_cube import (COMBOS, build_score_cube, merge_score_cube, save_score_cube,
+                                 load_score_cube, update_score_cube, style_scores)
+
+
+def _random_indicators(rng):
+    indicators = {}
+    for name, t in THRESHOLDS.items():
+        if rng.random() < 0.3:
+            continue
+        lo, hi = sorted([t["excellent"], t["zero"]])
+        span = hi - lo
+        indicators[name] = round(rng.uniform(lo - span, hi + span), 1)
+    return indicators
+
+
+class TestScoreCube:
+    def test_totals_match_calc_total_score(self):
+        rng = random.Random(1)
+        rows = [_random_indicators(rng) for _ in range(300)] + [{}]
+        codes = [f"{i:04d}" for i in range(len(rows))]
+        cube = build_score_cube(codes, codes, rows)
+        for k, (style, period) in enumerate(COMBOS):
+            for i, ind in enumerate(rows):
+                assert cube["totals"][i, k] == calc_total_score(ind, style, period)["total_score"]
+
+    def test_style_scores_period_alias(self):
+        rows = [{"ROE": 20, "PER": 10, "自己資本比率": 50}]
+        cube = build_score_cube(["1111"], ["テスト"], rows)
+        # 分析ページは「中期」のような短い期間名を渡す
+        assert style_scores(cube, "バリュー投資", "中期") == {
+            "1111": calc_total_score(rows[0], "バリュー投資", "中期（1〜3年）")["total_score"]}
+        assert style_scores(None, "バランス", "中期") == {}
+
+    def test_merge_overwrites_existing(self):
+        old = build_score_cube(["1111", "2222"], ["A", "B"], [{"ROE": 5}, {"ROE": 5}])
+        new = build_score_cube(["2222", "3333"], ["B", "C"], [{"ROE": 30}, {"ROE": 10}])
+        merged = merge_score_cube(old, new)
+        scores = style_scores(merged, "バランス", "中期（1〜3年）")
+        assert sorted(scores) == ["1111", "2222", "3333"]
+        assert scores["2222"] == 100
+
+    def test_save_load_roundtrip(self, tmp_path):
+        path = str(tmp_path / "cube.npz")
+        assert load_score_cube(path) is None
+        update_score_cube([("1111", "テスト", {"ROE": 15})], path)
+        update_score_cube([("2222", "テスト2", {"ROE": 30})], path)
+        cube = load_score_cube(path)
+        assert list(cube["codes"]) == ["1111", "2222"]
+        assert style_scores(cube, "バランス", "中期（1〜3年）") == {"1111": 50, "2222": 100}
+
+    def test_weight_change_recomputes_totals(self, tmp_path, monkeypatch):
+        import copy
+        from analysis import score_cube
+        path = str(tmp_path / "cube.npz")
+        rng = random.Random(5)
+        update_score_cube([(f"{i:04d}", "社", _random_indicators(rng)) for i in range(30)], path)
+        # 列の並びは同じまま重みの値だけを変える
+        weights = copy.deepcopy(score_cube.STYLE_PERIOD_WEIGHTS)
+        for periods in weights.values():
+            for w in periods.values():
+                w.update({cat: (1 if cat == "割安度" else 0) for cat in w})
+        monkeypatch.setattr(score_cube, "STYLE_PERIOD_WEIGHTS", weights)
+        score_cube._loaded.clear()
+        cube = load_score_cube(path)
+        assert (cube["totals"] == score_cube.cube_totals(cube["category_scores"], cube["has_data"])).all()
+        value = score_cube.CATEGORY_NAMES.index("割安度")
+        has_value = cube["has_data"][:, value]
+        assert (cube["totals"][has_value, 0] == cube["category_scores"][has_value, value].round()).all()
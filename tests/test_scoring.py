@@ -152,3 +152,47 @@ class TestScoring:
         indicators = {"ROE": 10.0, "ROA": 5.0}
         result = calc_total_score(indicators, "存在しないスタイル", "中期（1〜3年）")
         assert 0 <= result["total_score"] <= 100
+
+
+class TestScoreUniverse:
+    """一括スコアリング（score_universe）が calc_total_score と一致することのテスト"""
+
+    def _random_indicators(self, rng):
+        from analysis.scoring import THRESHOLDS
+        indicators = {}
+        for name, t in THRESHOLDS.items():
+            if rng.random() < 0.3:
+                continue
+            lo, hi = sorted([t["excellent"], t["zero"]])
+            span = hi - lo
+            indicators[name] = round(rng.uniform(lo - span, hi + span), rng.choice([0, 1, 2]))
+        return indicators
+
+    def test_matches_calc_total_score(self):
+        import random
+        from analysis.scoring import score_universe, indicators_to_matrix, STYLE_PERIOD_WEIGHTS
+        rng = random.Random(0)
+        rows = [self._random_indicators(rng) for _ in range(300)] + [{}]
+        matrix = indicators_to_matrix(rows)
+        for style, periods in STYLE_PERIOD_WEIGHTS.items():
+            for period in periods:
+                batch = score_universe(matrix, style=style, period=period)
+                for i, ind in enumerate(rows):
+                    expected = calc_total_score(ind, style, period)
+                    assert batch["total_score"][i] == expected["total_score"]
+                    assert batch["judgment"][i] == expected["judgment"]
+                    for cat, score in expected["category_scores"].items():
+                        assert batch["category_scores"][cat][i] == score
+                    missing = [c for c, m in batch["missing_categories"].items() if m[i]]
+                    assert sorted(missing) == sorted(expected["missing_categories"])
+
+    def test_indicator_scores_match(self):
+        import numpy as np
+        from analysis.scoring import score_indicator_matrix
+        values = np.array([[30.0, np.nan], [15.0, 8.0], [-1.0, 60.0]])
+        scores = score_indicator_matrix(values, ["ROE", "PER"])
+        assert scores[0, 0] == score_indicator("ROE", 30.0)
+        assert np.isnan(scores[0, 1])
+        assert scores[1, 0] == score_indicator("ROE", 15.0)
+        assert scores[1, 1] == score_indicator("PER", 8.0)
+        assert scores[2, 1] == score_indicator("PER", 60.0)
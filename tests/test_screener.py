@@ -0,0 +1,71 @@
+"""スクリーニング（スナップショットに対するマスク）のテスト"""
+import pytest
+import random
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from analysis.ranking_snapshot import build_ranking_snapshot, ranking_order, ranking_rows
+from analysis.screener import screen, screen_columns
+from analysis.scoring import THRESHOLDS
+from analysis.score_cube import build_score_cube
+
+STYLE, PERIOD = "高配当", "中期（1〜3年）"
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    rng = random.Random(7)
+    rows = [{name: round(rng.uniform(-10, 40), 1) for name in THRESHOLDS if rng.random() < 0.8} for _ in range(500)]
+    codes = [f"{i:04d}" for i in range(500)]
+    flags = {c: rng.choice([0, 0, 1, 2, 3]) for c in codes}
+    cube = build_score_cube(codes, codes, rows)
+    return build_ranking_snapshot(cube, dict(zip(codes, rows)), flags), flags
+
+
+def _reference(snapshot, flags, c):
+    """以前の画面と同じ1行ずつの判定"""
+    found = []
+    for r in ranking_rows(snapshot, ranking_order(snapshot, STYLE, PERIOD), STYLE, PERIOD):
+        if flags[r["code"]] & c["exclude_flags"]: continue
+        if r["total"] < c["min_total"]: continue
+        if r["roe"] < c["min_roe"]: continue
+        if r["dividend"] < c["min_dividend"]: continue
+        if c["max_per"] is not None and (r["per"] == 0 or r["per"] > c["max_per"]): continue
+        if r["profitability"] < c["min_profitability"] or r["safety"] < c["min_safety"]: continue
+        if r["growth"] < c["min_growth"] or r["value"] < c["min_value"]: continue
+        found.append(r["code"])
+    return found
+
+
+class TestScreen:
+    def test_matches_row_by_row_filter(self, snapshot):
+        snap, flags = snapshot
+        rng = random.Random(11)
+        for _ in range(30):
+            c = {"min_total": rng.choice([0, 40, 60]), "min_roe": rng.choice([0, 5.0]),
+                 "min_dividend": rng.choice([0, 2.0]), "max_per": rng.choice([None, 15.0]),
+                 "min_profitability": rng.choice([0, 50]), "min_safety": rng.choice([0, 50]),
+                 "min_growth": 0, "min_value": rng.choice([0, 30]), "exclude_flags": rng.choice([0, 1, 3])}
+            count, rows = screen(snap, c, STYLE, PERIOD)
+            expected = _reference(snap, flags, c)
+            assert count == len(expected)
+            assert [r["code"] for r in rows] == expected
+
+    def test_pagination(self, snapshot):
+        snap, _ = snapshot
+        count, all_rows = screen(snap, {"min_total": 30}, STYLE, PERIOD)
+        pages = [screen(snap, {"min_total": 30}, STYLE, PERIOD, offset, 50) for offset in range(0, count, 50)]
+        assert all(c == count for c, _ in pages)
+        assert [r for _, rows in pages for r in rows] == all_rows
+        assert screen(snap, {"min_total": 30}, STYLE, PERIOD, 0, 0) == (count, [])
+
+    def test_unset_conditions_keep_all(self, snapshot):
+        snap, _ = snapshot
+        assert screen(snap, {}, STYLE, PERIOD, 0, 0)[0] == len(snap["codes"])
+
+    def test_columns_cover_all_matches(self, snapshot):
+        snap, _ = snapshot
+        count, rows = screen(snap, {"min_total": 30}, STYLE, PERIOD)
+        columns = screen_columns(snap, {"min_total": 30}, STYLE, PERIOD, ["name", "roe", "total"])
+        assert list(columns) == ["name", "roe", "total"]
+        assert columns["total"] == [r["total"] for r in rows] and len(columns["roe"]) == count
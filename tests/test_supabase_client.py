@@ -0,0 +1,88 @@
+"""Supabaseクライアント共有のテスト"""
+import pytest
+import json
+import threading
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data import supabase_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    supabase_client.reset_client()
+    yield
+    supabase_client.reset_client()
+
+
+class TestSharedClient:
+    def test_created_once_across_threads(self, monkeypatch):
+        created = []
+        monkeypatch.setattr(supabase_client, "load_credentials", lambda: ("http://localhost", "key"))
+        monkeypatch.setattr(supabase_client, "_create", lambda url, key: created.append(url) or object())
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(supabase_client.get_client())) for _ in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        assert len(created) == 1
+        assert all(r is results[0] for r in results)
+
+    def test_modules_share_client(self, monkeypatch):
+        from data import database_supabase
+        from auth import auth_supabase
+        client = object()
+        monkeypatch.setattr(supabase_client, "_create", lambda url, key: client)
+        assert database_supabase._get_client() is client
+        assert auth_supabase._get_client() is client
+
+    def test_reset(self, monkeypatch):
+        monkeypatch.setattr(supabase_client, "_create", lambda url, key: object())
+        first = supabase_client.get_client()
+        supabase_client.reset_client()
+        assert supabase_client.get_client() is not first
+
+    def test_env_credentials(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(supabase_client, "SECRETS_PATH", str(tmp_path / "none.toml"))
+        monkeypatch.setenv("SUPABASE_URL", "http://127.0.0.1:3000")
+        monkeypatch.setenv("SUPABASE_KEY", "k")
+        monkeypatch.setitem(sys.modules, "streamlit", None)  # st.secrets が使えない環境
+        assert supabase_client.load_credentials() == ("http://127.0.0.1:3000", "k")
+
+
+class TestPostgrestStandIn:
+    """ローカルのPostgREST互換サーバーに向けて、接続が使い回されることを確かめる（supabase未インストールならスキップ）"""
+
+    def test_keep_alive(self, monkeypatch):
+        pytest.importorskip("supabase")
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        connections = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                connections.append(1)
+                super().setup()
+
+            def do_GET(self):
+                body = json.dumps([{"stock_code": "7203", "total_score": 80}]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+            monkeypatch.setattr(supabase_client, "load_credentials", lambda: (url, "aaa.bbb.ccc"))
+            from data import database_supabase
+            for _ in range(3):
+                assert database_supabase.get_all_scores()[0]["stock_code"] == "7203"
+            assert len(connections) == 1
+        finally:
+            server.shutdown()
@@ -0,0 +1,101 @@
+"""XBRLパーサーのテスト"""
+import pytest
+import sys, os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from parsers.xbrl_parser import parse_xbrl
+
+SAMPLE_XBRL = """<?xml version="1.0" encoding="UTF-8"?>
+<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance"
+            xmlns:jppfs_cor="http://disclosure.edinet-fsa.go.jp/taxonomy/jppfs/cor"
+            xmlns:jpcrp_cor="http://disclosure.edinet-fsa.go.jp/taxonomy/jpcrp/cor"
+            xmlns:xbrldi="http://xbrl.org/2006/xbrldi">
+  <xbrli:context id="CurrentYearDuration">
+    <xbrli:entity><xbrli:identifier scheme="http://disclosure.edinet-fsa.go.jp">E00000</xbrli:identifier></xbrli:entity>
+    <xbrli:period><xbrli:startDate>2023-04-01</xbrli:startDate><xbrli:endDate>2024-03-31</xbrli:endDate></xbrli:period>
+  </xbrli:context>
+  <jppfs_cor:NetSales contextRef="CurrentYearDuration" unitRef="JPY" decimals="-6">10000000</jppfs_cor:NetSales>
+  <jppfs_cor:NetSales contextRef="Prior1YearDuration" unitRef="JPY" decimals="-6">9000000</jppfs_cor:NetSales>
+  <jppfs_cor:NetSales contextRef="CurrentYearDuration_jpcrp030000-asr_E00000-000AutoReportableSegmentMember" unitRef="JPY">20000000</jppfs_cor:NetSales>
+  <jppfs_cor:OperatingIncome contextRef="CurrentYearDuration" unitRef="JPY">1,200,000</jppfs_cor:OperatingIncome>
+  <jppfs_cor:ProfitLossAttributableToOwnersOfParent contextRef="CurrentYearDuration" unitRef="JPY">800000</jppfs_cor:ProfitLossAttributableToOwnersOfParent>
+  <jppfs_cor:TotalAssets contextRef="CurrentYearInstant" unitRef="JPY">50000000</jppfs_cor:TotalAssets>
+  <jppfs_cor:NetAssets contextRef="CurrentYearInstant" unitRef="JPY">20000000</jppfs_cor:NetAssets>
+  <jppfs_cor:CurrentAssets contextRef="CurrentYearInstant" unitRef="JPY">15000000</jppfs_cor:CurrentAssets>
+  <jppfs_cor:CurrentLiabilities contextRef="CurrentYearInstant" unitRef="JPY">10000000</jppfs_cor:CurrentLiabilities>
+  <jppfs_cor:UnusedNumericTag contextRef="CurrentYearInstant" unitRef="JPY">123</jppfs_cor:UnusedNumericTag>
+  <jpcrp_cor:DividendPaidPerShareSummaryOfBusinessResults contextRef="CurrentYearDuration_NonConsolidatedMember" unitRef="JPYPerShares">50</jpcrp_cor:DividendPaidPerShareSummaryOfBusinessResults>
+  <jpcrp_cor:CompanyName contextRef="FilingDateInstant">テスト株式会社</jpcrp_cor:CompanyName>
+</xbrli:xbrl>
+""".encode("utf-8")
+
+
+class TestParseXbrl:
+    def test_current_consolidated_values(self):
+        result = parse_xbrl(SAMPLE_XBRL)
+        assert result["売上高"] == 10000000
+        assert result["営業利益"] == 1200000
+        assert result["純利益"] == 800000
+        assert result["総資産"] == 50000000
+
+    def test_equity_fallback_to_net_assets(self):
+        result = parse_xbrl(SAMPLE_XBRL)
+        assert result["自己資本"] == 20000000
+
+    def test_segment_only_value_used_as_fallback(self):
+        result = parse_xbrl(SAMPLE_XBRL)
+        assert result["1株配当"] == 50
+
+    def test_streaming_matches_tree(self):
+        assert parse_xbrl(SAMPLE_XBRL, streaming=True) == parse_xbrl(SAMPLE_XBRL, streaming=False)
+
+    def test_zip_input(self):
+        import io, zipfile
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w") as zf:
+            zf.writestr("XBRL/PublicDoc/jpcrp030000-asr-001.xbrl", SAMPLE_XBRL)
+        result = parse_xbrl(buf.getvalue())
+        assert result["売上高"] == 10000000
+
+    def test_tag_priority(self):
+        xml = b"""<x:xbrl xmlns:x="urn:x">
+          <x:NetSales contextRef="CurrentYearDuration">500</x:NetSales>
+          <x:RevenueIFRS contextRef="CurrentYearDuration">400</x:RevenueIFRS>
+        </x:xbrl>"""
+        assert parse_xbrl(xml)["売上高"] == 400
+
+
+class TestClassifyContext:
+    def test_classification(self):
+        from parsers.xbrl_parser import _classify_context, CTX_CURRENT_CONSOL, CTX_CURRENT_ANY, CTX_OTHER
+        assert _classify_context("CurrentYearDuration") == CTX_CURRENT_CONSOL
+        assert _classify_context("CurrentYearDuration_NonConsolidatedMember") == CTX_CURRENT_ANY
+        assert _classify_context("Prior1YearDuration") == CTX_OTHER
+        assert _classify_context("") == CTX_OTHER
+
+
+class TestSelectMainXbrl:
+    def _zip(self, members):
+        import io, zipfile
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+        return buf.getvalue()
+
+    def test_public_doc_preferred(self):
+        from parsers.xbrl_parser import extract_xbrl_from_zip
+        data = self._zip({"XBRL/AuditDoc/audit.xbrl": b"<a/>" * 100, "XBRL/PublicDoc/main.xbrl": b"<m/>"})
+        assert extract_xbrl_from_zip(data) == b"<m/>"
+
+    def test_largest_member_without_public_doc(self):
+        from parsers.xbrl_parser import extract_xbrl_from_zip
+        data = self._zip({"a.xbrl": b"<a/>", "b.xbrl": b"<b/>" * 10, "c.htm": b"x" * 1000})
+        assert extract_xbrl_from_zip(data) == b"<b/>" * 10
+
+    def test_no_xbrl_member(self):
+        data = self._zip({"readme.txt": b"x"})
+        assert parse_xbrl(data) is None
+
+    def test_broken_zip(self):
+        assert parse_xbrl(b"PK\x03\x04broken") is None
@@ -15,7 +15,7 @@ except:
 
 # DB統計
 try:
-    from data.database import get_scores_count, get_all_scores
+    from data.database import get_scores_count, get_score_summary, get_score_histogram
     db_scores = get_scores_count()
 except:
     db_scores = 0
@@ -77,22 +77,23 @@ if users:
 st.divider()
 st.subheader("📊 スコア分布")
 try:
-    scores = get_all_scores(limit=9999)
-    if scores:
+    # 全件は取得せず、DB側で集計した5点刻みの件数と統計値だけを受け取る
+    summary = get_score_summary()
+    if summary["cnt"]:
         import plotly.graph_objects as go
-        score_vals = [s["total_score"] for s in scores]
-        fig2 = go.Figure(data=[go.Histogram(
-            x=score_vals, nbinsx=20,
+        histogram = get_score_histogram(bin_width=5)
+        fig2 = go.Figure(data=[go.Bar(
+            x=[h["bin"] + 2.5 for h in histogram], y=[h["cnt"] for h in histogram], width=5,
             marker_color="#2E75B6",
         )])
         fig2.update_layout(height=350, xaxis_title="総合スコア", yaxis_title="銘柄数", xaxis_range=[0, 100])
         st.plotly_chart(fig2, use_container_width=True)
 
         sc1, sc2, sc3, sc4 = st.columns(4)
-        sc1.metric("平均スコア", f"{sum(score_vals)/len(score_vals):.1f}点")
-        sc2.metric("最高スコア", f"{max(score_vals)}点")
-        sc3.metric("最低スコア", f"{min(score_vals)}点")
-        sc4.metric("中央値", f"{sorted(score_vals)[len(score_vals)//2]}点")
+        sc1.metric("平均スコア", f"{summary['avg']:.1f}点")
+        sc2.metric("最高スコア", f"{summary['max']}点")
+        sc3.metric("最低スコア", f"{summary['min']}点")
+        sc4.metric("中央値", f"{summary['median']}点")
 except:
     st.info("スコアデータがありません")
 
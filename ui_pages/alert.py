@@ -67,6 +67,20 @@ if page == "アラート":
                     st.session_state.alerts.pop(i)
                     st.rerun()
 
+        # 登録銘柄ごとの直近のスコア変化（保存済みのスコア履歴から。通信なし）
+        # 毎日のバッチは一部の銘柄しか更新しないので、最新の実行に限らず銘柄ごとに最後の変化を出す
+        try:
+            from data_sources.financial_store import get_latest_score_changes
+            deltas = get_latest_score_changes({a["code"] for a in st.session_state.alerts})
+        except:
+            deltas = []
+        if deltas:
+            st.markdown("**📊 直近のスコア変化**")
+            for d in deltas:
+                change = "新規" if d["delta"] is None else f"{d['prev_total_score']}点 → {d['total_score']}点（{d['delta']:+d}点）"
+                when = f"（{d['started_at'][:10]}）" if d.get("started_at") else ""
+                st.caption(f"🔹 {CODE_MAP.get(d['stock_code'], {}).get('name', d['stock_code'])}（{d['stock_code']}）: {change}{when}")
+
         # アラートチェック実行
         st.divider()
         if st.button("🔍 アラートを今すぐチェック", type="primary"):
@@ -220,9 +220,7 @@ if stock_code:
 
             import datetime as dt_mod
             from reports.pdf_report import generate_pdf
-            from analysis.filters import check_filters as cf2
-            pdf_warnings = cf2(result['current'], result['previous'])
-            pdf_bytes = generate_pdf(company_name, stock_code, indicators, score_result, warnings=pdf_warnings, stock_info=stock_info)
+            pdf_bytes = generate_pdf(company_name, stock_code, indicators, score_result, warnings=warnings, stock_info=stock_info)
             st.download_button(label="📄 PDFレポートをダウンロード", data=pdf_bytes, file_name=f"kabu_analyzer_{stock_code}_{dt_mod.datetime.now().strftime('%Y%m%d')}.pdf", mime="application/pdf")
 
             st.divider()
@@ -230,17 +228,17 @@ if stock_code:
             docs = result["docs"]
             if len(docs) >= 2:
                 from parsers.xbrl_parser import download_and_parse
-                from analysis.indicators import calc_indicators
-                from data_sources.cache_manager import get_cache, set_cache
-                all_y = {}
-                for doc in docs:
-                    ck = f"xbrl_{doc['docID']}"
-                    yd = get_cache(ck)
-                    if not yd:
-                        yd = download_and_parse(doc["docID"], API_KEY)
-                        if yd: set_cache(ck, yd)
-                    if yd:
-                        all_y[doc["periodEnd"][:4]] = calc_indicators(yd, result["price"])
+                import pandas as pd
+                from analysis.indicators import calc_indicators_frame, frame_to_records
+                from data_sources.cache_manager import get_or_fetch
+                from data_sources.filing_store import filing_lock_key
+                from data_sources.financial_store import load_history
+                # 保存済みの決算期は財務データストアから1クエリで読み、ない期だけ取得する
+                history = load_history(stock_code, docs, lambda doc: get_or_fetch(
+                    f"xbrl_{doc['docID']}", lambda: download_and_parse(doc["docID"], API_KEY),
+                    lock_keys=[filing_lock_key(doc["docID"])]))
+                ind_frame = calc_indicators_frame(pd.DataFrame.from_dict(history, orient="index"), result["price"])
+                all_y = {p[:4]: ind for p, ind in zip(ind_frame.index, frame_to_records(ind_frame))}
                 if len(all_y) >= 2:
                     yrs = sorted(all_y.keys())
                     fig_t = go.Figure()
@@ -264,6 +262,8 @@ if stock_code:
 
             st.divider()
             st.subheader("📋 財務指標一覧")
+            from data_sources.financial_store import get_peer_stats
+            peer = get_peer_stats(stock_code)  # バッチで計算済みの全銘柄内順位・セクター内偏差
             for category in ["収益性", "安全性", "成長性", "割安度"]:
                 ci = {k: v for k, v in indicators.items() if k in INDICATOR_FORMAT and INDICATOR_FORMAT[k][1] == category}
                 if ci:
@@ -272,6 +272,12 @@ if stock_code:
                     for i, (n, v) in enumerate(ci.items()):
                         u = INDICATOR_FORMAT[n][0]
                         cols[i].metric(n, f"{v:,.0f}{u}" if u == "円" else f"{v:.2f}{u}")
+                        p = peer.get(n)
+                        if p and p["percentile"] is not None:
+                            note = f"全銘柄で上位{max(1, round(100 - p['percentile']))}%"
+                            if p["sector_z"] is not None:
+                                note += f" ｜ {p['sector']}内 {p['sector_z']:+.1f}σ"
+                            cols[i].caption(note)
 
 st.divider()
 st.caption("⚠️ 本ツールは投資助言ではありません。投資判断はご自身の責任で行ってください。| 📜 利用規約はメニューから確認できます")
@@ -8,41 +8,55 @@ if page == "バックテスト":
         company = CODE_MAP[bt_code]
         st.success(f"✅ {company['name']}（{bt_code}）")
 
+        # バッチごとの総合スコアの推移（保存済みのスコア履歴から。通信なし）
+        try:
+            from data_sources.financial_store import get_score_history
+            batch_history = get_score_history(bt_code)
+        except:
+            batch_history = []
+        if len(batch_history) >= 2:
+            import plotly.graph_objects as go
+            fig_batch = go.Figure(go.Scatter(
+                x=[h["started_at"][:10] if h["started_at"] else h["batch_run_id"] for h in batch_history],
+                y=[h["total_score"] for h in batch_history], mode="lines+markers", line_shape="hv",
+                name="総合スコア", line=dict(color="#2E75B6", width=2),
+            ))
+            fig_batch.update_layout(height=300, title="バッチ分析の総合スコア推移", yaxis_range=[0, 100])
+            st.plotly_chart(fig_batch, use_container_width=True)
+
         if st.button("🔍 バックテスト実行", type="primary"):
             import plotly.graph_objects as go
             from plotly.subplots import make_subplots
             import pandas as pd
             from parsers.xbrl_parser import download_and_parse
-            from analysis.indicators import calc_indicators, calc_growth
+            from analysis.indicators import calc_indicators_frame, calc_growth_frame, frame_to_records
             from analysis.scoring import calc_total_score
-            from data_sources.cache_manager import get_cache, set_cache
+            from data_sources.cache_manager import get_or_fetch
+            from data_sources.filing_store import filing_lock_key
 
             API_KEY = os.getenv("EDINET_API_KEY")
             edinet_code = company["edinet_code"]
 
             with st.spinner("過去の有報を検索中..."):
-                docs = get_cache(f"docs_{edinet_code}", max_age_hours=168)
-                if not docs:
-                    docs = search_yuho(edinet_code, API_KEY)
-                    if docs: set_cache(f"docs_{edinet_code}", docs)
+                docs = get_or_fetch(f"docs_{edinet_code}", lambda: search_yuho(edinet_code, API_KEY), max_age_hours=168)
 
             if not docs or len(docs) < 2:
                 st.error("❌ バックテストには2年以上のデータが必要です")
             else:
                 st.info(f"📊 {len(docs)}期分のデータを分析中...")
 
-                # 各年度のデータを取得
-                yearly_data = {}
+                # 各年度のデータを取得（保存済みの決算期は財務データストアから読み、ない期だけ取得する）
+                from data_sources.financial_store import load_history
                 progress = st.progress(0, text="分析中...")
-                for i, doc in enumerate(docs):
-                    progress.progress((i+1)/len(docs), text=f"{doc['periodEnd'][:4]}年度を分析中...")
-                    ck = f"xbrl_{doc['docID']}"
-                    xbrl = get_cache(ck)
-                    if not xbrl:
-                        xbrl = download_and_parse(doc["docID"], API_KEY)
-                        if xbrl: set_cache(ck, xbrl)
-                    if xbrl:
-                        yearly_data[doc["periodEnd"][:4]] = {"xbrl": xbrl, "doc": doc}
+
+                def _fetch_year(doc):
+                    progress.progress(min(1.0, (docs.index(doc)+1)/len(docs)), text=f"{doc['periodEnd'][:4]}年度を分析中...")
+                    return get_or_fetch(f"xbrl_{doc['docID']}", lambda: download_and_parse(doc["docID"], API_KEY),
+                                        lock_keys=[filing_lock_key(doc["docID"])])
+
+                history = load_history(bt_code, docs, _fetch_year)
+                yearly_data = {doc["periodEnd"][:4]: {"xbrl": history[doc["periodEnd"]], "doc": doc}
+                               for doc in docs if doc["periodEnd"] in history}
                 progress.empty()
 
                 if len(yearly_data) < 2:
@@ -52,15 +66,10 @@ if page == "バックテスト":
                     scores_by_year = {}
                     indicators_by_year = {}
 
-                    for i, year in enumerate(years):
-                        xbrl = yearly_data[year]["xbrl"]
-                        ind = calc_indicators(xbrl, 0)
-
-                        if i > 0:
-                            prev_xbrl = yearly_data[years[i-1]]["xbrl"]
-                            growth = calc_growth(xbrl, prev_xbrl)
-                            ind.update(growth)
-
+                    # 全年度の指標と前年比成長率をまとめて計算
+                    fin_frame = pd.DataFrame([yearly_data[y]["xbrl"] for y in years], index=years)
+                    ind_frame = calc_indicators_frame(fin_frame, 0).join(calc_growth_frame(fin_frame, fin_frame.shift(1)))
+                    for year, ind in zip(years, frame_to_records(ind_frame)):
                         score = calc_total_score(ind, style, "中期")
                         scores_by_year[year] = score
                         indicators_by_year[year] = ind
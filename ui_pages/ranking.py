@@ -1,11 +1,20 @@
 if page == "ランキング":
     st.title("🏆 銘柄ランキング")
 
-    from data.database import get_all_scores, get_scores_count
+    from data.database import get_all_scores, iter_scores, get_scores_count, SCORE_LIST_COLUMNS
+    from analysis.score_cube import load_score_cube, style_scores
+    from analysis.ranking_snapshot import load_ranking_snapshot, ranking_order, ranking_rows
+    # バッチが書き出した並び替え済みのスナップショット（プロセスで1回だけメモリマップで開く）
+    snapshot = load_ranking_snapshot()
     db_count = get_scores_count()
+    # スナップショットに入っていない銘柄がDBにあるうちは（指標が保存される前のスコアなど）DBから並べる
+    if snapshot is not None and snapshot["manifest"]["count"] < db_count:
+        snapshot = None
 
     if db_count > 0:
-        st.caption(f"📊 {db_count}銘柄のスコアデータ（バッチ分析済み）")
+        # サイドバーの投資スタイル・期間の総合スコア（バッチで計算済みのスコアキューブから引く）
+        cube_scores = style_scores(load_score_cube(), style, period) if snapshot is None else {}
+        st.caption(f"📊 {db_count}銘柄のスコアデータ（バッチ分析済み）｜ {style}・{period}")
 
         rank_col1, rank_col2 = st.columns(2)
         with rank_col1:
@@ -16,19 +25,29 @@ if page == "ランキング":
         count_map = {"上位30銘柄": 30, "上位100銘柄": 100, "上位500銘柄": 500}
         max_count = count_map.get(rank_count, db_count)
 
-        all_scores = get_all_scores(min_score=0, limit=max_count)
-        rankings = []
-        for s in all_scores:
-            rankings.append({
-                "code": s["stock_code"], "name": s["company_name"],
-                "total": s["total_score"], "profitability": s["profitability"],
-                "safety": s["safety"], "growth": s["growth"], "value": s["value"],
-                "roe": s.get("roe", 0), "per": s.get("per", 0), "dividend": s.get("dividend_yield", 0),
-            })
+        if snapshot is not None:
+            # 並び順は計算済みなので、表示件数分の行を切り出すだけ
+            order = ranking_order(snapshot, style, period, sort_by)[:max_count]
+            rankings = ranking_rows(snapshot, order, style, period)
+        else:
+            # スタイルによって順位が変わるため、キューブがあるときは全件から並べ替える（一覧に使う列だけをページ単位で読む）
+            if cube_scores:
+                all_scores = list(iter_scores(columns=SCORE_LIST_COLUMNS))
+            else:
+                all_scores = get_all_scores(min_score=0, limit=max_count, columns=SCORE_LIST_COLUMNS)
+            rankings = []
+            for s in all_scores:
+                rankings.append({
+                    "code": s["stock_code"], "name": s["company_name"],
+                    "total": cube_scores.get(s["stock_code"], s["total_score"]), "profitability": s["profitability"],
+                    "safety": s["safety"], "growth": s["growth"], "value": s["value"],
+                    "roe": s.get("roe", 0), "per": s.get("per", 0), "dividend": s.get("dividend_yield", 0),
+                })
 
-        sort_key_map = {"総合スコア": "total", "収益性": "profitability", "安全性": "safety", "成長性": "growth", "割安度": "value"}
-        sort_k = sort_key_map.get(sort_by, "total")
-        rankings.sort(key=lambda x: x[sort_k], reverse=True)
+            sort_key_map = {"総合スコア": "total", "収益性": "profitability", "安全性": "safety", "成長性": "growth", "割安度": "value"}
+            sort_k = sort_key_map.get(sort_by, "total")
+            rankings.sort(key=lambda x: x[sort_k], reverse=True)
+            rankings = rankings[:max_count]
 
         if rankings:
             import pandas as pd
@@ -63,8 +82,8 @@ if page == "ランキング":
             for i, (cat_name, cat_key) in enumerate([("収益性","profitability"),("安全性","safety"),("成長性","growth"),("割安度","value")]):
                 with cat_cols[i]:
                     st.markdown(f"**{cat_name} TOP5**")
-                    sorted_cat = sorted(rankings, key=lambda x: x[cat_key], reverse=True)
-                    for j, r in enumerate(sorted_cat[:5]):
+                    import heapq
+                    for j, r in enumerate(heapq.nlargest(5, rankings, key=lambda x: x[cat_key])):
                         st.caption(f"{j+1}. {r['name'][:10]} ({r[cat_key]}点)")
 
             st.divider()
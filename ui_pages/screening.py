@@ -1,11 +1,21 @@
 if page == "スクリーニング":
     st.title("🔎 スクリーニング")
 
-    from data.database import get_all_scores, get_scores_count
+    from data.database import screen_scores, get_scores_count, SCORE_LIST_COLUMNS
+    from analysis.ranking_snapshot import load_ranking_snapshot
+    from analysis.screener import screen, screen_columns
+    # バッチが書き出したスナップショットがあれば、条件はその列に対するマスクで判定する（DBに問い合わせない）
+    snapshot = load_ranking_snapshot()
     db_count = get_scores_count()
+    # スナップショットに入っていない銘柄がDBにあるうちは（指標が保存される前のスコアなど）DBで絞り込む
+    if snapshot is not None and snapshot["manifest"]["count"] < db_count:
+        snapshot = None
 
     if db_count > 0:
-        st.caption(f"📊 {db_count}銘柄からフィルタリング")
+        # 総合スコアはサイドバーの投資スタイル・期間のもの
+        # DBで絞り込むときはバッチが保存した総合スコア（バランス・中期）で判定・並べ替えるので、そう表示する
+        score_basis = f"{style}・{period}" if snapshot is not None else "総合スコアはバランス・中期（1〜3年）"
+        st.caption(f"📊 {db_count}銘柄からフィルタリング ｜ {score_basis}")
 
         # フィルター条件
         st.subheader("📋 条件設定")
@@ -29,53 +39,92 @@ if page == "スクリーニング":
         with f_col8:
             min_val = st.slider("割安度（最低）", 0, 100, 0, key="scr_val")
 
-        # DBから全スコア取得してフィルタリング
-        all_scores = get_all_scores(min_score=0, limit=db_count)
-        filtered = []
-        for s in all_scores:
-            if s["total_score"] < min_score: continue
-            if s.get("roe", 0) < min_roe: continue
-            if s.get("dividend_yield", 0) < min_div: continue
-            if max_per < 100 and (s.get("per", 0) == 0 or s.get("per", 0) > max_per): continue
-            if s["profitability"] < min_prof: continue
-            if s["safety"] < min_safe: continue
-            if s["growth"] < min_grow: continue
-            if s["value"] < min_val: continue
-            filtered.append(s)
-
-        st.markdown(f"**該当: {len(filtered)}銘柄 / {db_count}銘柄**")
+        # バッチで判定済みの警告（ビットマスク）で除外
+        from analysis.filters import FILTER_FLAGS
+        from data_sources.financial_store import get_flagged_stocks
+        exclude_flags = st.multiselect("除外する警告", list(FILTER_FLAGS), default=[], key="scr_flags")
+        exclude_mask = sum(FILTER_FLAGS[t] for t in exclude_flags)
+
+        conditions = {
+            "min_total": min_score, "min_roe": min_roe, "min_dividend": min_div,
+            "max_per": max_per if max_per < 100 else None,
+            "min_profitability": min_prof, "min_safety": min_safe, "min_growth": min_grow, "min_value": min_val,
+            "exclude_flags": exclude_mask,
+        }
+        size_map = {"100銘柄ずつ": 100, "500銘柄ずつ": 500, "全件": db_count}
+        page_size = max(1, size_map[st.selectbox("表示件数", list(size_map), index=0, key="scr_page_size")])
+
+        flagged = get_flagged_stocks(exclude_mask) if exclude_mask and snapshot is None else None
+        # 一覧の列名 → 表示名・DBの列名
+        labels = {"code": "証券コード", "name": "企業名", "total": "総合", "profitability": "収益性", "safety": "安全性",
+                  "growth": "成長性", "value": "割安度", "roe": "ROE", "per": "PER", "dividend": "配当利回り"}
+        db_columns = {"code": "stock_code", "name": "company_name", "total": "total_score",
+                      "profitability": "profitability", "safety": "safety", "growth": "growth", "value": "value",
+                      "roe": "roe", "per": "per", "dividend": "dividend_yield"}
+
+        def _row(s, keys):
+            """DBの行を一覧の列名にする（指標が未算出の銘柄は0）"""
+            return {key: s[db_columns[key]] if key in ("code", "name") else s.get(db_columns[key]) or 0 for key in keys}
+
+        def _fetch(offset, limit):
+            """該当件数と、総合スコア順の offset 件目から limit 件の行（件数と行を1回で受け取る）"""
+            if snapshot is not None:
+                return screen(snapshot, conditions, style, period, offset, limit)
+            count, found = screen_scores(conditions, offset, limit, SCORE_LIST_COLUMNS, flagged)
+            return count, [_row(s, labels) for s in found]
+
+        def _all_matches(keys):
+            """該当する全銘柄の指定した列だけ（散布図・エクスポート用）"""
+            if snapshot is not None:
+                return screen_columns(snapshot, conditions, style, period, keys)
+            columns = {key: [] for key in keys}
+            # Supabase は1リクエストの行数に上限があるので分けて受け取る
+            for offset in range(0, match_count, 1000):
+                _, found = screen_scores(conditions, offset, 1000, [db_columns[key] for key in keys], flagged)
+                for s in found:
+                    for key, value in _row(s, keys).items():
+                        columns[key].append(value)
+            return columns
+
+        # ページ番号は前回の値で先に1回だけ問い合わせ、返ってきた件数からページ数を決める
+        page_no = st.session_state.get("scr_page", 1)
+        match_count, filtered = _fetch((page_no - 1) * page_size, page_size)
+        page_count = max(1, -(-match_count // page_size))
+        if page_no > page_count:
+            # 条件を厳しくして該当件数が減ったときは最後のページに戻す
+            page_no = st.session_state["scr_page"] = page_count
+            match_count, filtered = _fetch((page_no - 1) * page_size, page_size)
+        if page_count > 1:
+            page_no = st.number_input("ページ", 1, page_count, key="scr_page")
+
+        st.markdown(f"**該当: {match_count}銘柄 / {db_count}銘柄**")
 
         if filtered:
             import pandas as pd
             import plotly.graph_objects as go
 
-            rows = []
-            for s in filtered:
-                rows.append({
-                    "証券コード": s["stock_code"], "企業名": s["company_name"],
-                    "総合": s["total_score"], "収益性": s["profitability"],
-                    "安全性": s["safety"], "成長性": s["growth"], "割安度": s["value"],
-                    "ROE": s.get("roe", 0), "PER": s.get("per", 0), "配当利回り": s.get("dividend_yield", 0),
-                })
-            df = pd.DataFrame(rows)
-            df = df.sort_values("総合", ascending=False).reset_index(drop=True)
-            df.index = df.index + 1
+            df = pd.DataFrame(filtered).rename(columns=labels)
+            df.index = df.index + 1 + (page_no - 1) * page_size
             df.index.name = "順位"
+            st.caption(f"{df.index[0]}〜{df.index[-1]}位を表示")
             st.dataframe(df, use_container_width=True)
 
-            # エクスポート
+            # エクスポート（表示中のページだけでなく該当する全銘柄）
+            all_df = pd.DataFrame(_all_matches(list(labels))).rename(columns=labels)
+            all_df.index = all_df.index + 1
+            all_df.index.name = "順位"
             exp1, exp2 = st.columns(2)
             with exp1:
-                csv = df.to_csv(index=True).encode("utf-8-sig")
-                st.download_button("📥 CSVダウンロード", csv, "screening.csv", "text/csv", key="scr_csv")
+                csv = all_df.to_csv(index=True).encode("utf-8-sig")
+                st.download_button(f"📥 CSVダウンロード（全{match_count}銘柄）", csv, "screening.csv", "text/csv", key="scr_csv")
             with exp2:
                 buf = io.BytesIO()
-                df.to_excel(buf, index=True, engine="openpyxl")
-                st.download_button("📥 Excelダウンロード", buf.getvalue(), "screening.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="scr_xlsx")
+                all_df.to_excel(buf, index=True, engine="openpyxl")
+                st.download_button(f"📥 Excelダウンロード（全{match_count}銘柄）", buf.getvalue(), "screening.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key="scr_xlsx")
 
-            # 散布図
+            # 散布図（該当する全銘柄）
             st.divider()
-            st.subheader("📈 散布図")
+            st.subheader(f"📈 散布図（該当{match_count}銘柄）")
             sc_col1, sc_col2 = st.columns(2)
             with sc_col1:
                 x_axis = st.selectbox("X軸", ["ROE", "PER", "配当利回り", "総合", "収益性", "安全性", "成長性", "割安度"], index=0, key="scr_x")
@@ -83,9 +132,9 @@ if page == "スクリーニング":
                 y_axis = st.selectbox("Y軸", ["総合", "収益性", "安全性", "成長性", "割安度", "ROE", "PER", "配当利回り"], index=0, key="scr_y")
 
             fig = go.Figure(data=[go.Scatter(
-                x=df[x_axis], y=df[y_axis], mode="markers+text",
-                text=df["企業名"].str[:6], textposition="top center",
-                marker=dict(size=10, color=df["総合"], colorscale="Viridis", showscale=True, colorbar=dict(title="総合")),
+                x=all_df[x_axis], y=all_df[y_axis], mode="markers+text",
+                text=all_df["企業名"].str[:6], textposition="top center",
+                marker=dict(size=10, color=all_df["総合"], colorscale="Viridis", showscale=True, colorbar=dict(title="総合")),
             )])
             fig.update_layout(height=500, xaxis_title=x_axis, yaxis_title=y_axis)
             st.plotly_chart(fig, use_container_width=True)
@@ -2,23 +2,8 @@ if page == "セクター分析":
     st.title("🏭 セクター分析")
     st.caption("業種別の投資魅力度を比較")
 
-    SECTORS = {
-        "自動車": ["7203","7267","7269","7270","7201","7202","7211","6902"],
-        "電機・精密": ["6758","6501","6503","6752","6971","6981","6762","6594","6645","6504","7751","7741","7733","7735","7752"],
-        "半導体": ["8035","6920","6857","6723"],
-        "商社": ["8058","8001","8031","8053","8002"],
-        "銀行・金融": ["8306","8316","8411","8591","8601","8604"],
-        "保険": ["8766","8750","8630","8725"],
-        "不動産": ["8801","8802"],
-        "通信": ["9432","9433","9434"],
-        "医薬品": ["4502","4519","4523","4568","4507","4578"],
-        "食品・日用品": ["2801","2802","2502","2503","4452","2914","4911"],
-        "化学・素材": ["4063","4901","5108","5401","5713","5802","3861"],
-        "機械": ["6301","6273","6367","6954","7011"],
-        "サービス・IT": ["6098","9983","3382","4661","3659","4689","7974"],
-        "運輸": ["9020","9022","9101","9104","9201","9202","9001","9005","9009","9064"],
-        "エネルギー": ["9501","9503","9531"],
-    }
+    from analysis.peers import load_sectors
+    SECTORS = load_sectors()
 
     # セクター選択
     selected_sectors = st.multiselect("分析するセクターを選択", list(SECTORS.keys()), default=list(SECTORS.keys())[:5])
@@ -27,6 +12,13 @@ if page == "セクター分析":
         import plotly.graph_objects as go
         import pandas as pd
         API_KEY = os.getenv("EDINET_API_KEY")
+        from data.database import get_scores_by_codes, SCORE_LIST_COLUMNS
+        from analysis.score_cube import load_score_cube, style_scores
+
+        # バッチ分析済みの銘柄はDBのスコアを引くだけ（未分析の銘柄だけその場で分析する）
+        batch_scores = {s["stock_code"]: s for s in get_scores_by_codes(
+            [code for sector in selected_sectors for code in SECTORS[sector]], SCORE_LIST_COLUMNS)}
+        cube_scores = style_scores(load_score_cube(), style, period)
 
         sector_results = {}
         all_stocks = []
@@ -42,6 +34,17 @@ if page == "セクター分析":
                     continue
                 progress.progress(done / total_stocks, text=f"{sector} - {CODE_MAP[code]['name']} を分析中...")
                 try:
+                    if code in batch_scores:
+                        b = batch_scores[code]
+                        stock_data = {
+                            "sector": sector, "code": code, "name": b["company_name"][:10],
+                            "total": cube_scores.get(code, b["total_score"]),
+                            "profitability": b["profitability"], "safety": b["safety"],
+                            "growth": b["growth"], "value": b["value"],
+                        }
+                        sector_scores.append(stock_data)
+                        all_stocks.append(stock_data)
+                        continue
                     r = analyze_company(code, API_KEY)
                     if r:
                         stock_data = {